@@ -0,0 +1,122 @@
+import logging
+import os
+import time
+
+# PostGIS predicates of the benchmarked relations. 'ec' and 'tpp' are the
+# RCC8 relations externally connected and tangential proper part the car
+# friendly hotel task is defined on (see
+# `CarFriendlyHotelGenerator.generate_car_friendly_hotel`) expressed as
+# DE-9IM patterns.
+RELATION_PREDICATES = {
+    'touches': 'ST_Touches(a.the_geom, b.the_geom)',
+    'within': 'ST_Within(a.the_geom, b.the_geom)',
+    'intersects': 'ST_Intersects(a.the_geom, b.the_geom)',
+    'contains': 'ST_Contains(a.the_geom, b.the_geom)',
+    'ec': "ST_Relate(a.the_geom, b.the_geom, 'FF*FT****')",
+    'tpp': "ST_Relate(a.the_geom, b.the_geom, 'TFF*TFT**')",
+}
+
+DEFAULT_TABLE_PAIRS = [
+    ('polygon', 'polygon'),
+    ('line_string', 'polygon'),
+    ('point', 'polygon'),
+]
+
+
+def get_eval_id(dataset, dataset_size, relation, left_table, right_table):
+    """
+    Builds the ID of one evaluation as read by `bin/plotresults`, i.e.
+    <dataset>_<dataset size>_<relation label>. Since the ID is split at
+    underscores, the table names are included without them.
+    """
+    if '_' in dataset:
+        raise ValueError(f'Dataset name {dataset} must not contain "_"')
+
+    relation_label = '-'.join([
+        relation, left_table.replace('_', ''), right_table.replace('_', '')])
+
+    return f'{dataset}_{dataset_size}_{relation_label}'
+
+
+def get_relation_query(relation, left_table, right_table):
+    query = f'SELECT count(*) FROM {left_table} a JOIN {right_table} b ' \
+        f'ON {RELATION_PREDICATES[relation]}'
+
+    if left_table == right_table:
+        query += ' WHERE a.iri <> b.iri'
+
+    return query
+
+
+class RelationBenchmark(object):
+    """
+    Runs the PostGIS queries of the configured spatial relations over all
+    configured table pairs `num_runs` times each. The first run of each query
+    is the cold cache case, which is also how `bin/plotresults` interprets the
+    first timing of a result line.
+    """
+    def __init__(
+            self,
+            relations=None,
+            table_pairs=None,
+            num_runs=5,
+            explain_dir=None):
+
+        self.relations = relations or list(RELATION_PREDICATES.keys())
+        self.table_pairs = table_pairs or DEFAULT_TABLE_PAIRS
+        self.num_runs = num_runs
+        self.explain_dir = explain_dir
+
+        for relation in self.relations:
+            if relation not in RELATION_PREDICATES:
+                raise ValueError(f'Unknown relation {relation}')
+
+    def _write_plan(self, cursor, eval_id, query):
+        cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + query)
+        plan_lines = [row[0] for row in cursor.fetchall()]
+
+        plan_file_path = os.path.join(self.explain_dir, eval_id + '.txt')
+        with open(plan_file_path, 'w') as plan_file:
+            plan_file.write(query + os.linesep + os.linesep)
+            plan_file.write(os.linesep.join(plan_lines) + os.linesep)
+
+    def run(self, conn, dataset, dataset_size):
+        """
+        Returns a list of (eval ID, result count, [timings in seconds]) tuples
+        for the dataset the connection `conn` points to.
+        """
+        results = []
+        cursor = conn.cursor()
+
+        for left_table, right_table in self.table_pairs:
+            for relation in self.relations:
+                eval_id = get_eval_id(
+                    dataset, dataset_size, relation, left_table, right_table)
+                query = get_relation_query(relation, left_table, right_table)
+
+                timings = []
+                count = None
+                for _ in range(self.num_runs):
+                    start = time.perf_counter()
+                    cursor.execute(query)
+                    count = cursor.fetchone()[0]
+                    timings.append(time.perf_counter() - start)
+
+                logging.info(
+                    f'{eval_id}: {count} pairs, cold {timings[0]:.4f} s')
+                results.append((eval_id, count, timings))
+
+                if self.explain_dir is not None:
+                    self._write_plan(cursor, eval_id, query)
+
+        cursor.close()
+
+        return results
+
+
+def format_result_line(eval_id, count, timings):
+    """
+    Formats one result line the way `bin/plotresults` reads it, i.e.
+    <eval ID>,<result count>,<timing 1>,<timing 2>,...
+    """
+    return ','.join([eval_id, str(count)] + [f'{t:.6f}' for t in timings])
@@ -0,0 +1,259 @@
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from benchmark.results import get_git_revision
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+GEOVOCAB_GEOMETRY = 'http://geovocab.org/geometry#geometry'
+GEOSPARQL_HAS_GEOMETRY = 'http://www.opengis.net/ont/geosparql#hasGeometry'
+GEOSPARQL_AS_WKT = 'http://www.opengis.net/ont/geosparql#asWKT'
+WKT_DTYPE = 'http://www.opengis.net/ont/geosparql#wktLiteral'
+
+CENTER_LON = 13.74
+CENTER_LAT = 51.05
+
+
+def _prepare_generate(work_dir, size):
+    return work_dir, size
+
+
+def _run_generate(work_dir, size):
+    from datagenerator import DataGenerator
+
+    DataGenerator(CENTER_LON, CENTER_LAT, work_dir).generate(size)
+
+    return size
+
+
+def _prepare_hotels(work_dir, size):
+    # a hotel consists of ~10 geometries (hotel, rooms, reception, car park)
+    num_hotels = max(2, size // 10)
+
+    return work_dir, num_hotels
+
+
+def _run_hotels(work_dir, num_hotels):
+    from datagenerator.hotels import CarFriendlyHotelGenerator
+
+    generator = CarFriendlyHotelGenerator(
+        num_hotels // 2, num_hotels - num_hotels // 2)
+    generator.write_hotel_data(work_dir)
+
+    with open(os.path.join(work_dir, 'load_hotels.sql')) as sql_file:
+        return sum(1 for _ in sql_file)
+
+
+def _prepare_sample(work_dir, size, num_files=4):
+    data_dir = os.path.join(work_dir, 'data')
+    os.makedirs(data_dir)
+
+    for file_no in range(num_files):
+        file_path = os.path.join(data_dir, f'part_{file_no}.nt')
+        with open(file_path, 'w') as nt_file:
+            for i in range(file_no, size, num_files):
+                lon = round(random.uniform(13.6, 13.9), 4)
+                lat = round(random.uniform(50.9, 51.2), 4)
+                nt_file.write(
+                    f'<http://example.com/feature_{i}> '
+                    f'<{GEOVOCAB_GEOMETRY}> <http://example.com/geom_{i}> .\n'
+                    f'<http://example.com/geom_{i}> <{GEOSPARQL_AS_WKT}> '
+                    f'"POINT({lon} {lat})"^^<{WKT_DTYPE}> .\n')
+
+    return work_dir, data_dir, size
+
+
+def _run_sample(work_dir, data_dir, size):
+    from dataloader.datasampler import DataSampler
+
+    data_sampler = DataSampler(
+        data_dir,
+        os.path.join(work_dir, 'sample.nt'),
+        os.path.join(work_dir, 'sample.sql'))
+    data_sampler.sample(sample_sizes=[max(1, size // 10)])
+
+    return size
+
+
+def _prepare_load(work_dir, size):
+    from datagenerator import DataGenerator
+
+    DataGenerator(CENTER_LON, CENTER_LAT, work_dir).generate(size)
+
+    return os.path.join(work_dir, f'kb_{size}.ttl'), size
+
+
+def _run_load(kb_file_path, size):
+    from dataloader import PostGISDataLoader
+    from dataloader.datasampler import POINT_FEATURE_CLS, LINE_FEATURE_CLS, \
+        AREA_FEATURE_CLS
+
+    data_loader = PostGISDataLoader(
+        [GEOSPARQL_HAS_GEOMETRY],
+        [GEOSPARQL_AS_WKT],
+        [str(POINT_FEATURE_CLS)],
+        [str(LINE_FEATURE_CLS)],
+        [str(AREA_FEATURE_CLS)],
+        db_name=None,
+        dry_run=True)
+    data_loader.load_geometry_data(kb_file_path)
+
+    return size
+
+
+def _prepare_convert(work_dir, size, move_length=1000):
+    csv_file_path = os.path.join(work_dir, 'gps.csv')
+    timestamp = datetime(2020, 1, 1)
+    lon, lat = CENTER_LON, CENTER_LAT
+
+    with open(csv_file_path, 'w') as csv_file:
+        for i in range(size):
+            user_id = i // move_length
+            timestamp += timedelta(seconds=5)
+            lon += random.gauss(0, 0.0001)
+            lat += random.gauss(0, 0.0001)
+            csv_file.write(
+                f'"{user_id}","{timestamp.isoformat()}",'
+                f'"{lon}","{lat}","walk"\n')
+
+    output_dir = os.path.join(work_dir, 'moves')
+    os.makedirs(output_dir)
+
+    return csv_file_path, output_dir
+
+
+def _run_convert(csv_file_path, output_dir):
+    from userdataconverter import convert_user_data
+
+    return convert_user_data(csv_file_path, output_dir).num_points
+
+
+# stage name -> (prepare function, run function); the prepare function gets
+# a working directory and the input size and returns the arguments of the run
+# function, which in turn returns the number of rows processed
+STAGES = {
+    'generate': (_prepare_generate, _run_generate),
+    'hotels': (_prepare_hotels, _run_hotels),
+    'sample': (_prepare_sample, _run_sample),
+    'load': (_prepare_load, _run_load),
+    'convert': (_prepare_convert, _run_convert),
+}
+
+
+def _measure(stage, run_args, trace_allocations):
+    run = STAGES[stage][1]
+
+    if trace_allocations:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    rows = run(*run_args)
+    seconds = time.perf_counter() - start
+
+    result = {
+        'rows': rows,
+        'seconds': seconds,
+        # kilobytes on Linux
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+    if trace_allocations:
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        result['alloc_peak_bytes'] = peak
+        result['alloc_blocks'] = \
+            sum(stat.count for stat in snapshot.statistics('filename'))
+
+    return result
+
+
+def _measure_in_subprocess(stage, run_args, trace_allocations):
+    # A fresh process per measurement keeps the peak RSS of the stages apart
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(
+            _measure, stage, run_args, trace_allocations).result()
+
+
+def run_pipeline_benchmark(
+        stages=None, sizes=None, trace_allocations=True, work_dir=None):
+    """
+    Runs each of the given pipeline stages on synthetic inputs of the given
+    sizes (number of geometries or GPS points) and returns a list of result
+    dicts with rows per second and peak RSS. Since tracing allocations slows
+    down a stage considerably, allocations are counted in a separate run.
+    """
+    results = []
+
+    for stage in stages or list(STAGES.keys()):
+        prepare = STAGES[stage][0]
+
+        for size in sizes or DEFAULT_SIZES:
+            stage_dir = tempfile.mkdtemp(prefix=f'{stage}_{size}_', dir=work_dir)
+
+            try:
+                run_args = prepare(stage_dir, size)
+                result = _measure_in_subprocess(stage, run_args, False)
+
+                if trace_allocations:
+                    traced = _measure_in_subprocess(stage, run_args, True)
+                    result['alloc_peak_bytes'] = traced['alloc_peak_bytes']
+                    result['alloc_blocks'] = traced['alloc_blocks']
+            finally:
+                shutil.rmtree(stage_dir)
+
+            result['stage'] = stage
+            result['size'] = size
+            result['rows_per_sec'] = \
+                result['rows'] / max(result['seconds'], 1e-9)
+            results.append(result)
+
+    return results
+
+
+def write_results(results, json_file_path):
+    with open(json_file_path, 'w') as json_file:
+        json.dump({
+            'git_rev': get_git_revision(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'results': results,
+        }, json_file, indent=2)
+
+
+def compare_results(json_file_path, baseline_json_file_path):
+    """
+    Returns (stage, size, baseline rows/s, rows/s, ratio) tuples for all
+    stage/size combinations contained in both result files
+    """
+    with open(json_file_path) as json_file:
+        results = json.load(json_file)['results']
+
+    with open(baseline_json_file_path) as json_file:
+        baseline_results = {
+            (r['stage'], r['size']): r for r in json.load(json_file)['results']}
+
+    comparison = []
+    for result in results:
+        baseline = baseline_results.get((result['stage'], result['size']))
+        if baseline is None:
+            continue
+
+        comparison.append((
+            result['stage'],
+            result['size'],
+            baseline['rows_per_sec'],
+            result['rows_per_sec'],
+            result['rows_per_sec'] / baseline['rows_per_sec']))
+
+    return comparison
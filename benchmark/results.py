@@ -0,0 +1,234 @@
+import csv
+import os
+import sqlite3
+import subprocess
+from datetime import datetime
+from statistics import median
+
+# (dataset, size, relation, number of warm runs, median, p95, spread)
+STATS_HEADER = \
+    ['dataset', 'size', 'relation', 'num_runs', 'median', 'p95', 'spread']
+
+
+def get_git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            # the revision of this code, not of the working directory
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True).stdout.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def percentile(values, q):
+    """
+    Returns the q-th percentile (0 <= q <= 100) of `values` interpolating
+    linearly between the closest ranks.
+    """
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(values) - 1)
+
+    return values[lower] + (values[upper] - values[lower]) * (pos - lower)
+
+
+def read_result_file(result_file_path):
+    """
+    Yields (dataset, dataset size, relation, timings) for each line of a
+    result file in the format read by `bin/plotresults`
+    """
+    with open(result_file_path) as result_file:
+        for line in result_file:
+            if not line.strip():
+                continue
+
+            eval_id, _, *timings = line.split(',')
+            dataset, dataset_size, relation = eval_id.split('_')
+
+            yield dataset, int(dataset_size), relation, \
+                [float(t.strip()) for t in timings]
+
+
+class ResultStore(object):
+    """
+    Keeps the timings of all benchmark runs in a local SQLite database, keyed
+    by dataset, dataset size, relation, run ID and the git revision of the code
+    the run was made with. As in `bin/plotresults` the first timing of each
+    result line is considered the cold cache case and excluded from the
+    statistics if there are further timings.
+    """
+    def __init__(self, db_file_path):
+        self.conn = sqlite3.connect(db_file_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS run (
+                run_id TEXT PRIMARY KEY,
+                git_rev TEXT,
+                created TEXT
+            );
+            CREATE TABLE IF NOT EXISTS timing (
+                run_id TEXT REFERENCES run(run_id),
+                dataset TEXT,
+                size INTEGER,
+                relation TEXT,
+                repetition INTEGER,
+                seconds REAL
+            );
+            CREATE INDEX IF NOT EXISTS timing_idx
+                ON timing (run_id, dataset, size, relation);
+            """)
+
+    def close(self):
+        self.conn.close()
+
+    def ingest(self, result_file_paths, run_id=None, git_rev=None):
+        """
+        Stores the timings of the given result files as run `run_id` and
+        returns the run ID. Raises a ValueError if the run was ingested
+        before, leaving the store unchanged.
+        """
+        # microseconds, so that the default run IDs of runs ingested within
+        # the same second don't collide
+        created = datetime.now().isoformat(timespec='microseconds')
+        if run_id is None:
+            run_id = created
+        if git_rev is None:
+            git_rev = get_git_revision()
+
+        with self.conn:
+            try:
+                self.conn.execute(
+                    'INSERT INTO run VALUES (?, ?, ?)',
+                    (run_id, git_rev, created))
+            except sqlite3.IntegrityError:
+                raise ValueError(f'Run {run_id} already ingested')
+
+            for result_file_path in result_file_paths:
+                for dataset, size, relation, timings in \
+                        read_result_file(result_file_path):
+                    self.conn.executemany(
+                        'INSERT INTO timing VALUES (?, ?, ?, ?, ?, ?)',
+                        [(run_id, dataset, size, relation, i, t)
+                         for i, t in enumerate(timings)])
+
+        return run_id
+
+    def get_runs(self):
+        return self.conn.execute(
+            'SELECT run_id, git_rev, created FROM run ORDER BY rowid')\
+            .fetchall()
+
+    def get_latest_run_id(self):
+        row = self.conn.execute(
+            'SELECT run_id FROM run ORDER BY rowid DESC LIMIT 1').fetchone()
+
+        return None if row is None else row[0]
+
+    def get_stats(self, run_id):
+        """
+        Returns a list of (dataset, size, relation, number of warm runs,
+        median, p95, spread) tuples with spread being max - min of the warm
+        runs.
+        """
+        rows = self.conn.execute("""
+            SELECT dataset, size, relation, seconds
+            FROM timing
+            WHERE run_id = ?
+            ORDER BY dataset, relation, size, repetition
+            """, (run_id,)).fetchall()
+
+        timings = {}
+        for dataset, size, relation, seconds in rows:
+            timings.setdefault((dataset, size, relation), []).append(seconds)
+
+        stats = []
+        for (dataset, size, relation), seconds in timings.items():
+            if len(seconds) > 1:
+                # excludes cold cache case
+                seconds = seconds[1:]
+
+            stats.append((
+                dataset,
+                size,
+                relation,
+                len(seconds),
+                median(seconds),
+                percentile(seconds, 95),
+                max(seconds) - min(seconds)))
+
+        return stats
+
+    def compare(self, run_id, baseline_run_id, threshold=0.1):
+        """
+        Returns (dataset, size, relation, baseline median, median, ratio)
+        tuples for all evaluations whose median got slower by more than
+        `threshold` (e.g. 0.1 for 10%) compared to the baseline run.
+        Raises a ValueError if there are no timings for either run, e.g.
+        because of a mistyped run ID.
+        """
+        stats = self.get_stats(run_id)
+        baseline_stats = self.get_stats(baseline_run_id)
+
+        for checked_run_id, checked_stats in [
+                (run_id, stats), (baseline_run_id, baseline_stats)]:
+            if not checked_stats:
+                raise ValueError(f'No timings for run {checked_run_id}')
+
+        baseline_medians = {
+            (dataset, size, relation): med for
+            dataset, size, relation, _, med, _, _ in baseline_stats}
+
+        regressions = []
+        for dataset, size, relation, _, med, _, _ in stats:
+            baseline_med = baseline_medians.get((dataset, size, relation))
+            if not baseline_med:
+                continue
+
+            ratio = med / baseline_med
+            if ratio > 1 + threshold:
+                regressions.append(
+                    (dataset, size, relation, baseline_med, med, ratio))
+
+        return regressions
+
+    def export_csv(self, run_id, csv_file_path):
+        with open(csv_file_path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(STATS_HEADER)
+            writer.writerows(self.get_stats(run_id))
+
+    def export_png(self, run_id, png_file_path):
+        import matplotlib
+        # non-interactive backend to also work on machines without a display
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        curves = {}
+        for dataset, size, relation, _, med, p95, _ in self.get_stats(run_id):
+            curves.setdefault((dataset, relation), []).append((size, med, p95))
+
+        fig, ax = plt.subplots()
+        for (dataset, relation), points in sorted(curves.items()):
+            points.sort()
+            sizes = [p[0] for p in points]
+            medians = [p[1] for p in points]
+            p95s = [p[2] for p in points]
+
+            line_style = ':' if dataset.startswith('dummy') else '-'
+            line, = ax.plot(
+                sizes,
+                medians,
+                label=f'{dataset} {relation}',
+                linestyle=line_style)
+            ax.fill_between(
+                sizes, medians, p95s, color=line.get_color(), alpha=.2)
+
+        ax.set_xlabel('dataset size')
+        ax.set_ylabel('median query time (s)')
+        ax.set_title(f'Run {run_id}')
+        ax.legend()
+        fig.savefig(png_file_path)
+        plt.close(fig)
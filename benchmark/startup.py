@@ -0,0 +1,51 @@
+import subprocess
+import sys
+import time
+from statistics import median
+
+DEFAULT_COMMANDS = [
+    [],
+    ['load'],
+    ['ingest'],
+    ['initdb'],
+    ['sample'],
+    ['generate'],
+    ['hotels'],
+    ['convert'],
+    ['plot'],
+]
+# seconds a `--help` call may take
+DEFAULT_STARTUP_BUDGET = 0.5
+
+
+def measure_startup(cli_path, commands=None, repeats=5):
+    """
+    Returns (command, median seconds) for calling `cli_path` (i.e.
+    `bin/spatialdata`) with each of `commands` and `--help` in a new
+    interpreter `repeats` times. This is the time spent on imports and
+    argument parsing before any work is done.
+    """
+    commands = commands if commands is not None else DEFAULT_COMMANDS
+    results = []
+
+    for command in commands:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, cli_path] + command + ['--help'],
+                stdout=subprocess.DEVNULL,
+                check=True)
+            timings.append(time.perf_counter() - start)
+
+        results.append((' '.join(command), median(timings)))
+
+    return results
+
+
+def check_startup_budget(results, budget=DEFAULT_STARTUP_BUDGET):
+    """
+    Returns the (command, median seconds) results exceeding `budget`
+    """
+    return [(command, seconds) for command, seconds in results
+            if seconds > budget]
@@ -1,18 +1,54 @@
-import logging
 import math
 import os
-from random import choice
 from random import gauss
 from random import randint
 from random import random
-from random import uniform
 
 from rdflib import Graph, Literal, URIRef, RDF, OWL, RDFS
 
-from dataloader.datasampler import DataSampler, POINT_FEATURE_CLS, \
-    LINE_FEATURE_CLS, AREA_FEATURE_CLS
-
-logging.basicConfig(level=logging.INFO)
+from dataloader.datasampler import POINT_FEATURE_CLS, LINE_FEATURE_CLS, \
+    AREA_FEATURE_CLS, FEATURE_CLASSES
+from dataloader.geometry import GeometryCollection, POINT, LINE_STRING, \
+    POLYGON, parse_types
+
+UNIFORM_DISTRIBUTION = 'uniform'
+HOTSPOTS_DISTRIBUTION = 'hotspots'
+ZIPF_DISTRIBUTION = 'zipf'
+CORRIDORS_DISTRIBUTION = 'corridors'
+MIX_DISTRIBUTION = 'mix'
+DISTRIBUTIONS = [
+    UNIFORM_DISTRIBUTION,
+    HOTSPOTS_DISTRIBUTION,
+    ZIPF_DISTRIBUTION,
+    CORRIDORS_DISTRIBUTION,
+    MIX_DISTRIBUTION,
+]
+
+# the ratios the type of each geometry used to be drawn with
+DEFAULT_TYPE_RATIOS = {POINT: 2, LINE_STRING: 2, POLYGON: 5}
+DEFAULT_NUM_CLUSTERS = 10
+# standard deviation of a hotspot and of the distance to the center line of
+# a corridor, relative to the span of the generated area
+DEFAULT_CLUSTER_SPREAD = 0.05
+DEFAULT_ZIPF_EXPONENT = 1.0
+
+
+def parse_type_ratios(ratios_str):
+    """
+    Parses a comma separated list of geometry type name:ratio pairs, e.g.
+    'point:1,polygon:3', into a dict from type codes to ratios. Types not
+    mentioned are not generated.
+    """
+    type_ratios = {}
+    for type_ratio in ratios_str.split(','):
+        name, _, ratio = type_ratio.partition(':')
+        type_code, = parse_types(name)
+        type_ratios[type_code] = float(ratio)
+
+    if sum(type_ratios.values()) <= 0:
+        raise ValueError(f'No positive type ratio in {ratios_str}')
+
+    return type_ratios
 
 
 class DataGenerator(object):
@@ -26,10 +62,47 @@ class DataGenerator(object):
     line_string_table_name = 'line_string'
     polygon_table_name = 'polygon'
 
-    def __init__(self, center_lon, center_lat, output_dir):
+    def __init__(
+            self,
+            center_lon,
+            center_lat,
+            output_dir,
+            distribution=UNIFORM_DISTRIBUTION,
+            type_ratios=None,
+            num_clusters=DEFAULT_NUM_CLUSTERS,
+            cluster_spread=DEFAULT_CLUSTER_SPREAD,
+            zipf_exponent=DEFAULT_ZIPF_EXPONENT):
+        """
+        The start points of the generated geometries follow `distribution`:
+        - uniform: uniformly spread over a square around the center
+        - hotspots: Gaussian clusters around `num_clusters` uniformly spread
+          centers, each drawing the same share of geometries
+        - zipf: like hotspots, but the share of the n-th cluster is
+          proportional to 1 / n^`zipf_exponent`
+        - corridors: along `num_clusters` straight lines through the square,
+          like streets
+        - mix: each geometry follows one of the above at random
+        The square grows with the number of geometries, `cluster_spread` is
+        relative to its span. The geometry types are drawn with the weights
+        in `type_ratios` (type code -> ratio).
+        """
+        import numpy as np
+
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f'Unknown distribution {distribution}')
+
+        # start points and types are drawn as NumPy arrays, the shapes of
+        # the few points of each line string or polygon one by one
+        self._rng = np.random.default_rng()
+
         self.center_lon = center_lon
         self.center_lat = center_lat
         self.output_dir = output_dir
+        self.distribution = distribution
+        self.type_ratios = type_ratios or DEFAULT_TYPE_RATIOS
+        self.num_clusters = num_clusters
+        self.cluster_spread = cluster_spread
+        self.zipf_exponent = zipf_exponent
 
         self.min_line_points = 3
         self.max_line_points = 16
@@ -37,27 +110,89 @@ class DataGenerator(object):
         self.min_polygon_points = 3
         self.max_polygon_points = 20
 
-        self.point_type = 'point'
-        self.line_string_type = 'line string'
-        self.polygon_type = 'polygon'
-        self.polygon_types = [
-            self.point_type, self.line_string_type, self.polygon_type]
-
         self._neighboring_point_distance = 0.0005
         self._max_polygon_neighboring_distance = 0.001
         self._area_for_10_samples = 0.00002
         self.__tmp_num_samples = 0
         self.__tmp_span = 0
 
-    def _rnd_point(self):
-        lon = round(uniform(
-            self.center_lon - self.__tmp_span,
-            self.center_lon + self.__tmp_span), 4)
-        lat = round(uniform(
-            self.center_lat - self.__tmp_span,
-            self.center_lat + self.__tmp_span), 4)
+    def _rnd_uniform_points(self, num_points):
+        import numpy as np
 
-        return lon, lat
+        return np.column_stack((
+            self._rng.uniform(
+                self.center_lon - self.__tmp_span,
+                self.center_lon + self.__tmp_span,
+                num_points),
+            self._rng.uniform(
+                self.center_lat - self.__tmp_span,
+                self.center_lat + self.__tmp_span,
+                num_points)))
+
+    def _rnd_cluster_points(self, num_points, weights=None):
+        centers = self._rnd_uniform_points(self.num_clusters)
+        sigma = self.__tmp_span * self.cluster_spread
+        if weights is not None:
+            weights = [weight / sum(weights) for weight in weights]
+
+        cluster_idxs = self._rng.choice(
+            self.num_clusters, num_points, p=weights)
+
+        return self._rng.normal(centers[cluster_idxs], sigma)
+
+    def _rnd_corridor_points(self, num_points):
+        import numpy as np
+
+        # points on the center lines and their directions
+        centers = self._rnd_uniform_points(self.num_clusters)
+        angles = self._rng.uniform(0, math.pi, self.num_clusters)
+        sigma = self.__tmp_span * self.cluster_spread
+
+        corridor_idxs = self._rng.integers(self.num_clusters, size=num_points)
+        along = self._rng.uniform(
+            -self.__tmp_span, self.__tmp_span, num_points)
+        across = self._rng.normal(0, sigma, num_points)
+        cos = np.cos(angles[corridor_idxs])
+        sin = np.sin(angles[corridor_idxs])
+
+        return centers[corridor_idxs] + np.column_stack((
+            along * cos - across * sin,
+            along * sin + across * cos))
+
+    def _rnd_points(self, num_points, distribution):
+        """
+        Returns `num_points` random (lon, lat) points following
+        `distribution` as NumPy array, drawn in one batch, so that all of them
+        share the same clusters/corridors
+        """
+        import numpy as np
+
+        if distribution == UNIFORM_DISTRIBUTION:
+            points = self._rnd_uniform_points(num_points)
+
+        elif distribution == HOTSPOTS_DISTRIBUTION:
+            points = self._rnd_cluster_points(num_points)
+
+        elif distribution == ZIPF_DISTRIBUTION:
+            weights = [1 / rank ** self.zipf_exponent
+                       for rank in range(1, self.num_clusters + 1)]
+
+            points = self._rnd_cluster_points(num_points, weights)
+
+        elif distribution == CORRIDORS_DISTRIBUTION:
+            points = self._rnd_corridor_points(num_points)
+
+        else:
+            components = [d for d in DISTRIBUTIONS if d != MIX_DISTRIBUTION]
+            picked = self._rng.integers(len(components), size=num_points)
+
+            points = np.empty((num_points, 2))
+            for component_idx, component in enumerate(components):
+                is_picked = picked == component_idx
+                points[is_picked] = self._rnd_points(
+                    int(is_picked.sum()), component)
+
+        return np.round(points, 4)
 
     def _rnd_neighboring_point(self, point):
         lon = round(gauss(point[0], self._neighboring_point_distance), 4)
@@ -65,9 +200,9 @@ class DataGenerator(object):
 
         return lon, lat
 
-    def _generate_point(self):
-        lon, lat = self._rnd_point()
-        return f'POINT({lon} {lat})'
+    @staticmethod
+    def _generate_point(start_point):
+        return list(start_point)
 
     @staticmethod
     def _line_up_points(start_point, other_points):
@@ -89,9 +224,8 @@ class DataGenerator(object):
 
         return points
 
-    def _generate_line_string(self):
+    def _generate_line_string(self, start_point):
         num_points = randint(self.min_line_points, self.max_line_points)
-        start_point = self._rnd_point()
         tmp_points = []
 
         for i in range(num_points-1):
@@ -102,14 +236,10 @@ class DataGenerator(object):
 
         points = self._line_up_points(start_point, tmp_points)
 
-        point_seq = ', '.join(
-            map(lambda p: str(p[0]) + ' ' + str(p[1]), points))
+        return [coord for point in points for coord in point]
 
-        return f'LINESTRING({point_seq})'
-
-    def _generate_polygon(self):
+    def _generate_polygon(self, start_point):
         num_points = randint(self.min_polygon_points, self.max_polygon_points)
-        start_point = self._rnd_point()
         tmp_points = [start_point]
 
         step = 2 * math.pi / num_points
@@ -136,12 +266,9 @@ class DataGenerator(object):
         points = tmp_points
         points.append(points[0])
 
-        point_seq = ', '.join(
-            map(lambda p: str(p[0]) + ' ' + str(p[1]), points))
-
-        return f'POLYGON(({point_seq}))'
+        return [coord for point in points for coord in point]
 
-    def _write_kb(self, polygons, file_path):
+    def _write_kb(self, geometries, file_path):
         g = Graph()
 
         spatial_feature_cls = URIRef(
@@ -157,9 +284,10 @@ class DataGenerator(object):
         g.add((LINE_FEATURE_CLS, RDFS.subClassOf, spatial_feature_cls))
         g.add((POINT_FEATURE_CLS, RDFS.subClassOf, spatial_feature_cls))
 
-        for wkt_str in polygons:
+        for idx in range(len(geometries)):
+            wkt_str = geometries.get_wkt(idx)
             wkt_lit = Literal(wkt_str, None, self.wkt_dtype)
-            feature_cls = DataSampler._get_feature_cls(wkt_lit)
+            feature_cls = FEATURE_CLASSES[geometries.get_type(idx)]
             hsh = hash(wkt_str)
             feature_res = URIRef(self.ns + f'feature_{hsh}')
             geom_res = URIRef(self.ns + f'geometry_{hsh}')
@@ -171,17 +299,17 @@ class DataGenerator(object):
         with open(file_path, 'wb') as out_file:
             g.serialize(out_file, 'turtle')
 
-    def _write_pg_script(self, polygons, file_path):
+    def _write_pg_script(self, geometries, file_path):
+        table_names = {
+            POINT: self.point_table_name,
+            LINE_STRING: self.line_string_table_name,
+            POLYGON: self.polygon_table_name,
+        }
+
         with open(file_path, 'w') as out_file:
-            for wkt_str in polygons:
-                if wkt_str.lower().startswith('point'):
-                    table_name = self.point_table_name
-                elif wkt_str.lower().startswith('line'):
-                    table_name = self.line_string_table_name
-                elif wkt_str.lower().startswith('polygon'):
-                    table_name = self.polygon_table_name
-                else:
-                    raise RuntimeError(f'Unknown table for {wkt_str}')
+            for idx in range(len(geometries)):
+                wkt_str = geometries.get_wkt(idx)
+                table_name = table_names[geometries.get_type(idx)]
 
                 hsh = hash(wkt_str)
                 geom_iri = self.ns + f'geometry_{hsh}'
@@ -196,26 +324,30 @@ class DataGenerator(object):
         self.__tmp_span = \
             math.sqrt(((num_samples / 10) * self._area_for_10_samples))
 
-        polygons = []
-        for i in range(num_samples):
-            polygon_type = choice(self.polygon_types)
-
-            if not polygon_type == self.polygon_type:
-                polygon_type = choice(self.polygon_types)
-
-            if polygon_type == self.point_type:
-                p = self._generate_point()
-            elif polygon_type == self.line_string_type:
-                p = self._generate_line_string()
+        type_codes = list(self.type_ratios.keys())
+        total_ratio = sum(self.type_ratios.values())
+        types = self._rng.choice(
+            type_codes,
+            num_samples,
+            p=[self.type_ratios[type_code] / total_ratio
+               for type_code in type_codes])
+        start_points = self._rnd_points(num_samples, self.distribution)
+
+        geometries = GeometryCollection()
+        for type_code, start_point in zip(
+                types.tolist(), map(tuple, start_points.tolist())):
+            if type_code == POINT:
+                geometries.append(POINT, [self._generate_point(start_point)])
+            elif type_code == LINE_STRING:
+                geometries.append(
+                    LINE_STRING, [self._generate_line_string(start_point)])
             else:
-                p = self._generate_polygon()
-
-            polygons.append(p)
+                geometries.append(
+                    POLYGON, [self._generate_polygon(start_point)])
 
         kb_file_name = f'kb_{num_samples}.ttl'
-        self._write_kb(polygons, os.path.join(self.output_dir, kb_file_name))
+        self._write_kb(geometries, os.path.join(self.output_dir, kb_file_name))
 
         pg_file_name = f'load_{num_samples}.sql'
         self._write_pg_script(
-            polygons, os.path.join(self.output_dir, pg_file_name))
-        # logging.debug('GEOMETRYCOLLECTION(' + ', '.join(polygons) + ')')
+            geometries, os.path.join(self.output_dir, pg_file_name))
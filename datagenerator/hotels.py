@@ -1,3 +1,4 @@
+import logging
 import os
 from random import randint, gauss, choice, random
 
@@ -6,6 +7,7 @@ from rdflib import Graph, URIRef, RDF, Literal, OWL, RDFS
 from datagenerator import DataGenerator
 from dataloader.datasampler import AREA_FEATURE_CLS, POINT_FEATURE_CLS, \
     LINE_FEATURE_CLS
+from dataloader.spatial import relate_wkts
 
 
 class Hotel(object):
@@ -30,6 +32,22 @@ class Hotel(object):
 
         return s
 
+    def is_car_friendly(self):
+        """
+        Checks the definition of a car-friendly hotel (see
+        `CarFriendlyHotelGenerator.generate_car_friendly_hotel`) on the
+        actual geometries
+        """
+        if self.parking_lot_polygon is None:
+            return False
+
+        return \
+            relate_wkts(self.parking_lot_polygon, self.hotel_polygon, 'ec') \
+            and relate_wkts(
+                self.reception_polygon, self.hotel_polygon, 'tpp') \
+            and relate_wkts(
+                self.reception_polygon, self.parking_lot_polygon, 'ec')
+
     def get_iri(self):
         return URIRef(
             DataGenerator.ns + f'feature_hotel{hash(self.hotel_polygon)}')
@@ -560,7 +578,28 @@ class CarFriendlyHotelGenerator(object):
 
         return g
 
-    def write_hotel_data(self, output_dir):
+    @staticmethod
+    def _verify_labels(car_friendly_hotels, not_car_friendly_hotels):
+        num_mislabeled = 0
+
+        for hotels, label in [(car_friendly_hotels, True),
+                              (not_car_friendly_hotels, False)]:
+            for hotel in hotels:
+                if hotel.is_car_friendly() != label:
+                    num_mislabeled += 1
+                    logging.warning(
+                        f'Hotel {hotel.get_iri()} is labeled as '
+                        f'{"" if label else "not "}car-friendly, but its '
+                        f'geometries say otherwise: {hotel}')
+
+        logging.info(
+            f'{num_mislabeled} of '
+            f'{len(car_friendly_hotels) + len(not_car_friendly_hotels)} '
+            f'hotels are mislabeled')
+
+        return num_mislabeled
+
+    def write_hotel_data(self, output_dir, verify=False):
 
         car_friendly_hotels = []
         for i in range(self.num_pos):
@@ -571,6 +610,9 @@ class CarFriendlyHotelGenerator(object):
             not_car_friendly_hotels.append(
                 self.generate_not_car_friendly_hotel())
 
+        if verify:
+            self._verify_labels(car_friendly_hotels, not_car_friendly_hotels)
+
         with open(os.path.join(output_dir, 'load_hotels.sql'), 'w') as sql_file:
             for hotel in car_friendly_hotels + not_car_friendly_hotels:
                 sql_file.write(hotel.to_pg_sql())
@@ -1,7 +1,84 @@
+import itertools
 import logging
+import os
+import re
+import time
 
-import psycopg2
-from rdflib import Graph, URIRef
+from dataloader.dedup import get_key_set, DEFAULT_BLOOM_CAPACITY
+from dataloader.inputs import guess_format, open_input, split_suffixes, \
+    is_ntriples_file
+from dataloader.metrics import LoadMetrics
+from dataloader.sinks import DatabaseSink, NullSink, CopyFileSink, \
+    ThreadedSink, DEFAULT_QUEUE_SIZE
+
+DEFAULT_MIN_SPLIT_SIZE = 64 * 1024 * 1024
+DEFAULT_COMMIT_INTERVAL = 100000
+DEFAULT_STREAM_CHUNK_LINES = 100000
+
+GEOMETRY_TABLES = [
+    ('polygon', 'Polygon'),
+    ('line_string', 'Linestring'),
+    ('point', 'Point'),
+]
+
+
+def check_dataset_name(dataset):
+    """
+    Dataset names are used as schema names and partition values, so they are
+    restricted to plain lower case SQL identifiers
+    """
+    if not re.fullmatch(r'[a-z_][a-z0-9_]*', dataset):
+        raise ValueError(
+            f'Invalid dataset name {dataset}: only lower case letters, '
+            f'digits and underscores are allowed')
+
+
+def connect(
+        db_name,
+        db_host='localhost',
+        db_port=5432,
+        db_user='postgres',
+        db_pw='postgres',
+        dataset=None):
+    """
+    Connects to the database. If a `dataset` (as created by `init_db`) is
+    given, its schema comes first in the search path, so that the
+    polygon/line_string/point tables refer to the partitions of this dataset.
+    """
+    # psycopg2 and rdflib are imported where they are needed, so that
+    # importing this package (e.g. for the command line help) stays cheap
+    import psycopg2
+
+    return psycopg2.connect(**get_connection_params(
+        db_name, db_host, db_port, db_user, db_pw, dataset))
+
+
+def get_connection_params(
+        db_name,
+        db_host='localhost',
+        db_port=5432,
+        db_user='postgres',
+        db_pw='postgres',
+        dataset=None):
+    """
+    Returns the psycopg2 connection keyword arguments used by `connect`, e.g.
+    for a connection pool. Parameters set to None are left to libpq, which
+    then takes them from the PG* environment variables (e.g. PGPASSWORD) or,
+    for the password, from the pgpass file.
+    """
+    options = None
+    if dataset is not None:
+        check_dataset_name(dataset)
+        options = f'-c search_path={dataset},public'
+
+    return {
+        'dbname': db_name,
+        'host': db_host,
+        'port': db_port,
+        'user': db_user,
+        'password': db_pw,
+        'options': options,
+    }
 
 
 class PostGISDataLoader(object):
@@ -12,6 +89,30 @@ class PostGISDataLoader(object):
     An RDF resource is considered a geometry resource if is has a literal
     assigned via an RDF property contained in the provided list
     `geometry_resource_properties` of known geometry properties.
+    - dry_run: do everything but the database access
+    - emit_dir: write per-table COPY files there instead (see
+      `dataloader.sinks.CopyFileSink`)
+    - cache: take extracted geometries from a
+      `dataloader.cache.GeometryCache`
+    - workers, min_split_size: parse uncompressed N-Triples files of at
+      least this size in line-aligned byte ranges by this many processes
+    - disk_store_threshold, disk_store_dir: parse larger files into an
+      SQLite store there (see `dataloader.diskstore.GeometryTripleStore`)
+    - metrics: a `LoadMetrics` object collecting stage timings and counts
+    - dataset: write to the partitions of this dataset (see `init_db`)
+    - pipelined, queue_size, stream_chunk_lines: write rows in a separate
+      thread through a queue of that many batches while streaming
+      N-Triples files in chunks of that many lines
+    - commit_interval: commit and checkpoint every that many rows
+    - resume: skip finished files and continue the others after their last
+      checkpoint, refused if their size or row order changed
+    - geometry_filter: load only geometries matching a
+      `dataloader.geometry.GeometryFilter`
+    - dedup, bloom_capacity: skip geometries written before within the run
+      via a set of 64 bit hashes ('set') or a Bloom filter ('bloom')
+    - sink: a sink to use as is instead of creating one from the settings
+    Input files may be compressed (gzip, bzip2, xz or zstd). The database
+    connection or the COPY files are kept open until `close` is called.
 
     TODO: Allow different reference systems
     """
@@ -26,7 +127,27 @@ class PostGISDataLoader(object):
             db_host='localhost',
             db_port=5432,
             db_user='postgres',
-            db_pw='postgres'):
+            db_pw='postgres',
+            dry_run=False,
+            metrics=None,
+            emit_dir=None,
+            cache=None,
+            workers=1,
+            min_split_size=DEFAULT_MIN_SPLIT_SIZE,
+            geometry_filter=None,
+            dataset=None,
+            pipelined=False,
+            queue_size=DEFAULT_QUEUE_SIZE,
+            stream_chunk_lines=DEFAULT_STREAM_CHUNK_LINES,
+            commit_interval=DEFAULT_COMMIT_INTERVAL,
+            resume=False,
+            disk_store_threshold=None,
+            disk_store_dir=None,
+            dedup='set',
+            bloom_capacity=DEFAULT_BLOOM_CAPACITY,
+            sink=None):
+
+        from rdflib import URIRef
 
         self.geometry_resource_properties = \
             [URIRef(uri_str) for uri_str in geometry_resource_properties]
@@ -43,73 +164,310 @@ class PostGISDataLoader(object):
         self.db_port = db_port
         self.db_user = db_user
         self.db_pw = db_pw
+        self.dry_run = dry_run
+        self.metrics = metrics if metrics is not None else LoadMetrics()
+        self.emit_dir = emit_dir
+        self.cache = cache
+        self.workers = workers
+        self.min_split_size = min_split_size
+        self.geometry_filter = geometry_filter
+        self.dataset = dataset
+        self.pipelined = pipelined
+        self.queue_size = queue_size
+        self.stream_chunk_lines = stream_chunk_lines
+        self.commit_interval = commit_interval
+        self.resume = resume
+        self.disk_store_threshold = disk_store_threshold
+        self.disk_store_dir = disk_store_dir
+        self._seen_geometries = None
+        if dedup is not None:
+            self._seen_geometries = get_key_set(dedup, bloom_capacity)
+        self._sink = sink
 
-    _suffix_to_format = {
-        'nt': 'ntriples',
-        'ttl': 'turtle',
-        'rdf': 'xml',
-        'xml': 'xml'
-    }
+        self._feature_cls_to_table = {}
+        for tables_feature_classes, table in [
+                (self.area_feature_classes, 'polygon'),
+                (self.line_feature_classes, 'line_string'),
+                (self.point_feature_classes, 'point')]:
+            for feature_cls in tables_feature_classes:
+                self._feature_cls_to_table[str(feature_cls)] = table
 
-    def _guess_format(self, file_path):
-        suffix = file_path.split('.')[-1].lower()
-        return self._suffix_to_format.get(suffix)
+    def connect(self):
+        return connect(
+            self.db_name,
+            self.db_host,
+            self.db_port,
+            self.db_user,
+            self.db_pw,
+            self.dataset)
 
-    def _find_and_load_geometry_data(
-            self,
-            geometry_resource_property: URIRef,
-            geometry_literal_property: URIRef,
-            g: Graph):
-
-        query_res = g.query(f"""
-                SELECT ?feature_cls ?geom_res ?geom_lit
-                WHERE {{
-                    ?feature_res
-                            a ?feature_cls ;
-                            <{str(geometry_resource_property)}> ?geom_res .
-                    ?geom_res <{str(geometry_literal_property)}> ?geom_lit . 
-                }}
-                """)
-
-        conn = psycopg2.connect(
-            dbname=self.db_name,
-            host=self.db_host,
-            port=self.db_port,
-            user=self.db_user,
-            password=self.db_pw)
-        cursor = conn.cursor()
-
-        for feature_cls, geom_res, geom_lit in query_res:
-            if feature_cls in self.point_feature_classes:
-                table = 'point'
-            elif feature_cls in self.line_feature_classes:
-                table = 'line_string'
-            elif feature_cls in self.area_feature_classes:
-                table = 'polygon'
+    def _get_sink(self):
+        if self._sink is None:
+            if self.dry_run:
+                self._sink = NullSink()
+            elif self.emit_dir is not None:
+                self._sink = CopyFileSink(self.emit_dir)
             else:
-                logging.error(f'Unknown feature class <{str(feature_cls)}>')
+                self._sink = DatabaseSink(self.connect())
+
+            if self.pipelined:
+                self._sink = ThreadedSink(self._sink, self.queue_size)
+
+        return self._sink
+
+    def close(self):
+        if self._sink is not None:
+            try:
+                self._sink.close()
+            finally:
+                # a given sink is used as is, i.e. may not be threaded
+                if isinstance(self._sink, ThreadedSink):
+                    self.metrics.seconds['writer_busy'] += \
+                        self._sink.busy_seconds
+                self.metrics.rows_duplicate += self._sink.conflicts
+                self._sink = None
+
+    def _guess_format(self, file_path):
+        return guess_format(file_path)
+
+    def _use_split(self, rdf_file_path):
+        _, compression = split_suffixes(rdf_file_path)
+
+        return self.workers > 1 and compression is None and \
+            is_ntriples_file(rdf_file_path) and \
+            os.path.getsize(rdf_file_path) >= self.min_split_size
+
+    def _extract(self, rdf_file_path):
+        from rdflib import Graph
+
+        from dataloader.diskstore import parse_and_extract_on_disk
+        from dataloader.extraction import extract_geometries, \
+            parallel_parse_and_extract, use_disk_store
+
+        if self._use_split(rdf_file_path):
+            with self.metrics.timer('parse'):
+                return parallel_parse_and_extract(
+                    rdf_file_path,
+                    self.geometry_resource_properties,
+                    self.geometry_literal_properties,
+                    self.workers)
+
+        if use_disk_store(rdf_file_path, self.disk_store_threshold):
+            with self.metrics.timer('parse'):
+                with open_input(rdf_file_path) as input_file:
+                    return parse_and_extract_on_disk(
+                        input_file,
+                        self._guess_format(rdf_file_path),
+                        self.geometry_resource_properties,
+                        self.geometry_literal_properties,
+                        self.disk_store_dir)
+
+        g = Graph()
+
+        with self.metrics.timer('parse'):
+            with open_input(rdf_file_path) as input_file:
+                g.parse(input_file, format=self._guess_format(rdf_file_path))
+
+        with self.metrics.timer('query'):
+            return list(extract_geometries(
+                g,
+                self.geometry_resource_properties,
+                self.geometry_literal_properties))
+
+    def _extract_sorted(self, rdf_file_path):
+        rows = self._extract(rdf_file_path)
+
+        # the extraction order depends on the rdflib store internals (and
+        # string hashing), but resuming after a checkpoint needs the rows
+        # of a file in the same order in each run
+        with self.metrics.timer('sort'):
+            rows.sort()
+
+        return rows
+
+    def _get_geometry_rows(self, rdf_file_path):
+        if self.cache is None:
+            return self._extract_sorted(rdf_file_path)
+
+        settings_key = repr((
+            [str(p) for p in self.geometry_resource_properties],
+            [str(p) for p in self.geometry_literal_properties]))
+
+        return self.cache.get(
+            rdf_file_path, self._extract_sorted, settings_key)
+
+    def _use_stream(self, rdf_file_path):
+        return self.pipelined and self.cache is None and \
+            self.workers == 1 and is_ntriples_file(rdf_file_path)
+
+    def _stream_geometry_rows(self, rdf_file_path):
+        from dataloader.extraction import stream_geometries
+
+        return stream_geometries(
+            rdf_file_path,
+            self.geometry_resource_properties,
+            self.geometry_literal_properties,
+            self.stream_chunk_lines,
+            self.metrics)
+
+    def _use_disk_store_stream(self, rdf_file_path):
+        from dataloader.extraction import use_disk_store
+
+        return self.cache is None and not self._use_split(rdf_file_path) and \
+            use_disk_store(rdf_file_path, self.disk_store_threshold)
+
+    def _stream_disk_store_rows(self, rdf_file_path):
+        from dataloader.diskstore import stream_geometries_on_disk
+
+        with open_input(rdf_file_path) as input_file:
+            yield from stream_geometries_on_disk(
+                input_file,
+                self._guess_format(rdf_file_path),
+                self.geometry_resource_properties,
+                self.geometry_literal_properties,
+                self.disk_store_dir,
+                self.metrics)
+
+    def _get_row_order(self, rdf_file_path):
+        # All other paths sort the rows of a file, so that they come in the
+        # same order regardless of workers, cache or disk store. Streamed
+        # rows are only sorted within a chunk.
+        if self._use_stream(rdf_file_path):
+            return f'stream:{self.stream_chunk_lines}'
+
+        return 'sorted'
+
+    def _load_rows(
+            self, rows, source, source_size, row_order, row_offset=0,
+            rows_written=0):
+
+        start = time.perf_counter()
+        # streamed rows are parsed (and sorted) while iterating over them
+        stream_start_secs = \
+            self.metrics.seconds['parse'] + self.metrics.seconds['sort']
+        write_secs = 0
+        sink = self._get_sink()
+
+        for _, feature_cls, geom_iri, wkt in itertools.islice(
+                rows, row_offset, None):
+            row_offset += 1
+
+            if self.geometry_filter is not None and \
+                    not self.geometry_filter.matches(wkt):
+                self.metrics.filter_row()
                 continue
 
-            geom_res_str = str(geom_res)
-            wkt_expr = str(geom_lit)
-            cursor.execute(f"""
-            INSERT INTO {table}
-            VALUES ('{geom_res_str}', ST_GeomFromText('{wkt_expr}'))
-            """)
+            table = self._feature_cls_to_table.get(feature_cls)
+
+            if table is None:
+                if feature_cls:
+                    logging.error(f'Unknown feature class <{feature_cls}>')
+                    self.metrics.drop_row()
+                continue
+
+            if self._seen_geometries is not None and \
+                    self._seen_geometries.add(f'{table}\t{geom_iri}'):
+                self.metrics.duplicate_row()
+                continue
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+            write_start = time.perf_counter()
+            sink.write(table, geom_iri, wkt)
+            rows_written += 1
+
+            if rows_written % self.commit_interval == 0:
+                sink.checkpoint(
+                    source, source_size, row_offset, rows_written, False,
+                    row_order)
+                sink.commit()
+            write_secs += time.perf_counter() - write_start
+
+            self.metrics.add_row(table)
+
+        write_start = time.perf_counter()
+        sink.checkpoint(
+            source, source_size, row_offset, rows_written, True, row_order)
+        sink.commit()
+        write_secs += time.perf_counter() - write_start
+
+        self.metrics.seconds['write'] += write_secs
+        self.metrics.seconds['classify'] += \
+            time.perf_counter() - start - write_secs - \
+            (self.metrics.seconds['parse'] + self.metrics.seconds['sort'] -
+             stream_start_secs)
+
+    def _get_resume_offset(self, source, source_size, row_order):
+        """
+        Returns the number of extracted rows of `source` already processed
+        and the number of rows written by previous runs, or None if the file
+        was loaded completely
+        """
+        checkpoint = self._get_sink().get_checkpoint(source)
+        if checkpoint is None:
+            return 0, 0
+
+        checkpoint_size, row_offset, rows_written, finished, \
+            checkpoint_row_order = checkpoint
+        if checkpoint_size != source_size:
+            raise RuntimeError(
+                f'{source} changed since its last checkpoint, resuming is '
+                f'not possible')
+
+        if finished:
+            logging.info(f'Skipping {source} which was loaded completely')
+            return None
+
+        if checkpoint_row_order != row_order:
+            raise RuntimeError(
+                f'{source} was loaded with row order {checkpoint_row_order} '
+                f'but would be resumed with {row_order}, resume with the '
+                f'same pipelined and chunk settings')
+
+        logging.info(
+            f'Resuming {source} after {row_offset} rows '
+            f'({rows_written} written)')
+
+        return row_offset, rows_written
 
     def load_geometry_data(self, rdf_file_path):
-        guessed_format = self._guess_format(rdf_file_path)
-        g = Graph()
-        g.load(rdf_file_path, format=guessed_format)
+        source = os.path.abspath(rdf_file_path)
+        source_size = os.path.getsize(rdf_file_path)
+        row_order = self._get_row_order(rdf_file_path)
+
+        row_offset, rows_written = 0, 0
+        if self.resume:
+            resume_offset = self._get_resume_offset(
+                source, source_size, row_order)
+            if resume_offset is None:
+                return
+            row_offset, rows_written = resume_offset
+
+        if self._use_stream(rdf_file_path):
+            rows = self._stream_geometry_rows(rdf_file_path)
+        elif self._use_disk_store_stream(rdf_file_path):
+            rows = self._stream_disk_store_rows(rdf_file_path)
+        else:
+            rows = self._get_geometry_rows(rdf_file_path)
+
+        self.metrics.files += 1
+        self.metrics.bytes_read += source_size
 
-        for geom_res_prop in self.geometry_resource_properties:
-            for geom_lit_prop in self.geometry_literal_properties:
-                self._find_and_load_geometry_data(
-                    geom_res_prop, geom_lit_prop, g)
+        self._get_sink().add_source(rdf_file_path)
+        self._load_rows(
+            rows, source, source_size, row_order, row_offset, rows_written)
+
+
+def _create_dataset_partitions(cursor, dataset):
+    check_dataset_name(dataset)
+    cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {dataset};')
+
+    for table, _ in GEOMETRY_TABLES:
+        # the default of the dataset column lets inserts into the partition
+        # (i.e. into the table found via the search path) omit it
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {dataset}.{table}
+        PARTITION OF public.{table} (dataset DEFAULT '{dataset}')
+        FOR VALUES IN ('{dataset}');
+        """)
 
 
 def init_db(
@@ -117,36 +475,74 @@ def init_db(
         db_host='localhost',
         db_port=5432,
         db_user='postgres',
-        db_pw='postgres'):
-    conn = psycopg2.connect(
-        dbname=db_name,
-        host=db_host,
-        port=db_port,
-        user=db_user,
-        password=db_pw)
+        db_pw='postgres',
+        datasets=None,
+        unique_iris=False):
+    """
+    Creates the polygon, line_string and point tables. Without `datasets`
+    these are plain tables. With `datasets`, they are created as tables
+    list-partitioned by a dataset column, with one partition per dataset
+    living in a schema named after the dataset. A dataset is chosen by
+    putting its schema first in the search path (see `connect`), and
+    datasets can be added to an existing database later on by calling
+    `init_db` again.
+    With `unique_iris` set, the IRIs of each table (and dataset) are unique,
+    so that loading a geometry twice is skipped by the database.
+    """
+    conn = connect(db_name, db_host, db_port, db_user, db_pw)
     cursor = conn.cursor()
     cursor.execute('CREATE EXTENSION IF NOT EXISTS postgis WITH SCHEMA public;')
 
-    cursor.execute("""
-    CREATE TABLE polygon (
-        iri character varying(255),
-        the_geom geometry(Polygon)
-    );
-    """)
-
-    cursor.execute("""
-    CREATE TABLE line_string (
-        iri character varying(255),
-        the_geom geometry(Linestring)
-    );
-    """)
-
-    cursor.execute("""
-    CREATE TABLE point (
-        iri character varying(255),
-        the_geom geometry(Point)
-    );
-    """)
+    for table, geometry_type in GEOMETRY_TABLES:
+        if datasets is None:
+            unique = ' UNIQUE' if unique_iris else ''
+            cursor.execute(f"""
+            CREATE TABLE {table} (
+                iri character varying(255){unique},
+                the_geom geometry({geometry_type})
+            );
+            """)
+        else:
+            # unique constraints of partitioned tables have to include the
+            # partition key
+            unique = ',\n                UNIQUE (iri, dataset)' \
+                if unique_iris else ''
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS public.{table} (
+                iri character varying(255),
+                the_geom geometry({geometry_type}),
+                dataset character varying(63) NOT NULL{unique}
+            ) PARTITION BY LIST (dataset);
+            """)
+
+    for dataset in datasets or []:
+        _create_dataset_partitions(cursor, dataset)
+
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def drop_dataset(
+        db_name,
+        dataset,
+        db_host='localhost',
+        db_port=5432,
+        db_user='postgres',
+        db_pw='postgres'):
+    """
+    Detaches the partitions of a dataset created by `init_db` and drops them
+    together with the dataset schema
+    """
+    check_dataset_name(dataset)
+
+    conn = connect(db_name, db_host, db_port, db_user, db_pw)
+    cursor = conn.cursor()
+
+    for table, _ in GEOMETRY_TABLES:
+        cursor.execute(
+            f'ALTER TABLE public.{table} DETACH PARTITION {dataset}.{table};')
+    cursor.execute(f'DROP SCHEMA {dataset} CASCADE;')
 
     conn.commit()
     cursor.close()
@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import mmap
+import os
+from array import array
+
+DEFAULT_MAX_CACHE_SIZE = 1024 * 1024 * 1024
+
+_STRINGS_SUFFIX = '.strings'
+_OFFSETS_SUFFIX = '.offsets'
+
+
+def _map_file(file_path):
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class GeometryTable(object):
+    """
+    Read-only sequence of (feature IRI, feature class, geometry IRI, WKT)
+    tuples stored as one UTF-8 string table and an array of 64 bit offsets
+    into it (four per tuple, plus the end offset). Loaded tables are memory
+    mapped, so only the strings actually accessed are read and decoded.
+    """
+    __slots__ = ('_strings', '_offsets')
+
+    num_columns = 4
+
+    def __init__(self, strings, offsets):
+        self._strings = strings
+        self._offsets = offsets
+
+    @classmethod
+    def from_rows(cls, rows):
+        strings = bytearray()
+        offsets = array('Q', [0])
+
+        for row in rows:
+            for value in row:
+                strings += value.encode('utf-8')
+                offsets.append(len(strings))
+
+        return cls(bytes(strings), offsets)
+
+    @classmethod
+    def load(cls, file_path_prefix):
+        strings = _map_file(file_path_prefix + _STRINGS_SUFFIX)
+        offsets_buffer = _map_file(file_path_prefix + _OFFSETS_SUFFIX)
+        offsets = memoryview(offsets_buffer).cast('Q')
+
+        return cls(strings, offsets)
+
+    def save(self, file_path_prefix):
+        # written to temporary files first so that concurrent readers never
+        # see half-written entries
+        for suffix, data in [
+                (_STRINGS_SUFFIX, self._strings),
+                (_OFFSETS_SUFFIX, memoryview(self._offsets).cast('B'))]:
+
+            tmp_file_path = file_path_prefix + suffix + f'.{os.getpid()}.tmp'
+            with open(tmp_file_path, 'wb') as out_file:
+                out_file.write(data)
+
+            os.replace(tmp_file_path, file_path_prefix + suffix)
+
+    def __len__(self):
+        return (len(self._offsets) - 1) // self.num_columns
+
+    def _get_string(self, idx):
+        return str(
+            self._strings[self._offsets[idx]:self._offsets[idx + 1]],
+            'utf-8')
+
+    def __getitem__(self, row_idx):
+        if row_idx < 0:
+            row_idx += len(self)
+        if not 0 <= row_idx < len(self):
+            raise IndexError(row_idx)
+
+        first = row_idx * self.num_columns
+
+        return tuple(
+            self._get_string(first + col) for col in range(self.num_columns))
+
+    def __iter__(self):
+        for row_idx in range(len(self)):
+            yield self[row_idx]
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    file_hash = hashlib.sha256()
+
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+class GeometryCache(object):
+    """
+    On-disk cache of the (feature IRI, feature class, geometry IRI, WKT)
+    tuples extracted from RDF files, keyed by the hash of the file content and
+    the extraction settings (e.g. the geometry properties used). If the cache
+    grows beyond `max_size` bytes, the least recently used entries are
+    evicted.
+    """
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_CACHE_SIZE):
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def _get_entry_path_prefix(self, file_path, settings_key):
+        settings_hash = hashlib.sha1(settings_key.encode('utf-8')).hexdigest()
+
+        return os.path.join(
+            self.cache_dir, f'{hash_file(file_path)}-{settings_hash[:16]}')
+
+    def _evict(self):
+        entries = {}
+
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith((_STRINGS_SUFFIX, _OFFSETS_SUFFIX)):
+                continue
+
+            file_path = os.path.join(self.cache_dir, file_name)
+            prefix = os.path.splitext(file_path)[0]
+            stat = os.stat(file_path)
+
+            size, last_used = entries.get(prefix, (0, 0))
+            entries[prefix] = \
+                (size + stat.st_size, max(last_used, stat.st_mtime))
+
+        total_size = sum(size for size, _ in entries.values())
+
+        for prefix, (size, _) in sorted(
+                entries.items(), key=lambda e: e[1][1]):
+            if total_size <= self.max_size:
+                break
+
+            logging.debug(f'Evicting {prefix} from geometry cache')
+            for suffix in (_STRINGS_SUFFIX, _OFFSETS_SUFFIX):
+                try:
+                    os.remove(prefix + suffix)
+                except FileNotFoundError:
+                    pass
+
+            total_size -= size
+
+    def get(self, file_path, extract, settings_key=''):
+        """
+        Returns the `GeometryTable` of `file_path`, calling
+        `extract(file_path)` to get the tuples if they are not cached yet.
+        """
+        prefix = self._get_entry_path_prefix(file_path, settings_key)
+
+        try:
+            table = GeometryTable.load(prefix)
+            # the modification time serves as last access time for the LRU
+            # eviction
+            os.utime(prefix + _STRINGS_SUFFIX)
+            self.hits += 1
+
+            return table
+
+        except FileNotFoundError:
+            pass
+
+        self.misses += 1
+        table = GeometryTable.from_rows(extract(file_path))
+        table.save(prefix)
+        self._evict()
+
+        return table
@@ -1,23 +1,92 @@
+import logging
 import os
 import random
+import tempfile
+from functools import partial
 
-from rdflib import Graph, URIRef, RDF
+from rdflib import Graph, URIRef, RDF, Literal
 
-import logging
-logging.basicConfig(level=logging.DEBUG)
+from dataloader.cache import GeometryCache
+from dataloader.extraction import parse_and_extract
+from dataloader.geometry import GeometryCollection, GeometryFilter, POINT, \
+    LINE_STRING, POLYGON
+from dataloader.inputs import is_ntriples_file
 
 GEOVOCAB_GEOMETRY = URIRef('http://geovocab.org/geometry#geometry')
 GEOSPARQL_AS_WKT = URIRef('http://www.opengis.net/ont/geosparql#asWKT')
+WKT_LITERAL_DTYPE = \
+    URIRef('http://www.opengis.net/ont/geosparql#wktLiteral')
 
 POINT_FEATURE_CLS = URIRef('http://dl-learner.org/spatial#PointFeature')
 LINE_FEATURE_CLS = URIRef('http://dl-learner.org/spatial#LineFeature')
 AREA_FEATURE_CLS = URIRef('http://dl-learner.org/spatial#AreaFeature')
 
+FEATURE_CLASSES = {
+    POINT: POINT_FEATURE_CLS,
+    LINE_STRING: LINE_FEATURE_CLS,
+    POLYGON: AREA_FEATURE_CLS,
+}
+
+DEFAULT_SAMPLE_SIZES = [
+    500, 1000, 1500, 2000, 2500, 3000, 3500, 4000, 4500, 5000, 5500, 6000,
+    6500, 7000, 7500, 8000, 8500, 9000, 9500, 10000, 10500, 11000, 11500,
+    12000, 12500, 13000, 13500, 14000, 14500, 15000]
+
+UNIFORM_MODE = 'uniform'
+STRATIFIED_MODE = 'stratified'
+DEFAULT_CELL_SIZE = 0.01
+
+
+def _extract_sample_geometries(file_path, disk_store_threshold=None):
+    rows = parse_and_extract(
+        file_path,
+        'ntriples',
+        [GEOVOCAB_GEOMETRY],
+        [GEOSPARQL_AS_WKT],
+        disk_store_threshold)
+
+    # the feature classes are not needed for sampling, so one row per
+    # feature and geometry is enough
+    return list(dict.fromkeys(
+        (feature, '', geom, wkt) for feature, _, geom, wkt in rows))
+
 
 class DataSampler(object):
-    def __init__(self, data_dir, owl_output_file_path, pg_output_file_path):
+    """
+    Samples the geometries of the N-Triples files in `data_dir` into N-Triples
+    and SQL files of the given sizes.
+    In the uniform mode the samples are drawn uniformly at random (with each
+    file contributing according to its share of geometries), so that the
+    density of the samples follows the density of the data. In the stratified
+    mode the geometries are put into a grid of `cell_size` degrees. Without a
+    `target_density` the samples are spread as evenly as possible over the
+    non-empty cells, so that the density, and with it the selectivity of
+    spatial joins, grows predictably with the sample size. With a
+    `target_density` each cell used gets that many samples and larger samples
+    cover more (randomly chosen) cells, so that the density and join
+    selectivity stay the same for all sample sizes. The number of geometries
+    and samples per cell is then written next to each SQL file
+    (`<file>_<size>.cells.tsv`).
+    Sample sizes which can not be filled (with the geometries matching the
+    filter, or with cells holding `target_density` geometries) are skipped
+    with a warning, rather than writing fewer samples than the file name
+    says.
+    """
+    def __init__(
+            self,
+            data_dir,
+            owl_output_file_path,
+            pg_output_file_path,
+            cache=None,
+            geometry_filter=None,
+            mode=UNIFORM_MODE,
+            cell_size=DEFAULT_CELL_SIZE,
+            disk_store_threshold=None,
+            target_density=None):
+
         self.data_dir = data_dir
-        self.nt_files = [f for f in os.listdir(data_dir) if f.endswith('.nt')]
+        self.nt_files = \
+            [f for f in os.listdir(data_dir) if is_ntriples_file(f)]
 
         self.owl_output_file_path = owl_output_file_path
         self.pg_output_file_path = pg_output_file_path
@@ -25,141 +94,330 @@ class DataSampler(object):
         self.point_table_name = 'point'
         self.line_str_table_name = 'line_string'
         self.polygon_table_name = 'polygon'
+        self._table_names = {
+            POINT: self.point_table_name,
+            LINE_STRING: self.line_str_table_name,
+            POLYGON: self.polygon_table_name,
+        }
+
+        if cache is None:
+            # Each file is read many times while sampling, so the extracted
+            # geometries are cached at least for the lifetime of the sampler
+            self._tmp_cache_dir = \
+                tempfile.TemporaryDirectory(prefix='geometry_cache_')
+            cache = GeometryCache(self._tmp_cache_dir.name)
+
+        self.cache = cache
+
+        # only the geometries matching the filter (a
+        # `dataloader.geometry.GeometryFilter`) are counted and sampled,
+        # unsupported geometries (e.g. multi polygons) never are
+        self.geometry_filter = geometry_filter \
+            if geometry_filter is not None else GeometryFilter()
+        self._matching_indices = {}
+        # file name -> `GeometryCollection` of the matching geometries
+        self._collections = {}
+
+        self.mode = mode
+        self.cell_size = cell_size
+        self.target_density = target_density
+        self._grid = None
+
+        # files of at least this size are parsed into an on-disk store (see
+        # `dataloader.diskstore.GeometryTripleStore`)
+        self.disk_store_threshold = disk_store_threshold
+
+    def _get_geometries(self, filename):
+        return self.cache.get(
+            os.path.join(self.data_dir, filename),
+            partial(
+                _extract_sample_geometries,
+                disk_store_threshold=self.disk_store_threshold),
+            'sample')
+
+    def _get_matching_indices(self, filename):
+        """
+        Returns the indices of the matching geometries of a file
+        """
+        indices = self._matching_indices.get(filename)
+
+        if indices is None:
+            indices = [
+                idx for idx, (_, _, _, wkt) in
+                enumerate(self._get_geometries(filename))
+                if self.geometry_filter.matches(wkt)]
+            self._matching_indices[filename] = indices
+
+        return indices
+
+    def _get_collection(self, filename):
+        """
+        Returns the matching geometries of a file as `GeometryCollection`,
+        i.e. the geometry at position i is the one at index i of
+        `_get_matching_indices`
+        """
+        collection = self._collections.get(filename)
+
+        if collection is None:
+            geometries = self._get_geometries(filename)
+            collection = GeometryCollection()
+            # appended one by one to not hold all WKT strings at once
+            for idx in self._get_matching_indices(filename):
+                collection.append_wkt(geometries[idx][3])
+            self._collections[filename] = collection
+
+        return collection
+
+    def _add_samples(
+            self, filename, positions, result_graph, result_sql_lines):
+        """
+        Adds the matching geometries of a file at the given positions
+        """
+        geometries = self._get_geometries(filename)
+        indices = self._get_matching_indices(filename)
+        collection = self._get_collection(filename)
+
+        for pos in positions:
+            self._add_sample(
+                geometries[indices[pos]],
+                collection.get_type(pos),
+                result_graph,
+                result_sql_lines)
+
+    def _add_sample(
+            self, geometry_row, type_code, result_graph, result_sql_lines):
+        feature_iri, _, geom_iri, wkt = geometry_row
+
+        feature = URIRef(feature_iri)
+        geom = URIRef(geom_iri)
+        wkt_lit = Literal(wkt, None, WKT_LITERAL_DTYPE)
+
+        result_graph.add((feature, RDF.type, FEATURE_CLASSES[type_code]))
+        result_graph.add((feature, GEOVOCAB_GEOMETRY, geom))
+        result_graph.add((geom, GEOSPARQL_AS_WKT, wkt_lit))
+
+        table_name = self._table_names[type_code]
+
+        result_sql_lines.append(
+            f"INSERT INTO {table_name} "
+            f"VALUES ('{geom}', ST_GeomFromText('{wkt}')); \n")
+
+    def _sample_uniform(
+            self, num_samples, triple_counts, result_graph, result_sql_lines):
+
+        total_triple_count = sum(map(lambda c: c[1], triple_counts.items()))
+        sample_ratio = num_samples / total_triple_count
+
+        sampled = {}
+        for filename, count in triple_counts.items():
+            num_triples_to_sample = round(count * sample_ratio)
+            if num_triples_to_sample == 0:
+                logging.warning(
+                    f'File {filename} skipped due to too few triples')
+
+            sampled[filename] = set(
+                random.sample(range(count), num_triples_to_sample))
+
+        # the rounded shares of the files may not add up to `num_samples`
+        num_sampled = sum(map(len, sampled.values()))
+        while num_sampled > num_samples:
+            filename = random.choice(
+                [filename for filename, idxs in sampled.items() if idxs])
+            sampled[filename].remove(random.choice(list(sampled[filename])))
+            num_sampled -= 1
+
+        while num_sampled < num_samples:
+            filename = random.choice(
+                [filename for filename, idxs in sampled.items()
+                 if len(idxs) < triple_counts[filename]])
+            logging.info(f'Sampling 1 triple from randomly chosen file '
+                         f'{filename}')
+            sampled[filename].add(random.choice(
+                [pos for pos in range(triple_counts[filename])
+                 if pos not in sampled[filename]]))
+            num_sampled += 1
+
+        for filename, positions in sampled.items():
+            logging.info(f'Sampling {len(positions)} triples from {filename}')
+            self._add_samples(
+                filename, sorted(positions), result_graph, result_sql_lines)
+
+    def _get_grid(self):
+        """
+        Returns the grid of `cell_size` degrees as arrays (cells,
+        cell_offsets, file_nos, positions): cell number i is the
+        (column, row) cell cells[i] holding the geometries whose extent center
+        lies in it, i.e. the entries cell_offsets[i] to cell_offsets[i + 1] -
+        1. Entry j is the geometry at position positions[j] of the file
+        nt_files[file_nos[j]].
+        """
+        if self._grid is None:
+            import numpy as np
+
+            file_nos = [np.empty(0, np.int64)]
+            positions = [np.empty(0, np.int64)]
+            cells = [np.empty((0, 2), np.int64)]
+
+            for file_no, filename in enumerate(self.nt_files):
+                collection = self._get_collection(filename)
+                bboxes = np.frombuffer(collection.bboxes()).reshape(-1, 4)
+                # computed in place to not copy the bounding boxes again
+                centers = bboxes[:, :2] + bboxes[:, 2:]
+                centers /= 2 * self.cell_size
+                np.floor(centers, out=centers)
+
+                file_nos.append(np.full(len(collection), file_no))
+                positions.append(np.arange(len(collection)))
+                cells.append(centers.astype(np.int64))
+
+            cells = np.concatenate(cells)
+            order = np.lexsort((cells[:, 1], cells[:, 0]))
+            cells = cells[order]
+            cell_offsets = np.flatnonzero(
+                np.any(cells[1:] != cells[:-1], axis=1)) + 1
+            cell_offsets = np.concatenate(
+                ([0] if len(cells) else [], cell_offsets, [len(cells)])) \
+                .astype(np.int64)
+
+            self._grid = (
+                cells[cell_offsets[:-1]],
+                cell_offsets,
+                np.concatenate(file_nos)[order],
+                np.concatenate(positions)[order])
+
+        return self._grid
 
     @staticmethod
-    def _get_feature_cls(wkt_lit):
-        wkt_lit_str = str(wkt_lit)
-        if wkt_lit_str.startswith('POINT'):
-            return POINT_FEATURE_CLS
-        elif wkt_lit_str.startswith('LINE'):
-            return LINE_FEATURE_CLS
-        elif wkt_lit_str.startswith('POLY'):
-            return AREA_FEATURE_CLS
-        else:
-            raise RuntimeError(f'Unknown type of {wkt_lit_str}')
-
-    def sample(self):
+    def _allocate_per_cell(cell_counts, num_samples, target_density=None):
+        """
+        Distributes `num_samples` over the cells as evenly as possible, i.e.
+        cells with fewer geometries than their share contribute all of them
+        and the rest is split among the other cells.
+        With a `target_density`, randomly chosen cells holding at least that
+        many geometries get `target_density` samples each (the last one
+        fewer if `num_samples` is no multiple of it).
+        The allocation may add up to less than `num_samples` if there are
+        not enough (dense enough) cells.
+        """
+        if target_density is not None:
+            cells = [cell for cell, count in cell_counts.items()
+                     if count >= target_density]
+            random.shuffle(cells)
+
+            allocation = {}
+            remaining = num_samples
+            for cell in cells:
+                if remaining == 0:
+                    break
+                allocation[cell] = min(target_density, remaining)
+                remaining -= allocation[cell]
+
+            return allocation
+
+        allocation = {}
+        remaining = num_samples
+        # shuffled first so that cells of the same size left without
+        # samples are chosen at random
+        cells = list(cell_counts)
+        random.shuffle(cells)
+        cells.sort(key=cell_counts.get)
+
+        for i, cell in enumerate(cells):
+            share = remaining // (len(cells) - i)
+            allocation[cell] = min(cell_counts[cell], share)
+            remaining -= allocation[cell]
+
+        return allocation
+
+    def _sample_stratified(self, num_samples, result_graph, result_sql_lines):
+        """
+        Returns the number of samples per cell number (see `_get_grid`) or
+        None if `num_samples` can't be allocated
+        """
+        cells, cell_offsets, file_nos, positions = self._get_grid()
+        allocation = self._allocate_per_cell(
+            dict(enumerate(
+                (cell_offsets[1:] - cell_offsets[:-1]).tolist())),
+            num_samples,
+            self.target_density)
+
+        num_allocated = sum(allocation.values())
+        if num_allocated < num_samples:
+            return None
+
+        logging.info(f'Sampling {num_allocated} triples from '
+                     f'{len(allocation)} of {len(cells)} grid cells')
+
+        for cell, num_cell_samples in allocation.items():
+            for entry in random.sample(
+                    range(cell_offsets[cell], cell_offsets[cell + 1]),
+                    num_cell_samples):
+                self._add_samples(
+                    self.nt_files[file_nos[entry]],
+                    [positions[entry]],
+                    result_graph,
+                    result_sql_lines)
+
+        return allocation
+
+    def _write_cell_counts(self, num_samples, allocation):
+        cells, cell_offsets, _, _ = self._get_grid()
+
+        with open(self.pg_output_file_path + f'_{num_samples}.cells.tsv', 'w') \
+                as cells_out:
+            cells_out.write('min_lon\tmin_lat\tgeometries\tsampled\n')
+
+            for cell, num_cell_samples in sorted(allocation.items()):
+                col, row = cells[cell].tolist()
+                num_geometries = cell_offsets[cell + 1] - cell_offsets[cell]
+                cells_out.write(
+                    f'{round(col * self.cell_size, 9)!r}\t'
+                    f'{round(row * self.cell_size, 9)!r}\t'
+                    f'{num_geometries}\t{num_cell_samples}\n')
+
+    def sample(self, sample_sizes=None):
         triple_counts = self._get_triple_counts()
-        total_triple_count = sum(map(lambda c: c[1], triple_counts.items()))
 
-        for num_samples in [
-                500, 1000, 1500, 2000, 2500, 3000, 3500, 4000, 4500, 5000,
-                5500, 6000, 6500, 7000, 7500, 8000, 8500, 9000, 9500, 10000,
-                10500, 11000, 11500, 12000, 12500, 13000, 13500, 14000, 14500,
-                15000]:
+        if sum(triple_counts.values()) == 0:
+            logging.warning('No geometries to sample from')
+            return
 
-            sample_ratio = num_samples / total_triple_count
+        num_available = sum(triple_counts.values())
 
+        for num_samples in sample_sizes or DEFAULT_SAMPLE_SIZES:
             result_graph = Graph()
-            result_sql_content = ''
-
-            samples_extracted = 0
-            for filename, count in triple_counts.items():
-                num_triples_to_sample = round(count * sample_ratio)
-                if num_triples_to_sample == 0:
-                    logging.warn(
-                        f'File {filename} skipped due to too few triples')
+            result_sql_lines = []
+
+            if num_samples > num_available:
+                logging.warning(
+                    f'Skipping sample size {num_samples}, there are only '
+                    f'{num_available} geometries to sample from')
+                continue
+
+            if self.mode == STRATIFIED_MODE:
+                allocation = self._sample_stratified(
+                    num_samples, result_graph, result_sql_lines)
+                if allocation is None:
+                    logging.warning(
+                        f'Skipping sample size {num_samples}, there are not '
+                        f'enough grid cells with {self.target_density} '
+                        f'geometries')
                     continue
-
-                logging.info(f'Loading {filename} for sampling '
-                             f'{num_triples_to_sample} triples')
-                g = Graph()
-                g.load(os.path.join(self.data_dir, filename), format='ntriples')
-
-                query_result = g.query(f"""
-                    SELECT ?feature ?geom ?wkt_lit ?rand
-                    WHERE {{
-                        ?feature <http://geovocab.org/geometry#geometry> ?geom .
-                        ?geom <http://www.opengis.net/ont/geosparql#asWKT> ?wkt_lit .
-                        BIND( RAND() AS ?rand)
-                    }} ORDER BY ?rand LIMIT {num_triples_to_sample}
-                    """)
-
-                for feature, geom, wkt_lit, _ in query_result:
-                    feature_cls = self._get_feature_cls(wkt_lit)
-                    result_graph.add((feature, RDF.type, feature_cls))
-                    result_graph.add((feature, GEOVOCAB_GEOMETRY, geom))
-                    result_graph.add((geom, GEOSPARQL_AS_WKT, wkt_lit))
-
-                    table_name = self._get_table_name(wkt_lit)
-
-                    result_sql_content += \
-                        f"INSERT INTO {table_name} " \
-                        f"VALUES (" \
-                            f"'{geom}', ST_GeomFromText('{str(wkt_lit)}')); \n"
-
-                samples_extracted += num_triples_to_sample
-                del g
-
-                while samples_extracted < num_samples:
-                    filename = random.choice(list(triple_counts.keys()))
-
-                    logging.info(f'Loading randomly chosen file {filename} '
-                                 f'to sample 1 triple')
-                    g = Graph()
-                    g.load(os.path.join(self.data_dir, filename),
-                           format='ntriples')
-
-                    query_result = g.query(f"""
-                        SELECT ?feature ?geom ?wkt_lit ?rand
-                        WHERE {{
-                            ?feature <http://geovocab.org/geometry#geometry> ?geom .
-                            ?geom <http://www.opengis.net/ont/geosparql#asWKT> ?wkt_lit .
-                            BIND( RAND() AS ?rand)
-                        }} ORDER BY ?rand LIMIT 1
-                        """)
-
-                    for feature, geom, wkt_lit, _ in query_result:
-                        result_graph.add((feature, GEOVOCAB_GEOMETRY, geom))
-                        result_graph.add((geom, GEOSPARQL_AS_WKT, wkt_lit))
-
-                        table_name = self._get_table_name(wkt_lit)
-
-                        result_sql_content += \
-                            f"INSERT INTO {table_name} " \
-                            f"VALUES (" \
-                                f"'{geom}', " \
-                                f"ST_GeomFromText('{str(wkt_lit)}')); \n"
-
-                    samples_extracted += 1
+                self._write_cell_counts(num_samples, allocation)
+            else:
+                self._sample_uniform(
+                    num_samples, triple_counts, result_graph, result_sql_lines)
 
             with open(self.pg_output_file_path + f'_{num_samples}', 'w') as pg_out:
-                pg_out.write(result_sql_content)
+                pg_out.write(''.join(result_sql_lines))
 
             with open(self.owl_output_file_path + f'_{num_samples}', 'wb') as owl_out:
                 result_graph.serialize(owl_out, format='ntriples')
 
-    def _get_table_name(self, wkt_lit):
-        val = str(wkt_lit)
-
-        if val.startswith('POINT'):
-            return self.point_table_name
-        elif val.startswith('LINE'):
-            return self.line_str_table_name
-        elif val.startswith('POLYGON'):
-            return self.point_table_name
-        else:
-            raise Exception(f'Unhandled polygon type: {val}')
-
     def _get_triple_counts(self):
         counts = {}
         for nt_file in self.nt_files:
             logging.info(f'Getting count for {nt_file}')
-            g = Graph()
-            g.load(os.path.join(self.data_dir, nt_file), format='ntriples')
-
-            query_res = g.query("""
-                    SELECT (count(?s) AS ?count)
-                    WHERE {
-                        ?s <http://www.opengis.net/ont/geosparql#asWKT> ?o .
-                    }""")
-
-            query_res = [r for r in query_res]
-            assert len(query_res) == 1
-
-            count = query_res[0][0].value
-            counts[nt_file] = count
-
-            del g
+            counts[nt_file] = len(self._get_matching_indices(nt_file))
 
         return counts
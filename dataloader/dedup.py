@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import math
+
+from dataloader.inputs import estimate_uncompressed_size
+
+# at the default error rate a Bloom filter needs about 3.6 bytes per key,
+# i.e. 36 MB for the default capacity, and computes 20 hashes per key
+DEFAULT_BLOOM_CAPACITY = 10 * 1000 * 1000
+DEFAULT_BLOOM_ERROR_RATE = 1e-6
+
+# a geometry takes at least its link and its WKT triple, which are hardly
+# shorter than this in N-Triples
+MIN_BYTES_PER_GEOMETRY = 100
+MIN_BLOOM_CAPACITY = 10000
+
+
+def _hash_key(key):
+    return int.from_bytes(
+        hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest(),
+        'little')
+
+
+class HashedKeySet(object):
+    """
+    Probabilistic set of the keys seen so far, storing a 64 bit hash per key
+    instead of the key string itself. A new key is reported as seen before
+    only if its hash collides with one of the n keys seen, which happens for
+    any of them with a probability of at most n^2 / 2^65, e.g. 3e-6 for 10
+    million keys.
+    """
+    def __init__(self):
+        self._hashes = set()
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add(self, key):
+        """
+        Adds `key` and returns whether it was seen before
+        """
+        key_hash = _hash_key(key) & 0xffffffffffffffff
+
+        if key_hash in self._hashes:
+            return True
+
+        self._hashes.add(key_hash)
+
+        return False
+
+
+class BloomFilter(object):
+    """
+    Bloom filter sized for `capacity` keys with a false positive rate of
+    `error_rate`. It needs a fraction of the memory of a `HashedKeySet`, but
+    a new key is reported as seen before with a probability of about
+    `error_rate`. The memory, -capacity * ln(error_rate) / ln(2)^2 bits, is
+    allocated up front, see `estimate_bloom_capacity` to size it from the
+    input files.
+    """
+    def __init__(
+            self,
+            capacity=DEFAULT_BLOOM_CAPACITY,
+            error_rate=DEFAULT_BLOOM_ERROR_RATE):
+
+        self.num_bits = math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(
+            1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._num_keys = 0
+
+        logging.info(
+            f'Bloom filter for {capacity} keys uses {len(self._bits)} bytes '
+            f'and {self.num_hashes} hashes per key')
+
+    def __len__(self):
+        return self._num_keys
+
+    def add(self, key):
+        """
+        Adds `key` and returns whether it was (probably) seen before
+        """
+        key_hash = _hash_key(key)
+        # double hashing with the two 64 bit halves of the hash
+        h1 = key_hash & 0xffffffffffffffff
+        h2 = key_hash >> 64
+
+        seen = True
+        for i in range(self.num_hashes):
+            bit = (h1 + i * h2) % self.num_bits
+            byte_idx, mask = bit >> 3, 1 << (bit & 7)
+
+            if not self._bits[byte_idx] & mask:
+                seen = False
+                self._bits[byte_idx] |= mask
+
+        if not seen:
+            self._num_keys += 1
+
+        return seen
+
+
+def estimate_bloom_capacity(file_paths):
+    """
+    Returns an upper bound of the number of geometries in the given RDF files
+    derived from their sizes, to size a Bloom filter for them
+    """
+    num_bytes = sum(
+        estimate_uncompressed_size(file_path) for file_path in file_paths)
+
+    return max(MIN_BLOOM_CAPACITY, num_bytes // MIN_BYTES_PER_GEOMETRY)
+
+
+def get_key_set(method, bloom_capacity=DEFAULT_BLOOM_CAPACITY):
+    if method == 'set':
+        return HashedKeySet()
+    elif method == 'bloom':
+        return BloomFilter(bloom_capacity)
+    else:
+        raise ValueError(f'Unknown deduplication method {method}')
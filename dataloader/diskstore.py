@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import tempfile
+from contextlib import nullcontext
+
+from rdflib import Graph, RDF, URIRef
+from rdflib.store import Store
+
+_TABLES = ['types', 'links', 'wkts']
+
+
+class GeometryTripleStore(Store):
+    """
+    rdflib store that keeps only the triples needed to extract geometries
+    (feature types, feature to geometry links and geometry WKTs) in an
+    SQLite file on disk, all other triples are dropped while parsing. This
+    bounds the memory needed for Turtle and RDF/XML files which can not be
+    split and parsed line by line like N-Triples files. It is meant as the
+    store of a parse-only `Graph`, i.e. triples can not be queried via
+    rdflib, but only via `extract_geometries`.
+    """
+    # required by rdflib's Turtle parser, quoted (N3 formula) triples are
+    # dropped though
+    formula_aware = True
+
+    def __init__(
+            self,
+            db_file_path,
+            geometry_resource_properties,
+            geometry_literal_properties,
+            batch_size=10000):
+
+        super().__init__()
+
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(db_file_path)
+        self._predicate_to_table = {RDF.type: 'types'}
+        self._predicate_to_table.update(
+            {URIRef(p): 'links' for p in geometry_resource_properties})
+        self._predicate_to_table.update(
+            {URIRef(p): 'wkts' for p in geometry_literal_properties})
+        self._buffers = {table: [] for table in _TABLES}
+
+        for table in _TABLES:
+            # the unique constraints drop duplicate triples, as a graph would
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} '
+                f'(s TEXT, o TEXT, UNIQUE (s, o))')
+
+    def _flush(self, table):
+        self._conn.executemany(
+            f'INSERT OR IGNORE INTO {table} VALUES (?, ?)',
+            self._buffers[table])
+        self._buffers[table] = []
+
+    def add(self, triple, context, quoted=False):
+        s, p, o = triple
+        table = self._predicate_to_table.get(p)
+
+        if table is not None and not quoted:
+            buffer = self._buffers[table]
+            buffer.append((str(s), str(o)))
+
+            if len(buffer) >= self.batch_size:
+                self._flush(table)
+
+    def __len__(self, context=None):
+        return sum(
+            self._conn.execute(f'SELECT count(*) FROM {table}').fetchone()[0]
+            + len(self._buffers[table])
+            for table in _TABLES)
+
+    def extract_geometries(self, ordered=False):
+        """
+        Yields the same (feature IRI, feature class, geometry IRI, WKT) tuples
+        as `dataloader.extraction.extract_geometries` for the stored triples.
+        With `ordered` set, they are sorted by SQLite (in the same order as
+        sorted Python tuples of strings), which spills to temporary files
+        instead of holding all rows in memory.
+        """
+        for table in _TABLES:
+            self._flush(table)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS links_o ON links (o)')
+        self._conn.commit()
+
+        yield from self._conn.execute("""
+            SELECT l.s, coalesce(t.o, ''), w.s, w.o
+            FROM wkts w
+            JOIN links l ON l.o = w.s
+            LEFT JOIN types t ON t.s = l.s
+        """ + ('ORDER BY 1, 2, 3, 4' if ordered else ''))
+
+    def close(self, commit_pending_transaction=False):
+        self._conn.close()
+
+
+def stream_geometries_on_disk(
+        input_file,
+        rdf_format,
+        geometry_resource_properties,
+        geometry_literal_properties,
+        store_dir=None,
+        metrics=None):
+    """
+    Parses `input_file` into a `GeometryTripleStore` in a temporary file in
+    `store_dir` (or the default temp directory) when iterated over, and yields
+    the extracted geometry tuples sorted, as read from the store. The time
+    spent parsing and sorting is added to the 'parse' and 'sort' timers of
+    `metrics`. The temporary file is removed when the generator is exhausted
+    or closed.
+    """
+    def timer(stage):
+        return metrics.timer(stage) if metrics is not None else nullcontext()
+
+    fd, db_file_path = tempfile.mkstemp(
+        suffix='.sqlite', prefix='triples_', dir=store_dir)
+    os.close(fd)
+
+    store = GeometryTripleStore(
+        db_file_path,
+        geometry_resource_properties,
+        geometry_literal_properties)
+
+    try:
+        with timer('parse'):
+            g = Graph(store)
+            g.parse(input_file, format=rdf_format)
+
+        rows = store.extract_geometries(ordered=True)
+        # SQLite sorts all rows when the first one is fetched
+        with timer('sort'):
+            first_row = next(rows, None)
+
+        if first_row is not None:
+            yield first_row
+            yield from rows
+    finally:
+        store.close()
+        os.remove(db_file_path)
+
+
+def parse_and_extract_on_disk(
+        input_file,
+        rdf_format,
+        geometry_resource_properties,
+        geometry_literal_properties,
+        store_dir=None):
+    """
+    Parses `input_file` into a `GeometryTripleStore` in a temporary file in
+    `store_dir` (or the default temp directory) and returns the extracted
+    geometry tuples
+    """
+    return list(stream_geometries_on_disk(
+        input_file,
+        rdf_format,
+        geometry_resource_properties,
+        geometry_literal_properties,
+        store_dir))
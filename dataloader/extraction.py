@@ -0,0 +1,271 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from io import BytesIO
+
+from rdflib import Graph, RDF, URIRef
+
+from dataloader.diskstore import parse_and_extract_on_disk
+from dataloader.inputs import open_input, guess_format, \
+    get_line_aligned_byte_ranges, read_byte_range, estimate_uncompressed_size
+
+
+def extract_geometries(
+        g, geometry_resource_properties, geometry_literal_properties):
+    """
+    Yields a (feature IRI, feature class, geometry IRI, WKT) tuple of strings
+    for every feature that is connected via one of the
+    `geometry_resource_properties` to a geometry resource which in turn has a
+    WKT literal assigned via one of the `geometry_literal_properties`. Features
+    with several classes yield one tuple per class, features without a class
+    one with an empty feature class.
+
+    This is what the SPARQL queries of the loader and the sampler used to
+    extract, done with plain triple pattern lookups which are considerably
+    faster in rdflib.
+    """
+    for geometry_literal_property in geometry_literal_properties:
+        for geom_res, geom_lit in g.subject_objects(geometry_literal_property):
+            wkt = str(geom_lit)
+            geom_iri = str(geom_res)
+
+            for geometry_resource_property in geometry_resource_properties:
+                for feature_res in g.subjects(
+                        geometry_resource_property, geom_res):
+                    feature_iri = str(feature_res)
+                    feature_classes = list(g.objects(feature_res, RDF.type))
+
+                    if not feature_classes:
+                        yield feature_iri, '', geom_iri, wkt
+
+                    for feature_cls in feature_classes:
+                        yield feature_iri, str(feature_cls), geom_iri, wkt
+
+
+def use_disk_store(file_path, disk_store_threshold):
+    # compared to the uncompressed size (estimated for compressed files), as
+    # the memory needed for parsing grows with it
+    return disk_store_threshold is not None and \
+        estimate_uncompressed_size(file_path) >= disk_store_threshold
+
+
+def parse_and_extract(
+        file_path,
+        rdf_format,
+        geometry_resource_properties,
+        geometry_literal_properties,
+        disk_store_threshold=None,
+        disk_store_dir=None):
+    """
+    Parses the given file and returns the extracted geometry tuples (see
+    `extract_geometries`). Files of at least `disk_store_threshold` bytes
+    (uncompressed, see `dataloader.inputs.estimate_uncompressed_size`) are
+    parsed into a `dataloader.diskstore.GeometryTripleStore` in
+    `disk_store_dir` instead of an in-memory graph.
+    """
+    rdf_format = rdf_format or guess_format(file_path)
+
+    if use_disk_store(file_path, disk_store_threshold):
+        with open_input(file_path) as input_file:
+            return parse_and_extract_on_disk(
+                input_file,
+                rdf_format,
+                geometry_resource_properties,
+                geometry_literal_properties,
+                disk_store_dir)
+
+    g = Graph()
+    with open_input(file_path) as input_file:
+        g.parse(input_file, format=rdf_format)
+
+    return list(extract_geometries(
+        g, geometry_resource_properties, geometry_literal_properties))
+
+
+def collect_geometry_triples(
+        file_path,
+        start,
+        end,
+        geometry_resource_properties,
+        geometry_literal_properties):
+    """
+    Parses the N-Triples in the given byte range of `file_path` and returns
+    the triples needed to extract geometries as lists of (subject, object)
+    string tuples: (feature types, feature to geometry links, geometry WKTs).
+    Since the triples of one feature may be spread across byte ranges, the
+    tuples of all ranges are joined by `join_geometry_triples`.
+    """
+    return _collect_geometry_triples(
+        read_byte_range(file_path, start, end),
+        geometry_resource_properties,
+        geometry_literal_properties)
+
+
+def _collect_geometry_triples(
+        source, geometry_resource_properties, geometry_literal_properties):
+    g = Graph()
+    g.parse(source, format='ntriples')
+
+    types = [(str(s), str(o)) for s, o in g.subject_objects(RDF.type)]
+    links = [(str(s), str(o))
+             for p in geometry_resource_properties
+             for s, o in g.subject_objects(URIRef(p))]
+    wkts = [(str(s), str(o))
+            for p in geometry_literal_properties
+            for s, o in g.subject_objects(URIRef(p))]
+
+    return types, links, wkts
+
+
+def join_geometry_triples(parts):
+    """
+    Joins the (types, links, WKTs) tuples returned by
+    `collect_geometry_triples` for several byte ranges into the rows
+    `extract_geometries` would have returned for the whole file.
+    """
+    feature_classes = {}
+    geom_to_features = {}
+    geom_wkts = []
+
+    for types, links, wkts in parts:
+        for feature, feature_cls in types:
+            feature_classes.setdefault(feature, []).append(feature_cls)
+        for feature, geom in links:
+            geom_to_features.setdefault(geom, []).append(feature)
+        geom_wkts += wkts
+
+    rows = []
+    for geom, wkt in geom_wkts:
+        for feature in geom_to_features.get(geom, []):
+            for feature_cls in feature_classes.get(feature, ['']):
+                rows.append((feature, feature_cls, geom, wkt))
+
+    return rows
+
+
+def parallel_parse_and_extract(
+        file_path,
+        geometry_resource_properties,
+        geometry_literal_properties,
+        workers):
+    """
+    Extracts the geometries of an uncompressed N-Triples file with `workers`
+    processes, each parsing a line-aligned byte range of the file.
+    """
+    ranges = get_line_aligned_byte_ranges(file_path, workers)
+    res_props = [str(p) for p in geometry_resource_properties]
+    lit_props = [str(p) for p in geometry_literal_properties]
+
+    with ProcessPoolExecutor(workers) as executor:
+        parts = list(executor.map(
+            collect_geometry_triples,
+            [file_path] * len(ranges),
+            [start for start, _ in ranges],
+            [end for _, end in ranges],
+            [res_props] * len(ranges),
+            [lit_props] * len(ranges)))
+
+    return join_geometry_triples(parts)
+
+
+class IncrementalGeometryJoin(object):
+    """
+    Joins feature types, feature to geometry links and geometry WKTs into the
+    rows of `extract_geometries` while the triples are still coming in: the
+    `add_*` methods return the rows completed by the added triple. Features
+    without a class are only known as such at the end, their rows are
+    returned by `finish`.
+    """
+    def __init__(self):
+        self._feature_classes = {}
+        self._feature_geoms = {}
+        self._geom_features = {}
+        self._geom_wkts = {}
+
+    @staticmethod
+    def _add(values_by_key, key, value):
+        values = values_by_key.setdefault(key, [])
+
+        # duplicate triples, which a graph would drop
+        if value in values:
+            return False
+
+        values.append(value)
+
+        return True
+
+    def add_type(self, feature, feature_cls):
+        if not self._add(self._feature_classes, feature, feature_cls):
+            return []
+
+        return [(feature, feature_cls, geom, wkt)
+                for geom in self._feature_geoms.get(feature, [])
+                for wkt in self._geom_wkts.get(geom, [])]
+
+    def add_link(self, feature, geom):
+        if not self._add(self._feature_geoms, feature, geom):
+            return []
+        self._add(self._geom_features, geom, feature)
+
+        return [(feature, feature_cls, geom, wkt)
+                for wkt in self._geom_wkts.get(geom, [])
+                for feature_cls in self._feature_classes.get(feature, [])]
+
+    def add_wkt(self, geom, wkt):
+        if not self._add(self._geom_wkts, geom, wkt):
+            return []
+
+        return [(feature, feature_cls, geom, wkt)
+                for feature in self._geom_features.get(geom, [])
+                for feature_cls in self._feature_classes.get(feature, [])]
+
+    def finish(self):
+        return sorted(
+            (feature, '', geom, wkt)
+            for geom, features in self._geom_features.items()
+            for feature in features
+            if feature not in self._feature_classes
+            for wkt in self._geom_wkts.get(geom, []))
+
+
+def stream_geometries(
+        file_path,
+        geometry_resource_properties,
+        geometry_literal_properties,
+        chunk_lines,
+        metrics=None):
+    """
+    Yields the rows of `extract_geometries` for a (possibly compressed)
+    N-Triples file while it is parsed in chunks of `chunk_lines` lines, so
+    that the rows of the first chunks can be written while the rest of the
+    file is still being parsed. For a given file the rows always come in the
+    same order (the order of the triples completing them, sorted within a
+    chunk), as needed to resume a load after a checkpoint. Parsing time is
+    added to the 'parse' timer of `metrics`.
+    """
+    join = IncrementalGeometryJoin()
+
+    with open_input(file_path) as input_file:
+        while True:
+            lines = list(itertools.islice(input_file, chunk_lines))
+            if not lines:
+                break
+
+            with metrics.timer('parse') if metrics is not None \
+                    else nullcontext():
+                types, links, wkts = _collect_geometry_triples(
+                    BytesIO(b''.join(lines)),
+                    geometry_resource_properties,
+                    geometry_literal_properties)
+
+            rows = []
+            for feature, feature_cls in sorted(types):
+                rows += join.add_type(feature, feature_cls)
+            for feature, geom in sorted(links):
+                rows += join.add_link(feature, geom)
+            for geom, wkt in sorted(wkts):
+                rows += join.add_wkt(geom, wkt)
+
+            yield from rows
+
+    yield from join.finish()
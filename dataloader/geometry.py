@@ -0,0 +1,454 @@
+import re
+import struct
+import sys
+from array import array
+
+# type codes as used in WKB
+POINT = 1
+LINE_STRING = 2
+POLYGON = 3
+
+TYPE_NAMES = {
+    POINT: 'POINT',
+    LINE_STRING: 'LINESTRING',
+    POLYGON: 'POLYGON',
+}
+
+TABLE_NAMES = {
+    POINT: 'point',
+    LINE_STRING: 'line_string',
+    POLYGON: 'polygon',
+}
+
+_wkt_type_codes = {name: code for code, name in TYPE_NAMES.items()}
+_ring_pattern = re.compile(r'\(([^()]*)\)')
+_is_little_endian = sys.byteorder == 'little'
+
+
+def get_geometry_type(wkt):
+    """
+    Returns the type code of a WKT string by only looking at its prefix
+    """
+    wkt = wkt.lstrip()
+    paren_idx = wkt.find('(')
+    type_name = wkt[:paren_idx].strip().upper()
+
+    type_code = _wkt_type_codes.get(type_name)
+    if type_code is None:
+        raise ValueError(f'Unsupported geometry type of {wkt[:40]}')
+
+    return type_code
+
+
+def get_wkt_extent(wkt):
+    """
+    Returns (min x, min y, max x, max y) of a WKT string by only scanning its
+    coordinates, i.e. without building the geometry
+    """
+    values = wkt[wkt.index('('):].replace('(', ' ').replace(')', ' ') \
+        .replace(',', ' ').split()
+    xs = [float(v) for v in values[0::2]]
+    ys = [float(v) for v in values[1::2]]
+
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def parse_bbox(bbox_str):
+    """
+    Parses a 'min lon,min lat,max lon,max lat' string
+    """
+    bbox = tuple(float(v) for v in bbox_str.split(','))
+    if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+        raise ValueError(f'Invalid bounding box {bbox_str}')
+
+    return bbox
+
+
+def parse_types(types_str):
+    """
+    Parses a comma separated list of geometry type names (point, linestring
+    or line_string, polygon) into type codes
+    """
+    names_to_codes = {name.lower(): code for code, name in TYPE_NAMES.items()}
+    names_to_codes.update({name: code for code, name in TABLE_NAMES.items()})
+
+    type_codes = set()
+    for name in types_str.split(','):
+        name = name.strip().lower()
+        if name not in names_to_codes:
+            raise ValueError(f'Unknown geometry type {name}')
+        type_codes.add(names_to_codes[name])
+
+    return type_codes
+
+
+class GeometryFilter(object):
+    """
+    Selects WKT geometries of the given `type_codes` whose extent intersects
+    `bbox` (min x, min y, max x, max y). Both are optional. Only the type
+    prefix and the coordinates of the WKT strings are looked at.
+    Geometries of unsupported types (e.g. multi geometries, geometries with
+    Z/M coordinates or a CRS prefix) and empty geometries never match, so
+    that they are filtered out instead of aborting a load.
+    """
+    def __init__(self, bbox=None, type_codes=None):
+        self.bbox = bbox
+        self.type_codes = set(type_codes) if type_codes is not None else None
+
+    def matches(self, wkt):
+        try:
+            type_code = get_geometry_type(wkt)
+            extent = get_wkt_extent(wkt) if self.bbox is not None else None
+        except ValueError:
+            return False
+
+        if self.type_codes is not None and type_code not in self.type_codes:
+            return False
+
+        if extent is not None:
+            min_x, min_y, max_x, max_y = extent
+
+            return min_x <= self.bbox[2] and max_x >= self.bbox[0] and \
+                min_y <= self.bbox[3] and max_y >= self.bbox[1]
+
+        return True
+
+
+def _parse_wkt(wkt):
+    """
+    Returns the type code and the rings (or the single part of a point or
+    line string) of a WKT string, each as flat list of x, y coordinates
+    """
+    type_code = get_geometry_type(wkt)
+
+    rings = []
+    for ring_str in _ring_pattern.findall(wkt):
+        coords = [float(v) for v in ring_str.replace(',', ' ').split()]
+        if len(coords) % 2:
+            raise ValueError(f'Only 2D coordinates are supported: {wkt[:40]}')
+        rings.append(coords)
+
+    if not rings:
+        raise ValueError(f'Empty geometries are not supported: {wkt[:40]}')
+
+    return type_code, rings
+
+
+def _format_coords(coords):
+    return ', '.join(
+        f'{x!r} {y!r}' for x, y in zip(coords[0::2], coords[1::2]))
+
+
+def _expand_ranges(starts, counts):
+    """
+    Returns the concatenated ranges(start, start + count) as one array
+    """
+    import numpy as np
+
+    ends = np.cumsum(counts)
+
+    return np.arange(ends[-1] if len(ends) else 0) + \
+        np.repeat(starts - (ends - counts), counts)
+
+
+def _put_uint32(buf, offsets, values):
+    """
+    Writes `values` as little endian uint32 at the byte `offsets` of `buf`
+    """
+    import numpy as np
+
+    buf[offsets[:, None] + np.arange(4)] = \
+        values.astype('<u4').view(np.uint8).reshape(-1, 4)
+
+
+def _coords_to_bytes(coords):
+    coords = array('d', coords)
+    if not _is_little_endian:
+        coords.byteswap()
+
+    return coords.tobytes()
+
+
+class GeometryCollection(object):
+    """
+    Compact columnar store of point, line string and polygon geometries:
+
+    - `type_codes`: one type code per geometry
+    - `coords`: the x, y coordinates of all geometries as one float64 buffer
+    - `ring_offsets`: the offset (in points) of each ring (the single part of
+      points and line strings, the rings of polygons) into `coords`, plus the
+      end offset
+    - `geom_offsets`: the offset of each geometry into `ring_offsets`, plus
+      the end offset
+    - `iris`: the IRI of each geometry (or None)
+
+    Compared to a WKT string (or an rdflib Literal) per geometry this needs a
+    fraction of the allocations when holding many geometries, as the data
+    generator, the sampler and `dataloader.spatial.SpatialEngine` do. The
+    bulk operations (`bboxes`, `take`, `filter_types`, `to_wkbs`) work on
+    NumPy views of the buffers, only WKT formatting and parsing go geometry
+    by geometry.
+    """
+    __slots__ = (
+        'type_codes', 'coords', 'ring_offsets', 'geom_offsets', 'iris')
+
+    def __init__(self):
+        self.type_codes = array('B')
+        self.coords = array('d')
+        self.ring_offsets = array('Q', [0])
+        self.geom_offsets = array('Q', [0])
+        self.iris = []
+
+    def __len__(self):
+        return len(self.type_codes)
+
+    def append(self, type_code, rings, iri=None):
+        """
+        Appends a geometry given as list of rings, each being a flat list of
+        x, y coordinates
+        """
+        self.type_codes.append(type_code)
+
+        for ring in rings:
+            self.coords.extend(ring)
+            self.ring_offsets.append(len(self.coords) // 2)
+
+        self.geom_offsets.append(len(self.ring_offsets) - 1)
+        self.iris.append(iri)
+
+    def append_wkt(self, wkt, iri=None):
+        type_code, rings = _parse_wkt(wkt)
+        self.append(type_code, rings, iri)
+
+    def append_wkb(self, wkb, iri=None):
+        byte_order = '<' if wkb[0] == 1 else '>'
+        type_code, = struct.unpack_from(byte_order + 'I', wkb, 1)
+        offset = 5
+
+        if type_code == POINT:
+            num_rings = 1
+        elif type_code in (LINE_STRING, POLYGON):
+            num_rings = 1
+            if type_code == POLYGON:
+                num_rings, = struct.unpack_from(byte_order + 'I', wkb, offset)
+                offset += 4
+        else:
+            raise ValueError(f'Unsupported WKB geometry type {type_code}')
+
+        rings = []
+        for _ in range(num_rings):
+            if type_code == POINT:
+                num_points = 1
+            else:
+                num_points, = struct.unpack_from(byte_order + 'I', wkb, offset)
+                offset += 4
+
+            rings.append(struct.unpack_from(
+                f'{byte_order}{2 * num_points}d', wkb, offset))
+            offset += 16 * num_points
+
+        self.append(type_code, rings, iri)
+
+    @classmethod
+    def from_wkts(cls, wkts, iris=None):
+        collection = cls()
+        iris = iris if iris is not None else [None] * len(wkts)
+
+        for wkt, iri in zip(wkts, iris):
+            collection.append_wkt(wkt, iri)
+
+        return collection
+
+    @classmethod
+    def from_wkbs(cls, wkbs, iris=None):
+        collection = cls()
+        iris = iris if iris is not None else [None] * len(wkbs)
+
+        for wkb, iri in zip(wkbs, iris):
+            collection.append_wkb(wkb, iri)
+
+        return collection
+
+    def get_type(self, idx):
+        return self.type_codes[idx]
+
+    def get_table_name(self, idx):
+        return TABLE_NAMES[self.type_codes[idx]]
+
+    def get_iri(self, idx):
+        return self.iris[idx]
+
+    def get_rings(self, idx):
+        """
+        Returns the rings of a geometry as flat coordinate arrays
+        """
+        first_ring = self.geom_offsets[idx]
+        last_ring = self.geom_offsets[idx + 1]
+
+        return [
+            self.coords[2 * self.ring_offsets[r]:2 * self.ring_offsets[r + 1]]
+            for r in range(first_ring, last_ring)]
+
+    def get_wkt(self, idx):
+        type_code = self.type_codes[idx]
+        rings = self.get_rings(idx)
+
+        if type_code == POLYGON:
+            body = '(' + '), ('.join(_format_coords(r) for r in rings) + ')'
+        else:
+            body = _format_coords(rings[0])
+
+        return f'{TYPE_NAMES[type_code]}({body})'
+
+    def get_wkb(self, idx):
+        type_code = self.type_codes[idx]
+        rings = self.get_rings(idx)
+        parts = [struct.pack('<BI', 1, type_code)]
+
+        if type_code == POLYGON:
+            parts.append(struct.pack('<I', len(rings)))
+
+        for ring in rings:
+            if type_code != POINT:
+                parts.append(struct.pack('<I', len(ring) // 2))
+            parts.append(_coords_to_bytes(ring))
+
+        return b''.join(parts)
+
+    def to_wkts(self):
+        return [self.get_wkt(i) for i in range(len(self))]
+
+    def _get_arrays(self):
+        """
+        Returns NumPy views of the type codes and coordinates, and (signed)
+        copies of the offsets, which are small compared to the coordinates
+        """
+        import numpy as np
+
+        return \
+            np.frombuffer(self.type_codes, np.uint8), \
+            np.frombuffer(self.coords, np.float64), \
+            np.frombuffer(self.ring_offsets, np.uint64).astype(np.int64), \
+            np.frombuffer(self.geom_offsets, np.uint64).astype(np.int64)
+
+    def to_wkbs(self):
+        """
+        Returns the (little endian) WKB of all geometries, written into one
+        buffer at once
+        """
+        import numpy as np
+
+        if len(self) == 0:
+            return []
+
+        type_codes, coords, ring_offsets, geom_offsets = self._get_arrays()
+        num_rings = np.diff(geom_offsets)
+        ring_points = np.diff(ring_offsets)
+        ring_geoms = np.repeat(np.arange(len(self)), num_rings)
+        is_polygon = type_codes == POLYGON
+
+        # byte order, type code and (for polygons) number of rings
+        geom_header_sizes = 5 + 4 * is_polygon
+        # number of points, except for points
+        ring_header_sizes = 4 * (type_codes[ring_geoms] != POINT)
+        ring_sizes = ring_header_sizes + 16 * ring_points
+        geom_sizes = geom_header_sizes + \
+            np.add.reduceat(ring_sizes, geom_offsets[:-1])
+
+        geom_starts = np.cumsum(geom_sizes) - geom_sizes
+        ring_ends = np.cumsum(ring_sizes)
+        # start of the ring's geometry plus the sizes of the rings before it
+        ring_starts = geom_starts[ring_geoms] + \
+            geom_header_sizes[ring_geoms] + ring_ends - ring_sizes - \
+            (ring_ends - ring_sizes)[geom_offsets[:-1]][ring_geoms]
+
+        buf = np.zeros(int(geom_sizes.sum()), np.uint8)
+        buf[geom_starts] = 1
+        _put_uint32(buf, geom_starts + 1, type_codes)
+        _put_uint32(buf, geom_starts[is_polygon] + 5, num_rings[is_polygon])
+        has_num_points = ring_header_sizes > 0
+        _put_uint32(
+            buf, ring_starts[has_num_points], ring_points[has_num_points])
+
+        point_dests = 16 * np.arange(len(coords) // 2) + np.repeat(
+            ring_starts + ring_header_sizes - 16 * ring_offsets[:-1],
+            ring_points)
+        buf[point_dests[:, None] + np.arange(16)] = \
+            coords.astype('<f8').view(np.uint8).reshape(-1, 16)
+
+        wkb = buf.tobytes()
+
+        return [wkb[start:end] for start, end in zip(
+            geom_starts.tolist(), (geom_starts + geom_sizes).tolist())]
+
+    def bbox(self, idx):
+        """
+        Returns (min x, min y, max x, max y) of a geometry
+        """
+        start = 2 * self.ring_offsets[self.geom_offsets[idx]]
+        end = 2 * self.ring_offsets[self.geom_offsets[idx + 1]]
+        xs = self.coords[start:end:2]
+        ys = self.coords[start + 1:end:2]
+
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def bboxes(self):
+        """
+        Returns the bounding boxes of all geometries as flat float64 array of
+        min x, min y, max x, max y values
+        """
+        import numpy as np
+
+        result = array('d')
+        if len(self) == 0:
+            return result
+
+        _, coords, ring_offsets, geom_offsets = self._get_arrays()
+        first_points = ring_offsets[geom_offsets[:-1]]
+        points = coords.reshape(-1, 2)
+        # written in place into the result
+        result = array('d', [0.0]) * (4 * len(self))
+        bboxes = np.frombuffer(result).reshape(-1, 4)
+        np.minimum.reduceat(points, first_points, out=bboxes[:, :2])
+        np.maximum.reduceat(points, first_points, out=bboxes[:, 2:])
+
+        return result
+
+    def take(self, indices):
+        """
+        Returns a new collection holding the geometries at `indices`
+        """
+        import numpy as np
+
+        indices = np.asarray(indices, np.int64)
+        type_codes, coords, ring_offsets, geom_offsets = self._get_arrays()
+
+        first_rings = geom_offsets[indices]
+        num_rings = geom_offsets[indices + 1] - first_rings
+        rings = _expand_ranges(first_rings, num_rings)
+        first_points = ring_offsets[rings]
+        ring_points = ring_offsets[rings + 1] - first_points
+        points = _expand_ranges(first_points, ring_points)
+
+        collection = GeometryCollection()
+        collection.type_codes.frombytes(type_codes[indices].tobytes())
+        collection.coords.frombytes(
+            coords.reshape(-1, 2)[points].tobytes())
+        collection.ring_offsets.frombytes(
+            np.cumsum(ring_points).astype(np.uint64).tobytes())
+        collection.geom_offsets.frombytes(
+            np.cumsum(num_rings).astype(np.uint64).tobytes())
+        collection.iris = [self.iris[idx] for idx in indices.tolist()]
+
+        return collection
+
+    def filter_types(self, type_codes):
+        """
+        Returns a new collection holding only the geometries of the given types
+        """
+        import numpy as np
+
+        own_type_codes, _, _, _ = self._get_arrays()
+
+        return self.take(np.flatnonzero(
+            np.isin(own_type_codes, list(type_codes))))
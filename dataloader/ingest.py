@@ -0,0 +1,369 @@
+import fcntl
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from dataloader import PostGISDataLoader
+from dataloader.inputs import guess_format
+from dataloader.metrics import LoadMetrics
+from dataloader.sinks import DatabaseSink
+
+PROCESSING_DIR_NAME = 'processing'
+DONE_DIR_NAME = 'done'
+FAILED_DIR_NAME = 'failed'
+LOCK_FILE_NAME = '.lock'
+
+DEFAULT_INGEST_WORKERS = 2
+DEFAULT_POLL_INTERVAL = 1.
+
+
+def _lock_dir(dir_path, create=False):
+    """
+    Returns the file descriptor of the exclusively locked lock file of
+    `dir_path`, or None if another process holds the lock or (unless
+    `create` is set) there is no lock file
+    """
+    flags = os.O_RDWR | (os.O_CREAT if create else 0)
+    try:
+        lock_fd = os.open(os.path.join(dir_path, LOCK_FILE_NAME), flags)
+    except FileNotFoundError:
+        return None
+
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(lock_fd)
+        return None
+
+    return lock_fd
+
+
+def _remove_dir_if_empty(dir_path):
+    try:
+        if os.listdir(dir_path) == [LOCK_FILE_NAME]:
+            os.remove(os.path.join(dir_path, LOCK_FILE_NAME))
+            os.rmdir(dir_path)
+    except OSError:
+        # removed, or a file claimed into it, in the meantime
+        pass
+
+
+class SpoolIngestService(object):
+    """
+    Long-running service loading the RDF files dropped into `spool_dir`.
+    The directory is polled every `poll_interval` seconds, and each new file
+    is claimed by moving it to the service's own processing/<service ID>/
+    subdirectory, which is atomic, so that several services can share a
+    spool directory. Claimed files are renamed to
+    <claim time>-<random ID>-<file name>, so that files dropped with the same
+    name again neither overwrite each other nor share a checkpoint.
+    Up to `workers` files are loaded at the same time, each with a
+    `PostGISDataLoader` created with `loader_kwargs` on a connection of a
+    pool of `workers` connections (created with `connection_params`, see
+    `dataloader.get_connection_params`). Loaded files are moved to done/,
+    files whose load failed to failed/.
+    Only files with a known RDF suffix (see `dataloader.inputs.guess_format`)
+    are claimed, so producers should write to a temporary name (e.g.
+    foo.nt.tmp or .foo.nt) and rename the file when it is complete.
+    Each service holds a lock on its processing directory while running.
+    Files left in the processing directory of a crashed service (whose lock
+    is free) are loaded first, resuming after their last checkpoint.
+    If a `stats_file` is given, the service statistics (see `get_stats`) are
+    written to it as JSON after each poll.
+    """
+    def __init__(
+            self,
+            spool_dir,
+            connection_params,
+            loader_kwargs,
+            workers=DEFAULT_INGEST_WORKERS,
+            poll_interval=DEFAULT_POLL_INTERVAL,
+            stats_file=None):
+
+        self.spool_dir = spool_dir
+        self.connection_params = connection_params
+        self.loader_kwargs = loader_kwargs
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stats_file = stats_file
+
+        self.service_id = \
+            f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.processing_root = os.path.join(spool_dir, PROCESSING_DIR_NAME)
+        self.processing_dir = os.path.join(
+            self.processing_root, self.service_id)
+        self.done_dir = os.path.join(spool_dir, DONE_DIR_NAME)
+        self.failed_dir = os.path.join(spool_dir, FAILED_DIR_NAME)
+
+        for dir_path in [self.processing_root, self.done_dir, self.failed_dir]:
+            os.makedirs(dir_path, exist_ok=True)
+
+        self._pool = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._in_progress = set()
+        # (directory, lock file descriptor) of the own and the adopted
+        # processing directories, locked while running
+        self._dir_locks = []
+
+        self._start = time.time()
+        self._files_done = 0
+        self._files_failed = 0
+        self._rows = 0
+        self._latencies = []
+        self._last_error = None
+
+    def stop(self):
+        """
+        Makes `run` return after the files being loaded are finished
+        """
+        self._stop_event.set()
+
+    def _adopt_orphaned_files(self):
+        """
+        Locks the processing directories of crashed services and returns the
+        paths of the files left in them
+        """
+        file_paths = []
+        for dir_name in sorted(os.listdir(self.processing_root)):
+            dir_path = os.path.join(self.processing_root, dir_name)
+            if dir_path == self.processing_dir or not os.path.isdir(dir_path):
+                continue
+
+            lock_fd = _lock_dir(dir_path)
+            if lock_fd is None:
+                # the service owning it is still running
+                continue
+
+            self._dir_locks.append((dir_path, lock_fd))
+            try:
+                file_names = sorted(os.listdir(dir_path))
+            except FileNotFoundError:
+                # removed by its service stopping in the meantime
+                continue
+
+            # the files are loaded where they are, as their checkpoints are
+            # stored under their paths
+            file_paths += [os.path.join(dir_path, file_name)
+                           for file_name in file_names
+                           if file_name != LOCK_FILE_NAME]
+
+        return file_paths
+
+    def _lock_processing_dirs(self):
+        os.makedirs(self.processing_dir, exist_ok=True)
+        self._dir_locks.append(
+            (self.processing_dir, _lock_dir(self.processing_dir, True)))
+
+    def _release_processing_dirs(self):
+        for dir_path, lock_fd in self._dir_locks:
+            _remove_dir_if_empty(dir_path)
+            os.close(lock_fd)
+
+        self._dir_locks = []
+
+    def _claim_new_files(self, max_files):
+        file_names = []
+        for file_name in os.listdir(self.spool_dir):
+            file_path = os.path.join(self.spool_dir, file_name)
+
+            if file_name.startswith('.') or \
+                    guess_format(file_name) is None or \
+                    not os.path.isfile(file_path):
+                continue
+
+            try:
+                file_names.append((os.path.getmtime(file_path), file_name))
+            except FileNotFoundError:
+                # claimed by another service in the meantime
+                continue
+
+        claimed = []
+        # oldest first
+        for _, file_name in sorted(file_names):
+            if len(claimed) >= max_files:
+                break
+
+            claimed_file_path = os.path.join(
+                self.processing_dir,
+                f'{time.time_ns()}-{uuid.uuid4().hex[:8]}-{file_name}')
+            try:
+                os.rename(
+                    os.path.join(self.spool_dir, file_name), claimed_file_path)
+            except FileNotFoundError:
+                # claimed by another service in the meantime
+                continue
+
+            claimed.append(claimed_file_path)
+
+        return claimed
+
+    def _load_file(self, file_path, resume):
+        file_name = os.path.basename(file_path)
+        try:
+            self._load_claimed_file(file_path, resume)
+        finally:
+            with self._lock:
+                self._in_progress.discard(file_name)
+
+    def _load_claimed_file(self, file_path, resume):
+        file_name = os.path.basename(file_path)
+        metrics = LoadMetrics()
+
+        conn = None
+        conn_broken = False
+        try:
+            # the file keeps its modification time when being claimed
+            arrival_time = os.path.getmtime(file_path)
+            conn = self._pool.getconn()
+
+            data_loader = PostGISDataLoader(
+                **self.loader_kwargs,
+                metrics=metrics,
+                resume=resume,
+                sink=DatabaseSink(conn, close_connection=False))
+            try:
+                with metrics.periodic_logging():
+                    data_loader.load_geometry_data(file_path)
+            finally:
+                data_loader.close()
+
+        except Exception as e:
+            logging.exception(f'Loading {file_name} failed')
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    conn_broken = True
+
+            os.replace(file_path, os.path.join(self.failed_dir, file_name))
+
+            with self._lock:
+                self._files_failed += 1
+                self._last_error = f'{file_name}: {e}'
+
+            return
+
+        finally:
+            if conn is not None:
+                self._pool.putconn(conn, close=conn_broken)
+
+        os.replace(file_path, os.path.join(self.done_dir, file_name))
+        latency = time.time() - arrival_time
+        num_rows = sum(metrics.rows.values())
+        logging.info(
+            f'Loaded {num_rows} rows from {file_name} {latency:.1f}s after '
+            f'it arrived')
+
+        with self._lock:
+            self._files_done += 1
+            self._rows += num_rows
+            self._latencies.append(latency)
+
+    def get_stats(self):
+        with self._lock:
+            latencies = self._latencies
+
+            return {
+                'uptime_seconds': round(time.time() - self._start, 3),
+                'files_done': self._files_done,
+                'files_failed': self._files_failed,
+                'files_in_progress': sorted(self._in_progress),
+                'files_waiting': sum(
+                    1 for file_name in os.listdir(self.spool_dir)
+                    if not file_name.startswith('.') and
+                    guess_format(file_name) is not None),
+                'rows': self._rows,
+                'latency_seconds': {
+                    'last': round(latencies[-1], 3),
+                    'mean': round(sum(latencies) / len(latencies), 3),
+                    'max': round(max(latencies), 3),
+                } if latencies else None,
+                'last_error': self._last_error,
+            }
+
+    def write_stats(self):
+        # written to a temporary file first and moved into place, so that
+        # readers never see a partial file
+        tmp_file_path = self.stats_file + '.tmp'
+
+        with open(tmp_file_path, 'w') as stats_file:
+            json.dump(self.get_stats(), stats_file, indent=2)
+
+        os.replace(tmp_file_path, self.stats_file)
+
+    def _submit(self, executor, file_path, resume):
+        with self._lock:
+            self._in_progress.add(os.path.basename(file_path))
+
+        return executor.submit(self._load_file, file_path, resume)
+
+    def _create_pool(self):
+        from psycopg2.pool import ThreadedConnectionPool
+
+        return ThreadedConnectionPool(
+            1, self.workers, **self.connection_params)
+
+    def _remove_finished(self, futures):
+        unfinished = set()
+        for future in futures:
+            if not future.done():
+                unfinished.add(future)
+            elif future.exception() is not None:
+                # failed loads are handled in _load_file, so this is e.g. a
+                # file which could not be moved to failed/
+                logging.error(
+                    'Ingest worker failed', exc_info=future.exception())
+
+        return unfinished
+
+    def run(self, once=False):
+        """
+        Polls the spool directory and loads the files dropped there until
+        `stop` is called or, with `once` set, until there are no more files
+        """
+        self._lock_processing_dirs()
+        futures = set()
+
+        try:
+            self._pool = self._create_pool()
+
+            with ThreadPoolExecutor(self.workers) as executor:
+                for file_path in self._adopt_orphaned_files():
+                    logging.info(f'Resuming {file_path}')
+                    futures.add(self._submit(executor, file_path, True))
+
+                while True:
+                    futures = self._remove_finished(futures)
+
+                    for file_path in self._claim_new_files(
+                            self.workers - len(futures)):
+                        futures.add(self._submit(executor, file_path, False))
+
+                    if self.stats_file is not None:
+                        self.write_stats()
+
+                    if once and not futures:
+                        break
+
+                    if self._stop_event.wait(self.poll_interval):
+                        logging.info(
+                            f'Stopping after {len(futures)} files being '
+                            f'loaded')
+                        break
+
+            self._remove_finished(futures)
+
+        finally:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+            self._release_processing_dirs()
+
+            if self.stats_file is not None:
+                self.write_stats()
@@ -0,0 +1,115 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+
+# assumed for compressed input files, whose uncompressed size is not known
+# without reading them
+ASSUMED_COMPRESSION_RATIO = 10
+
+
+def _open_zstd(file_path):
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(
+            f'Reading {file_path} requires the zstandard package')
+
+    return zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'))
+
+
+_compression_to_opener = {
+    'gz': lambda file_path: gzip.open(file_path, 'rb'),
+    'bz2': lambda file_path: bz2.open(file_path, 'rb'),
+    'xz': lambda file_path: lzma.open(file_path, 'rb'),
+    'zst': _open_zstd,
+}
+
+_suffix_to_format = {
+    'nt': 'ntriples',
+    'ttl': 'turtle',
+    'rdf': 'xml',
+    'xml': 'xml'
+}
+
+
+def split_suffixes(file_path):
+    """
+    Returns the (lower case) format suffix and compression suffix of a file
+    path, e.g. ('nt', 'gz') for foo.nt.gz and ('ttl', None) for foo.ttl
+    """
+    parts = os.path.basename(file_path).lower().split('.')
+
+    compression = None
+    if len(parts) > 1 and parts[-1] in _compression_to_opener:
+        compression = parts.pop()
+
+    format_suffix = parts[-1] if len(parts) > 1 else None
+
+    return format_suffix, compression
+
+
+def guess_format(file_path):
+    format_suffix, _ = split_suffixes(file_path)
+
+    return _suffix_to_format.get(format_suffix)
+
+
+def is_ntriples_file(file_path):
+    format_suffix, _ = split_suffixes(file_path)
+
+    return format_suffix == 'nt'
+
+
+def estimate_uncompressed_size(file_path):
+    """
+    Returns the size of the given file, or an estimate of its uncompressed
+    size (assuming a compression ratio of `ASSUMED_COMPRESSION_RATIO`) if it
+    is compressed
+    """
+    _, compression = split_suffixes(file_path)
+    ratio = 1 if compression is None else ASSUMED_COMPRESSION_RATIO
+
+    return os.path.getsize(file_path) * ratio
+
+
+def open_input(file_path):
+    """
+    Opens the given file for binary reading, decompressing it on the fly if
+    it has a .gz, .bz2, .xz or .zst suffix.
+    """
+    _, compression = split_suffixes(file_path)
+
+    if compression is None:
+        return open(file_path, 'rb')
+
+    return _compression_to_opener[compression](file_path)
+
+
+def get_line_aligned_byte_ranges(file_path, num_ranges):
+    """
+    Splits an uncompressed, line-based file (like N-Triples) into
+    `num_ranges` byte ranges of about the same size, each starting at the
+    beginning of a line, and returns them as (start, end) offsets.
+    """
+    file_size = os.path.getsize(file_path)
+    boundaries = [0]
+
+    with open(file_path, 'rb') as f:
+        for i in range(1, num_ranges):
+            f.seek(max(boundaries[-1], file_size * i // num_ranges))
+            # move on to the start of the next line
+            f.readline()
+            boundaries.append(min(f.tell(), file_size))
+
+    boundaries.append(file_size)
+
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:])
+            if end > start]
+
+
+def read_byte_range(file_path, start, end):
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        return io.BytesIO(f.read(end - start))
@@ -0,0 +1,175 @@
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+METRICS_PREFIX = 'spatial_loader'
+
+
+class LoadMetrics(object):
+    """
+    Counters and stage timers of a `PostGISDataLoader`. Within
+    `periodic_logging` the current values are logged as a structured (JSON)
+    log line every `log_interval` seconds by a background thread, so that
+    there is progress output also during long parse or sort stages (whose
+    running time so far is included). The values can be exported as JSON or
+    as Prometheus textfile at the end of a load.
+    """
+    def __init__(self, log_interval=30.):
+        self.log_interval = log_interval
+
+        self.files = 0
+        self.bytes_read = 0
+        self.rows = defaultdict(int)
+        self.rows_dropped = 0
+        self.rows_filtered = 0
+        self.rows_duplicate = 0
+        self.seconds = defaultdict(float)
+
+        self._start = time.monotonic()
+        # stage -> start of the timer currently running for it
+        self._running = {}
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        self._running[stage] = start
+        try:
+            yield
+        finally:
+            del self._running[stage]
+            self.seconds[stage] += time.perf_counter() - start
+
+    def add_row(self, table):
+        self.rows[table] += 1
+
+    def drop_row(self):
+        self.rows_dropped += 1
+
+    def filter_row(self):
+        self.rows_filtered += 1
+
+    def duplicate_row(self):
+        self.rows_duplicate += 1
+
+    def _get_seconds(self):
+        # copies first, as the logging thread reads the values while they are
+        # updated
+        seconds = dict(self.seconds)
+        now = time.perf_counter()
+        for stage, start in list(self._running.items()):
+            seconds[stage] = seconds.get(stage, 0.) + now - start
+
+        return seconds
+
+    def snapshot(self):
+        return {
+            'elapsed_seconds': round(time.monotonic() - self._start, 3),
+            'files': self.files,
+            'bytes_read': self.bytes_read,
+            'rows': dict(self.rows),
+            'rows_dropped': self.rows_dropped,
+            'rows_filtered': self.rows_filtered,
+            'rows_duplicate': self.rows_duplicate,
+            'seconds': {k: round(v, 3) for k, v in self._get_seconds().items()},
+        }
+
+    def log(self):
+        logging.info('load metrics ' + json.dumps(self.snapshot()))
+
+    @contextmanager
+    def periodic_logging(self):
+        """
+        Logs the metrics every `log_interval` seconds while the enclosed code
+        runs
+        """
+        stop_event = threading.Event()
+
+        def log_until_stopped():
+            while not stop_event.wait(self.log_interval):
+                self.log()
+
+        log_thread = threading.Thread(target=log_until_stopped, daemon=True)
+        log_thread.start()
+        try:
+            yield
+        finally:
+            stop_event.set()
+            log_thread.join()
+
+    def to_prometheus(self):
+        p = METRICS_PREFIX
+        lines = [
+            f'# TYPE {p}_files_total counter',
+            f'{p}_files_total {self.files}',
+            f'# TYPE {p}_bytes_read_total counter',
+            f'{p}_bytes_read_total {self.bytes_read}',
+            f'# TYPE {p}_rows_total counter',
+        ]
+        lines += [f'{p}_rows_total{{table="{table}"}} {count}'
+                  for table, count in sorted(self.rows.items())]
+        lines += [
+            f'# TYPE {p}_rows_dropped_total counter',
+            f'{p}_rows_dropped_total {self.rows_dropped}',
+            f'# TYPE {p}_rows_filtered_total counter',
+            f'{p}_rows_filtered_total {self.rows_filtered}',
+            f'# TYPE {p}_rows_duplicate_total counter',
+            f'{p}_rows_duplicate_total {self.rows_duplicate}',
+            f'# TYPE {p}_stage_seconds_total counter',
+        ]
+        lines += [f'{p}_stage_seconds_total{{stage="{stage}"}} {secs:.6f}'
+                  for stage, secs in sorted(self.seconds.items())]
+
+        return os.linesep.join(lines) + os.linesep
+
+    def write(self, file_path, file_format='json'):
+        # The Prometheus node exporter might read the file any time, so it is
+        # written to a temporary file first and moved into place atomically
+        tmp_file_path = file_path + '.tmp'
+
+        with open(tmp_file_path, 'w') as metrics_file:
+            if file_format == 'json':
+                json.dump(self.snapshot(), metrics_file, indent=2)
+            elif file_format == 'prometheus':
+                metrics_file.write(self.to_prometheus())
+            else:
+                raise ValueError(f'Unknown metrics format {file_format}')
+
+        os.replace(tmp_file_path, file_path)
+
+
+@contextmanager
+def profiled(profile_file_path=None, trace_malloc=False, top_allocations=10):
+    """
+    Optionally runs the enclosed code with cProfile (writing the stats to
+    `profile_file_path`) and/or tracemalloc (logging the top allocation
+    sites at the end).
+    """
+    profiler = None
+    if profile_file_path is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    if trace_malloc:
+        tracemalloc.start()
+
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_file_path)
+
+        if trace_malloc:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            logging.info(f'Peak traced memory: {peak} bytes')
+            for stat in snapshot.statistics('lineno')[:top_allocations]:
+                logging.info(f'Allocated: {stat}')
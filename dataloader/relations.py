@@ -0,0 +1,235 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+RELATION_TABLE_NAME = 'spatial_relation'
+STATE_TABLE_NAME = 'spatial_relation_geometry'
+
+DEFAULT_TABLE_PAIRS = [
+    ('polygon', 'polygon'),
+    ('line_string', 'polygon'),
+    ('point', 'polygon'),
+]
+DEFAULT_NUM_CHUNKS = 16
+
+# DE-9IM patterns of the RCC8 relations between two polygons (except dc,
+# which is the absence of a row) in the order they are tested. 'ec' and
+# 'tpp' are the patterns the hotel task and the relation benchmark are
+# defined on.
+RCC8_PATTERNS = [
+    ('eq', ['TFFFTFFFT']),
+    ('ec', ['FF*FT****']),
+    ('tpp', ['TFF*TFT**']),
+    ('ntpp', ['TFF*FFT**']),
+    ('tppi', ['T*TFT*FF*']),
+    ('ntppi', ['T*TFF*FF*']),
+    ('po', ['T*T***T**']),
+]
+
+# RCC8 is only defined for regions, so pairs involving a point or a line get
+# the OGC relations instead. A relation holds if any of its patterns match;
+# 'intersects' covers all remaining non-disjoint pairs (e.g. a line crossing
+# a polygon), so that again only disjoint pairs have no row.
+OGC_PATTERNS = [
+    ('eq', ['T*F**FFF*']),
+    ('within', ['T*F**F***']),
+    ('contains', ['T*****FF*']),
+    ('touches', ['FT*******', 'F**T*****', 'F***T****']),
+    ('intersects', ['T********', '*T*******', '***T*****', '****T****']),
+]
+
+
+def _create_tables(cursor, tables):
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {RELATION_TABLE_NAME} (
+        iri_a character varying(255),
+        iri_b character varying(255),
+        relation character varying(16),
+        PRIMARY KEY (iri_a, iri_b, relation)
+    );
+    """)
+    # tables created before the OGC relations had a shorter column
+    cursor.execute(
+        f'ALTER TABLE {RELATION_TABLE_NAME} '
+        f'ALTER COLUMN relation TYPE character varying(16);')
+    cursor.execute(
+        f'CREATE INDEX IF NOT EXISTS {RELATION_TABLE_NAME}_iri_b_idx '
+        f'ON {RELATION_TABLE_NAME} (iri_b, iri_a);')
+
+    # the geometries the relations were computed for, so that a refresh
+    # only has to look at pairs with at least one new geometry
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {STATE_TABLE_NAME} (
+        geometry_table character varying(63),
+        iri character varying(255),
+        computed boolean,
+        PRIMARY KEY (geometry_table, iri)
+    );
+    """)
+
+    for table in tables:
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_the_geom_idx '
+            f'ON {table} USING gist (the_geom);')
+
+
+def get_relation_patterns(left_table, right_table):
+    """
+    Returns the (relation, DE-9IM patterns) pairs tested between the
+    geometries of the two tables
+    """
+    if left_table == 'polygon' and right_table == 'polygon':
+        return RCC8_PATTERNS
+
+    return OGC_PATTERNS
+
+
+def relate_match(matrix, pattern):
+    """
+    Python counterpart of PostGIS' ST_RelateMatch
+    """
+    for value, pattern_value in zip(matrix, pattern):
+        if pattern_value == '*':
+            continue
+        elif pattern_value == 'T':
+            if value == 'F':
+                return False
+        elif value != pattern_value:
+            return False
+
+    return True
+
+
+def get_relation(matrix, left_table, right_table):
+    """
+    Returns the relation stored for a pair with the DE-9IM `matrix`, i.e.
+    what the query of `get_relation_chunk_query` computes, or None for
+    disjoint pairs
+    """
+    for relation, patterns in get_relation_patterns(left_table, right_table):
+        if any(relate_match(matrix, pattern) for pattern in patterns):
+            return relation
+
+    return None
+
+
+def get_relation_chunk_query(left_table, right_table, num_chunks, chunk):
+    """
+    Returns the query inserting the relations between the geometries of
+    `left_table` and `right_table` whose bounding boxes intersect, with at
+    least one of them not computed yet, for the `chunk`th of `num_chunks`
+    hash partitions of the left IRIs
+    """
+    cases = ' '.join(
+        'WHEN ' +
+        ' OR '.join(f"ST_RelateMatch(matrix, '{pattern}')"
+                    for pattern in patterns) +
+        f" THEN '{relation}'"
+        for relation, patterns in get_relation_patterns(
+            left_table, right_table))
+
+    return f"""
+    INSERT INTO {RELATION_TABLE_NAME} (iri_a, iri_b, relation)
+    SELECT iri_a, iri_b, relation FROM (
+        SELECT iri_a, iri_b, CASE {cases} END AS relation
+        FROM (
+            SELECT a.iri AS iri_a,
+                   b.iri AS iri_b,
+                   ST_Relate(a.the_geom, b.the_geom) AS matrix
+            FROM {left_table} a
+            JOIN {right_table} b ON a.the_geom && b.the_geom
+            JOIN {STATE_TABLE_NAME} sa
+                ON sa.geometry_table = '{left_table}' AND sa.iri = a.iri
+            JOIN {STATE_TABLE_NAME} sb
+                ON sb.geometry_table = '{right_table}' AND sb.iri = b.iri
+            WHERE (NOT sa.computed OR NOT sb.computed)
+                AND a.iri <> b.iri
+                AND (hashtext(a.iri) & 2147483647) % {num_chunks} = {chunk}
+        ) pairs
+    ) relations
+    WHERE relation IS NOT NULL
+    ON CONFLICT DO NOTHING
+    """
+
+
+def _compute_chunk(connect, left_table, right_table, num_chunks, chunk):
+    conn = connect()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        get_relation_chunk_query(left_table, right_table, num_chunks, chunk))
+    num_rows = cursor.rowcount
+
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    return num_rows
+
+
+def compute_spatial_relations(
+        connect,
+        table_pairs=None,
+        workers=4,
+        num_chunks=DEFAULT_NUM_CHUNKS,
+        full=False):
+    """
+    Materialises the relations between the geometries of the given (left
+    table, right table) pairs in the spatial_relation(iri_a, iri_b, relation)
+    table, so that learners can look them up instead of evaluating PostGIS
+    predicates. Between polygons these are the RCC8 relations
+    (`RCC8_PATTERNS`), pairs involving points or lines get the OGC relations
+    eq, within, contains, touches or intersects (`OGC_PATTERNS`). Candidate
+    pairs are found via a GiST bounding box join; pairs without a row are
+    disjoint (dc).
+    The work is split into `num_chunks` hash partitions per table pair,
+    computed by up to `workers` connections in parallel. `connect` is a
+    function returning a new database connection (e.g.
+    `PostGISDataLoader.connect`).
+    Only pairs involving geometries added since the last call are computed,
+    unless `full` is set, in which case all relations are computed from
+    scratch (e.g. after rows were deleted).
+    Returns the number of relation rows inserted.
+    """
+    table_pairs = table_pairs or DEFAULT_TABLE_PAIRS
+    tables = sorted({table for pair in table_pairs for table in pair})
+
+    conn = connect()
+    cursor = conn.cursor()
+    _create_tables(cursor, tables)
+
+    if full:
+        cursor.execute(f'TRUNCATE {RELATION_TABLE_NAME}, {STATE_TABLE_NAME};')
+
+    for table in tables:
+        cursor.execute(
+            f"INSERT INTO {STATE_TABLE_NAME} (geometry_table, iri, computed) "
+            f"SELECT DISTINCT '{table}', iri, false FROM {table} "
+            f"ON CONFLICT DO NOTHING;")
+        logging.info(f'{cursor.rowcount} new geometries in {table}')
+
+    conn.commit()
+
+    with ThreadPoolExecutor(workers) as executor:
+        futures = [
+            executor.submit(
+                _compute_chunk,
+                connect,
+                left_table,
+                right_table,
+                num_chunks,
+                chunk)
+            for left_table, right_table in table_pairs
+            for chunk in range(num_chunks)]
+
+        # re-raises errors of the workers
+        num_rows = sum(future.result() for future in futures)
+
+    cursor.execute(
+        f'UPDATE {STATE_TABLE_NAME} SET computed = true WHERE NOT computed;')
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    logging.info(f'Inserted {num_rows} spatial relations')
+
+    return num_rows
@@ -0,0 +1,402 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+MANIFEST_FILE_NAME = 'manifest.json'
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_BATCH_SIZE = 1000
+CHECKPOINT_TABLE_NAME = 'load_checkpoint'
+
+
+def escape_copy_value(value):
+    """
+    Escapes a value for the text format of PostgreSQL's COPY command
+    """
+    return value.replace('\\', '\\\\').replace('\t', '\\t') \
+        .replace('\n', '\\n').replace('\r', '\\r')
+
+
+class DatabaseSink(object):
+    """
+    Inserts the geometry rows extracted by `PostGISDataLoader` into the
+    PostGIS tables via a single connection.
+    Checkpoints, i.e. how many of the rows extracted from a source (in which
+    row order) have been processed, are stored in the `checkpoint_table` in
+    the same transaction as the rows themselves.
+    Rows violating a unique constraint (see `init_db`) are skipped and
+    counted as `conflicts`.
+    Unless `close_connection` is unset (e.g. for a pooled connection),
+    `close` closes the connection as well.
+    """
+    def __init__(
+            self,
+            conn,
+            checkpoint_table=CHECKPOINT_TABLE_NAME,
+            close_connection=True):
+        self.conn = conn
+        self.close_connection = close_connection
+        self.cursor = conn.cursor()
+        self.conflicts = 0
+        self.checkpoint_table = checkpoint_table
+        self._checkpoint_table_created = False
+
+    def _create_checkpoint_table(self):
+        if not self._checkpoint_table_created:
+            self.cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.checkpoint_table} (
+                source text PRIMARY KEY,
+                source_size bigint,
+                row_offset bigint,
+                rows_written bigint,
+                finished boolean,
+                updated timestamp DEFAULT now(),
+                row_order text
+            );
+            ALTER TABLE {self.checkpoint_table}
+                ADD COLUMN IF NOT EXISTS row_order text;
+            """)
+            self._checkpoint_table_created = True
+
+    def add_source(self, file_path):
+        pass
+
+    def get_checkpoint(self, source):
+        """
+        Returns the (source size, row offset, rows written, finished, row
+        order) tuple of the last committed checkpoint of `source`, or None.
+        The lookup runs in the current transaction, i.e. does not commit rows
+        written before.
+        """
+        self._create_checkpoint_table()
+        self.cursor.execute(
+            f'SELECT source_size, row_offset, rows_written, finished, '
+            f'row_order '
+            f'FROM {self.checkpoint_table} WHERE source = %s',
+            (source,))
+
+        return self.cursor.fetchone()
+
+    def checkpoint(
+            self, source, source_size, row_offset, rows_written, finished,
+            row_order):
+        self._create_checkpoint_table()
+        self.cursor.execute(
+            f'INSERT INTO {self.checkpoint_table} '
+            f'(source, source_size, row_offset, rows_written, finished, '
+            f'row_order) '
+            f'VALUES (%s, %s, %s, %s, %s, %s) '
+            f'ON CONFLICT (source) DO UPDATE SET '
+            f'source_size = EXCLUDED.source_size, '
+            f'row_offset = EXCLUDED.row_offset, '
+            f'rows_written = EXCLUDED.rows_written, '
+            f'finished = EXCLUDED.finished, '
+            f'row_order = EXCLUDED.row_order, '
+            f'updated = now()',
+            (source, source_size, row_offset, rows_written, finished,
+             row_order))
+
+    def write(self, table, iri, wkt):
+        self.cursor.execute(
+            f'INSERT INTO {table} VALUES (%s, ST_GeomFromText(%s)) '
+            f'ON CONFLICT DO NOTHING',
+            (iri, wkt))
+
+        if self.cursor.rowcount == 0:
+            self.conflicts += 1
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.cursor.close()
+        if self.close_connection:
+            self.conn.close()
+
+
+class NullSink(object):
+    """
+    Drops all rows, as used by the dry run mode of `PostGISDataLoader`
+    """
+    conflicts = 0
+
+    def add_source(self, file_path):
+        pass
+
+    def get_checkpoint(self, source):
+        return None
+
+    def checkpoint(
+            self, source, source_size, row_offset, rows_written, finished,
+            row_order):
+        pass
+
+    def write(self, table, iri, wkt):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class CopyFileSink(object):
+    """
+    Writes the geometry rows to one file per table in the text format of
+    PostgreSQL's COPY command, instead of sending them to a database, plus a
+    manifest listing the files, their row counts and the loaded sources. The
+    files can later be loaded with `load_copy_files`.
+    """
+    conflicts = 0
+
+    def __init__(self, emit_dir, file_prefix=''):
+        os.makedirs(emit_dir, exist_ok=True)
+
+        self.emit_dir = emit_dir
+        self.file_prefix = file_prefix
+        self.sources = []
+
+        self._files = {}
+        self._row_counts = {}
+
+    def _get_file(self, table):
+        copy_file = self._files.get(table)
+
+        if copy_file is None:
+            copy_file = open(
+                os.path.join(
+                    self.emit_dir, f'{self.file_prefix}{table}.copy'), 'w')
+            self._files[table] = copy_file
+            self._row_counts[table] = 0
+
+        return copy_file
+
+    def add_source(self, file_path):
+        self.sources.append(file_path)
+
+    def get_checkpoint(self, source):
+        # the COPY files are written from scratch, so there is nothing to
+        # resume
+        return None
+
+    def checkpoint(
+            self, source, source_size, row_offset, rows_written, finished,
+            row_order):
+        pass
+
+    def write(self, table, iri, wkt):
+        self._get_file(table).write(
+            f'{escape_copy_value(iri)}\t{escape_copy_value(wkt)}\n')
+        self._row_counts[table] += 1
+
+    def commit(self):
+        for copy_file in self._files.values():
+            copy_file.flush()
+
+    def close(self):
+        for copy_file in self._files.values():
+            copy_file.close()
+
+        manifest = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'sources': self.sources,
+            'files': [
+                {
+                    'table': table,
+                    'file': os.path.basename(copy_file.name),
+                    'rows': self._row_counts[table],
+                }
+                for table, copy_file in self._files.items()],
+        }
+
+        manifest_file_path = os.path.join(
+            self.emit_dir, f'{self.file_prefix}{MANIFEST_FILE_NAME}')
+        with open(manifest_file_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+
+class ThreadedSink(object):
+    """
+    Passes the rows on to another sink in a writer thread, so that parsing
+    goes on (with the next chunk or file) while the rows parsed before are
+    still being written. Rows are handed over in batches of `batch_size` via a queue of
+    at most `queue_size` batches; if the writer falls behind, `write` blocks
+    until there is room again. Errors of the writer thread are re-raised by
+    the next call.
+    """
+    def __init__(
+            self,
+            sink,
+            queue_size=DEFAULT_QUEUE_SIZE,
+            batch_size=DEFAULT_BATCH_SIZE):
+
+        self.sink = sink
+        self.batch_size = batch_size
+        # seconds the writer thread spent in the wrapped sink
+        self.busy_seconds = 0
+
+        self._queue = queue.Queue(queue_size)
+        # held by the writer thread while it uses the wrapped sink
+        self._sink_lock = threading.Lock()
+        self._batch = []
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, name='sink-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            op, arg = self._queue.get()
+
+            if op == 'close':
+                self._queue.task_done()
+                break
+            if self._error is not None:
+                # drain the queue so that the producer does not block forever
+                self._queue.task_done()
+                continue
+
+            start = time.perf_counter()
+            try:
+                with self._sink_lock:
+                    if op == 'write':
+                        for table, iri, wkt in arg:
+                            self.sink.write(table, iri, wkt)
+                    elif op == 'commit':
+                        self.sink.commit()
+                    elif op == 'source':
+                        self.sink.add_source(arg)
+                    elif op == 'checkpoint':
+                        self.sink.checkpoint(*arg)
+            except Exception as e:
+                self._error = e
+            self.busy_seconds += time.perf_counter() - start
+            self._queue.task_done()
+
+    def _check_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _put(self, op, arg=None):
+        self._check_error()
+        self._queue.put((op, arg))
+
+    def _flush(self):
+        if self._batch:
+            self._put('write', self._batch)
+            self._batch = []
+
+    def add_source(self, file_path):
+        self._flush()
+        self._put('source', file_path)
+
+    @property
+    def conflicts(self):
+        return self.sink.conflicts
+
+    def get_checkpoint(self, source):
+        # only waits for the batch being written, not for the queued ones:
+        # these belong to other sources, whose checkpoints do not matter here
+        self._check_error()
+
+        with self._sink_lock:
+            return self.sink.get_checkpoint(source)
+
+    def checkpoint(
+            self, source, source_size, row_offset, rows_written, finished,
+            row_order):
+        self._flush()
+        self._put(
+            'checkpoint',
+            (source, source_size, row_offset, rows_written, finished,
+             row_order))
+
+    def write(self, table, iri, wkt):
+        self._batch.append((table, iri, wkt))
+
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def commit(self):
+        self._flush()
+        self._put('commit')
+
+    def close(self):
+        self._flush()
+        self._queue.put(('close', None))
+        self._thread.join()
+
+        self.sink.close()
+        self._check_error()
+
+
+def copy_skipping_conflicts(cursor, table, copy_file):
+    """
+    COPYs the (iri, the_geom) rows of `copy_file` into `table` via a
+    temporary staging table, so that rows violating a unique constraint (see
+    `init_db`) are skipped instead of aborting the whole COPY. Returns the
+    number of rows inserted.
+    """
+    staging_table = f'{table}_staging'
+
+    cursor.execute(
+        f'CREATE TEMPORARY TABLE IF NOT EXISTS {staging_table} '
+        f'(iri character varying(255), the_geom geometry);')
+    cursor.execute(f'TRUNCATE {staging_table};')
+    cursor.copy_expert(
+        f'COPY {staging_table} (iri, the_geom) FROM STDIN', copy_file)
+    cursor.execute(
+        f'INSERT INTO {table} (iri, the_geom) '
+        f'SELECT iri, the_geom FROM {staging_table} '
+        f'ON CONFLICT DO NOTHING;')
+
+    return cursor.rowcount
+
+
+def _copy_file(connect, table, file_path):
+    conn = connect()
+    cursor = conn.cursor()
+
+    with open(file_path) as copy_file:
+        num_rows = copy_skipping_conflicts(cursor, table, copy_file)
+
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    logging.info(f'Loaded {num_rows} rows of {file_path} into {table}')
+
+
+def load_copy_files(manifest_file_paths, connect, workers=4):
+    """
+    Loads the COPY files listed in the given manifests written by
+    `CopyFileSink`, with up to `workers` files being copied in parallel.
+    Rows whose IRI is already loaded (with the unique constraints of
+    `init_db`) are skipped.
+    `connect` is a function returning a new database connection (e.g.
+    `PostGISDataLoader.connect`).
+    """
+    with ThreadPoolExecutor(workers) as executor:
+        futures = []
+
+        for manifest_file_path in manifest_file_paths:
+            emit_dir = os.path.dirname(manifest_file_path)
+
+            with open(manifest_file_path) as manifest_file:
+                manifest = json.load(manifest_file)
+
+            for entry in manifest['files']:
+                futures.append(executor.submit(
+                    _copy_file,
+                    connect,
+                    entry['table'],
+                    os.path.join(emit_dir, entry['file'])))
+
+        for future in futures:
+            # re-raises errors of the workers
+            future.result()
@@ -0,0 +1,383 @@
+import math
+
+from dataloader.geometry import GeometryCollection, POINT, LINE_STRING, \
+    POLYGON
+
+# distance up to which a point counts as lying on a segment
+DEFAULT_TOLERANCE = 1e-9
+# geometries covering more grid cells are kept out of the grid
+DEFAULT_MAX_CELLS_PER_GEOMETRY = 64
+
+PREDICATES = ['intersects', 'disjoint', 'touches', 'within', 'contains', 'ec',
+              'tpp']
+
+_INTERIOR = 'i'
+_BOUNDARY = 'b'
+_EXTERIOR = 'e'
+
+_DIMENSIONS = {POINT: 0, LINE_STRING: 1, POLYGON: 2}
+
+
+def _points(coords):
+    return list(zip(coords[0::2], coords[1::2]))
+
+
+def _segments(rings):
+    for ring in rings:
+        yield from zip(ring, ring[1:])
+
+
+def _on_segment(p, a, b, tolerance):
+    (px, py), (ax, ay), (bx, by) = p, a, b
+
+    if not (min(ax, bx) - tolerance <= px <= max(ax, bx) + tolerance and
+            min(ay, by) - tolerance <= py <= max(ay, by) + tolerance):
+        return False
+
+    length = math.hypot(bx - ax, by - ay)
+    if length == 0:
+        return math.hypot(px - ax, py - ay) <= tolerance
+
+    cross = (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+
+    return abs(cross) <= tolerance * length
+
+
+def _segment_intersections(a, b, c, d, tolerance):
+    """
+    Returns the points where the segments a-b and c-d meet, i.e. the
+    crossing point or the end points of a collinear overlap
+    """
+    (ax, ay), (bx, by), (cx, cy), (dx, dy) = a, b, c, d
+
+    if max(ax, bx) + tolerance < min(cx, dx) or \
+            max(cx, dx) + tolerance < min(ax, bx) or \
+            max(ay, by) + tolerance < min(cy, dy) or \
+            max(cy, dy) + tolerance < min(ay, by):
+        return []
+
+    points = [p for p, s, e in [(a, c, d), (b, c, d), (c, a, b), (d, a, b)]
+              if _on_segment(p, s, e, tolerance)]
+
+    denominator = (bx - ax) * (dy - cy) - (by - ay) * (dx - cx)
+    if denominator != 0:
+        t = ((cx - ax) * (dy - cy) - (cy - ay) * (dx - cx)) / denominator
+        u = ((cx - ax) * (by - ay) - (cy - ay) * (bx - ax)) / denominator
+
+        if 0 < t < 1 and 0 < u < 1:
+            points.append((ax + t * (bx - ax), ay + t * (by - ay)))
+
+    return points
+
+
+class _Geometry(object):
+    __slots__ = ('type_code', 'rings', 'bbox')
+
+    def __init__(self, type_code, rings, bbox):
+        self.type_code = type_code
+        self.rings = rings
+        self.bbox = bbox
+
+    def locate(self, p, tolerance):
+        """
+        Returns whether the point `p` lies in the interior, on the boundary
+        or in the exterior of the geometry
+        """
+        if self.type_code == POINT:
+            (x, y), = self.rings[0]
+            on_point = math.hypot(p[0] - x, p[1] - y) <= tolerance
+
+            return _INTERIOR if on_point else _EXTERIOR
+
+        if self.type_code == LINE_STRING:
+            line = self.rings[0]
+            if line[0] != line[-1]:
+                for end_point in (line[0], line[-1]):
+                    if math.hypot(p[0] - end_point[0],
+                                  p[1] - end_point[1]) <= tolerance:
+                        return _BOUNDARY
+
+            if any(_on_segment(p, a, b, tolerance)
+                   for a, b in _segments(self.rings)):
+                return _INTERIOR
+
+            return _EXTERIOR
+
+        if any(_on_segment(p, a, b, tolerance)
+               for a, b in _segments(self.rings)):
+            return _BOUNDARY
+
+        # even-odd rule over all rings, so holes are excluded
+        x, y = p
+        inside = False
+        for (ax, ay), (bx, by) in _segments(self.rings):
+            if (ay > y) != (by > y) and \
+                    x < (bx - ax) * (y - ay) / (by - ay) + ax:
+                inside = not inside
+
+        return _INTERIOR if inside else _EXTERIOR
+
+    def locate_own(self, p, is_vertex):
+        """
+        Location of a point of the geometry's own vertices or segments
+        """
+        if self.type_code == POLYGON:
+            return _BOUNDARY
+        if self.type_code == LINE_STRING and is_vertex:
+            line = self.rings[0]
+            if line[0] != line[-1] and p in (line[0], line[-1]):
+                return _BOUNDARY
+
+        return _INTERIOR
+
+
+def _sample(geom, other, tolerance):
+    """
+    Yields (location in `geom`, location in `other`) for sample points of
+    `geom`: its vertices, the points where it meets the boundary of `other`
+    and the midpoints of its segments split at these points. Since the
+    location relative to `other` can only change where `geom` meets the
+    boundary (or the vertices) of `other`, the samples cover every part of
+    `geom`.
+    """
+    other_points = [p for ring in other.rings for p in ring]
+    other_segments = list(_segments(other.rings))
+
+    if geom.type_code == POINT:
+        p = geom.rings[0][0]
+        yield _INTERIOR, other.locate(p, tolerance)
+        return
+
+    for a, b in _segments(geom.rings):
+        split_points = [a, b]
+
+        for c, d in other_segments:
+            split_points += _segment_intersections(a, b, c, d, tolerance)
+        split_points += [p for p in other_points
+                         if _on_segment(p, a, b, tolerance)]
+
+        # order the split points along the segment
+        split_points = sorted(
+            set(split_points),
+            key=lambda p: (p[0] - a[0]) * (b[0] - a[0]) +
+                          (p[1] - a[1]) * (b[1] - a[1]))
+
+        for p in split_points:
+            yield geom.locate_own(p, p in (a, b)), other.locate(p, tolerance)
+
+        for p, q in zip(split_points, split_points[1:]):
+            mid = ((p[0] + q[0]) / 2, (p[1] + q[1]) / 2)
+            yield geom.locate_own(mid, False), other.locate(mid, tolerance)
+
+
+class _Relation(object):
+    """
+    The parts of the DE-9IM matrix of two geometries needed for the
+    supported predicates, derived from the samples of both geometries
+    """
+    def __init__(self, a, b, tolerance):
+        samples_a = set(_sample(a, b, tolerance))
+        samples_b = set((loc_a, loc_b) for loc_b, loc_a in
+                        _sample(b, a, tolerance))
+        samples = samples_a | samples_b
+
+        a_is_area = a.type_code == POLYGON
+        b_is_area = b.type_code == POLYGON
+
+        self.intersects = any(
+            loc_a != _EXTERIOR and loc_b != _EXTERIOR
+            for loc_a, loc_b in samples)
+
+        self.interiors_intersect = (
+            (_INTERIOR, _INTERIOR) in samples or
+            # the neighbourhood of a point of an area boundary contains
+            # interior points of the area
+            (a_is_area and b_is_area and (
+                (_BOUNDARY, _INTERIOR) in samples or
+                (_INTERIOR, _BOUNDARY) in samples or
+                # identical boundaries
+                samples == {(_BOUNDARY, _BOUNDARY)})))
+
+        self.boundaries_intersect = (_BOUNDARY, _BOUNDARY) in samples
+
+        self.a_outside_b = self._is_outside(
+            samples, a_is_area, b_is_area,
+            _DIMENSIONS[a.type_code] > _DIMENSIONS[b.type_code])
+        self.b_outside_a = self._is_outside(
+            {(loc_b, loc_a) for loc_a, loc_b in samples},
+            b_is_area, a_is_area,
+            _DIMENSIONS[b.type_code] > _DIMENSIONS[a.type_code])
+
+    @staticmethod
+    def _is_outside(samples, is_area, other_is_area, higher_dimension):
+        """
+        Whether the first geometry has points in the exterior of the other
+        """
+        return higher_dimension or \
+            any(loc != _EXTERIOR and other_loc == _EXTERIOR
+                for loc, other_loc in samples) or \
+            (is_area and other_is_area and (_INTERIOR, _BOUNDARY) in samples)
+
+
+class SpatialEngine(object):
+    """
+    In-process evaluation of spatial predicates between the geometries of a
+    `dataloader.geometry.GeometryCollection`, without a database.
+    Candidate pairs are found via a uniform grid of `cell_size` (by default
+    about the average bounding box size) over the bounding boxes of the
+    geometries. Geometries covering more than `max_cells_per_geometry` cells
+    are kept in a separate list checked for every candidate search instead,
+    so that a few large geometries don't fill the grid. The predicates (see `PREDICATES`) follow their PostGIS
+    counterparts; 'ec' and 'tpp' are the RCC8 relations externally connected
+    and tangential proper part between areas. Points closer than `tolerance`
+    to a segment are considered to lie on it, so that results are exact for
+    axis-aligned geometries and points, and stable against rounding noise
+    for all others.
+    """
+    def __init__(
+            self,
+            geometries,
+            cell_size=None,
+            tolerance=DEFAULT_TOLERANCE,
+            max_cells_per_geometry=DEFAULT_MAX_CELLS_PER_GEOMETRY):
+
+        self.geometries = geometries
+        self.tolerance = tolerance
+
+        bboxes = geometries.bboxes()
+        self._bboxes = [tuple(bboxes[i:i + 4])
+                        for i in range(0, len(bboxes), 4)]
+        self._geoms = [None] * len(geometries)
+
+        if cell_size is None:
+            sizes = [max(max_x - min_x, max_y - min_y)
+                     for min_x, min_y, max_x, max_y in self._bboxes]
+            cell_size = sum(sizes) / len(sizes) if sizes else 0
+        # degenerate geometries (e.g. only points) get cells of tolerance
+        # size at least
+        self.cell_size = max(cell_size, tolerance * 1000)
+
+        self._grid = {}
+        # indices of the geometries not in the grid
+        self._large = []
+        for idx, bbox in enumerate(self._bboxes):
+            cols, rows = self._get_cell_ranges(bbox)
+
+            if len(cols) * len(rows) > max_cells_per_geometry:
+                self._large.append(idx)
+                continue
+
+            for col in cols:
+                for row in rows:
+                    self._grid.setdefault((col, row), []).append(idx)
+        self._large_set = set(self._large)
+
+    @classmethod
+    def from_wkts(cls, wkts, iris=None, **kwargs):
+        return cls(GeometryCollection.from_wkts(wkts, iris), **kwargs)
+
+    def _get_cell_ranges(self, bbox):
+        min_x, min_y, max_x, max_y = bbox
+        t = self.tolerance
+
+        return \
+            range(math.floor((min_x - t) / self.cell_size),
+                  math.floor((max_x + t) / self.cell_size) + 1), \
+            range(math.floor((min_y - t) / self.cell_size),
+                  math.floor((max_y + t) / self.cell_size) + 1)
+
+    def _get_geometry(self, idx):
+        geom = self._geoms[idx]
+
+        if geom is None:
+            geom = _Geometry(
+                self.geometries.get_type(idx),
+                [_points(ring) for ring in self.geometries.get_rings(idx)],
+                self._bboxes[idx])
+            self._geoms[idx] = geom
+
+        return geom
+
+    def _bboxes_intersect(self, bbox_a, bbox_b):
+        t = self.tolerance
+
+        return bbox_a[0] <= bbox_b[2] + t and bbox_b[0] <= bbox_a[2] + t and \
+            bbox_a[1] <= bbox_b[3] + t and bbox_b[1] <= bbox_a[3] + t
+
+    def candidates(self, idx):
+        """
+        Returns the indices of the geometries whose bounding boxes intersect
+        the one of geometry `idx`
+        """
+        bbox = self._bboxes[idx]
+
+        if idx in self._large_set:
+            # cheaper than looking up all the cells covered
+            other_idxs = range(len(self._bboxes))
+        else:
+            cols, rows = self._get_cell_ranges(bbox)
+            other_idxs = {other_idx
+                          for col in cols for row in rows
+                          for other_idx in self._grid.get((col, row), [])}
+            other_idxs.update(self._large)
+
+        return sorted(
+            other_idx for other_idx in other_idxs
+            if other_idx != idx and
+            self._bboxes_intersect(bbox, self._bboxes[other_idx]))
+
+    def relate(self, idx_a, idx_b, predicate):
+        """
+        Evaluates `predicate` (one of `PREDICATES`) for the geometries at
+        `idx_a` and `idx_b`
+        """
+        if predicate not in PREDICATES:
+            raise ValueError(f'Unknown predicate {predicate}')
+
+        a = self._get_geometry(idx_a)
+        b = self._get_geometry(idx_b)
+
+        if not self._bboxes_intersect(a.bbox, b.bbox):
+            return predicate == 'disjoint'
+
+        relation = _Relation(a, b, self.tolerance)
+
+        if predicate == 'intersects':
+            return relation.intersects
+        elif predicate == 'disjoint':
+            return not relation.intersects
+        elif predicate == 'touches':
+            return relation.intersects and not relation.interiors_intersect
+        elif predicate == 'within':
+            return relation.interiors_intersect and not relation.a_outside_b
+        elif predicate == 'contains':
+            return relation.interiors_intersect and not relation.b_outside_a
+        elif predicate == 'ec':
+            return a.type_code == POLYGON and b.type_code == POLYGON and \
+                relation.intersects and not relation.interiors_intersect
+        else:
+            return a.type_code == POLYGON and b.type_code == POLYGON and \
+                relation.interiors_intersect and not relation.a_outside_b and \
+                relation.b_outside_a and relation.boundaries_intersect
+
+    def pairs(self, predicate):
+        """
+        Yields all (index a, index b) pairs of different geometries fulfilling
+        `predicate`, which must not be 'disjoint'
+        """
+        if predicate == 'disjoint':
+            raise ValueError('Disjoint pairs can not be found via the index')
+
+        for idx_a in range(len(self.geometries)):
+            for idx_b in self.candidates(idx_a):
+                if self.relate(idx_a, idx_b, predicate):
+                    yield idx_a, idx_b
+
+
+def relate_wkts(wkt_a, wkt_b, predicate, tolerance=DEFAULT_TOLERANCE):
+    """
+    Evaluates `predicate` for two WKT geometries
+    """
+    engine = SpatialEngine.from_wkts([wkt_a, wkt_b], tolerance=tolerance)
+
+    return engine.relate(0, 1, predicate)
@@ -3,7 +3,7 @@ from setuptools import setup
 setup(
     name='spatial_learning_data_loader',
     version='0.0.1',
-    packages=[''],
+    packages=['dataloader', 'datagenerator', 'userdataconverter', 'benchmark'],
     url='https://github.com/QROWD/spatial_learning_data_loader',
     license='Apache License v2.0',
     author='Patrick Westphal',
@@ -12,7 +12,8 @@ setup(
     install_requires=[
         'rdflib==4.2.2',
         'psycopg2==2.7.7',
-        'matplotlib==3.2.1'
+        'matplotlib==3.2.1',
+        'numpy==1.18.5'
     ],
     scripts=[
         'bin/loaddata',
@@ -22,5 +23,13 @@ setup(
         'bin/generatedata',
         'bin/plotresults',
         'bin/generatehotels',
+        'bin/benchmark',
+        'bin/benchmarkresults',
+        'bin/benchmarkpipeline',
+        'bin/loademitted',
+        'bin/computerelations',
+        'bin/spatialdata',
+        'bin/benchmarkstartup',
+        'bin/ingestdata',
     ],
 )
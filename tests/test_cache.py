@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from dataloader.cache import GeometryCache, GeometryTable
+
+ROWS = [
+    ('http://example.com/f1', 'http://example.com/Point',
+     'http://example.com/g1', 'POINT(1 2)'),
+    # non-ASCII and empty strings
+    ('http://example.com/fä', '', 'http://example.com/gä', 'POINT(3 4)'),
+]
+
+
+def test_geometry_table_round_trip(tmp_path):
+    prefix = str(tmp_path / 'table')
+    GeometryTable.from_rows(ROWS).save(prefix)
+
+    table = GeometryTable.load(prefix)
+
+    assert list(table) == ROWS
+    assert table[-1] == ROWS[-1]
+    with pytest.raises(IndexError):
+        table[len(ROWS)]
+
+
+def test_empty_geometry_table(tmp_path):
+    prefix = str(tmp_path / 'table')
+    GeometryTable.from_rows([]).save(prefix)
+
+    assert len(GeometryTable.load(prefix)) == 0
+
+
+class CountingExtractor(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, file_path):
+        self.calls += 1
+        return ROWS
+
+
+def test_cache_hits_and_misses(tmp_path):
+    file_path = tmp_path / 'data.nt'
+    file_path.write_text('first version')
+    cache = GeometryCache(str(tmp_path / 'cache'))
+    extract = CountingExtractor()
+
+    assert list(cache.get(str(file_path), extract, 'a')) == ROWS
+    assert list(cache.get(str(file_path), extract, 'a')) == ROWS
+    assert extract.calls == 1
+
+    # other settings or another content are cached separately
+    cache.get(str(file_path), extract, 'b')
+    file_path.write_text('second version')
+    cache.get(str(file_path), extract, 'a')
+
+    assert extract.calls == 3
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    file_paths = []
+    for i in range(3):
+        file_path = tmp_path / f'data{i}.nt'
+        file_path.write_text(f'version {i}')
+        file_paths.append(str(file_path))
+
+    entry_size = len(GeometryTable.from_rows(ROWS)._strings) + \
+        8 * (4 * len(ROWS) + 1)
+    # room for two entries
+    cache = GeometryCache(str(cache_dir), max_size=2 * entry_size)
+    extract = CountingExtractor()
+
+    for age, file_path in enumerate(file_paths[:2]):
+        cache.get(file_path, extract)
+        # the first file is the least recently used one
+        prefix = cache._get_entry_path_prefix(file_path, '')
+        for entry_file_path in cache_dir.glob(os.path.basename(prefix) + '.*'):
+            os.utime(entry_file_path, (age, age))
+
+    cache.get(file_paths[2], extract)
+    cache.get(file_paths[1], extract)
+    assert extract.calls == 3
+
+    cache.get(file_paths[0], extract)
+    assert extract.calls == 4
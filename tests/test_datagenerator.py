@@ -0,0 +1,72 @@
+import numpy
+import pytest
+
+from datagenerator import DataGenerator, DISTRIBUTIONS, \
+    HOTSPOTS_DISTRIBUTION, ZIPF_DISTRIBUTION, parse_type_ratios
+from dataloader.geometry import POINT, POLYGON
+
+CENTER_LON = 13.74
+CENTER_LAT = 51.05
+
+
+def _read_sql_lines(tmp_path, num_samples):
+    with open(tmp_path / f'load_{num_samples}.sql') as sql_file:
+        return sql_file.readlines()
+
+
+@pytest.mark.parametrize('distribution', DISTRIBUTIONS)
+def test_generate(tmp_path, distribution):
+    generator = DataGenerator(
+        CENTER_LON, CENTER_LAT, str(tmp_path), distribution=distribution)
+
+    generator.generate(200)
+
+    assert len(_read_sql_lines(tmp_path, 200)) == 200
+    assert (tmp_path / 'kb_200.ttl').exists()
+
+
+@pytest.mark.parametrize('distribution', DISTRIBUTIONS)
+def test_points_lie_around_the_center(distribution):
+    generator = DataGenerator(
+        CENTER_LON, CENTER_LAT, '.', distribution=distribution)
+    generator._DataGenerator__tmp_span = 0.1
+
+    points = generator._rnd_points(1000, distribution)
+
+    assert points.shape == (1000, 2)
+    # hotspots and corridors may spread a bit beyond the square
+    assert abs(points[:, 0] - CENTER_LON).max() < 0.2
+    assert abs(points[:, 1] - CENTER_LAT).max() < 0.2
+    assert (points == points.round(4)).all()
+
+
+@pytest.mark.parametrize('distribution, min_share, max_share', [
+    (HOTSPOTS_DISTRIBUTION, 0.05, 0.15),
+    # 1 / (1 + 1/8 + 1/27 + ...) of the points are in the first cluster
+    (ZIPF_DISTRIBUTION, 0.8, 0.86),
+])
+def test_largest_cluster_share(distribution, min_share, max_share):
+    generator = DataGenerator(
+        CENTER_LON, CENTER_LAT, '.', distribution=distribution,
+        cluster_spread=0, zipf_exponent=3)
+    generator._DataGenerator__tmp_span = 1
+
+    points = generator._rnd_points(10000, distribution)
+
+    # without spread the points are their cluster centers
+    _, counts = numpy.unique(points, axis=0, return_counts=True)
+    assert len(counts) == 10
+    assert min_share < counts.max() / 10000 < max_share
+
+
+def test_type_ratios(tmp_path):
+    generator = DataGenerator(
+        CENTER_LON, CENTER_LAT, str(tmp_path),
+        distribution=HOTSPOTS_DISTRIBUTION,
+        type_ratios=parse_type_ratios('point:1,polygon:0'))
+
+    generator.generate(100)
+
+    assert all(line.startswith('INSERT INTO point ')
+               for line in _read_sql_lines(tmp_path, 100))
+    assert parse_type_ratios('point:1,polygon:3') == {POINT: 1, POLYGON: 3}
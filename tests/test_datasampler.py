@@ -0,0 +1,87 @@
+import os
+
+from dataloader.datasampler import DataSampler, GEOVOCAB_GEOMETRY, \
+    GEOSPARQL_AS_WKT, STRATIFIED_MODE
+
+
+def _write_ntriples(file_path, points):
+    with open(file_path, 'w') as nt_file:
+        for i, (x, y) in enumerate(points):
+            nt_file.write(
+                f'<http://example.com/f{i}> <{GEOVOCAB_GEOMETRY}> '
+                f'<http://example.com/g{i}> .\n'
+                f'<http://example.com/g{i}> <{GEOSPARQL_AS_WKT}> '
+                f'"POINT({x} {y})" .\n')
+
+
+def _get_sampler(tmp_path, points, **kwargs):
+    data_dir = tmp_path / 'data'
+    os.makedirs(data_dir)
+    _write_ntriples(str(data_dir / 'points.nt'), points)
+
+    return DataSampler(
+        str(data_dir),
+        str(tmp_path / 'sample.owl'),
+        str(tmp_path / 'sample.sql'),
+        **kwargs)
+
+
+def _read_sql_lines(tmp_path, num_samples):
+    with open(tmp_path / f'sample.sql_{num_samples}') as sql_file:
+        return sql_file.readlines()
+
+
+def test_allocation_spreads_samples_evenly():
+    allocation = DataSampler._allocate_per_cell(
+        {'a': 1, 'b': 10, 'c': 10}, 11)
+
+    assert allocation == {'a': 1, 'b': 5, 'c': 5}
+
+
+def test_allocation_with_target_density():
+    cell_counts = {'a': 2, 'b': 5, 'c': 5, 'd': 5}
+    allocation = DataSampler._allocate_per_cell(cell_counts, 7, 3)
+
+    # the sparse cell is not used
+    assert 'a' not in allocation
+    assert sorted(allocation.values()) == [1, 3, 3]
+
+    # not enough cells of the target density
+    allocation = DataSampler._allocate_per_cell(cell_counts, 10, 3)
+    assert sum(allocation.values()) == 9
+
+
+def test_uniform_sample_sizes_are_filled_or_skipped(tmp_path):
+    sampler = _get_sampler(tmp_path, [(i, 0) for i in range(30)])
+
+    sampler.sample([10, 30, 40])
+
+    for num_samples in [10, 30]:
+        lines = _read_sql_lines(tmp_path, num_samples)
+        assert len(lines) == num_samples
+        assert len(set(lines)) == num_samples
+    assert not os.path.exists(tmp_path / 'sample.sql_40')
+
+
+def test_stratified_sample_with_target_density(tmp_path):
+    # 10 points in each of 3 grid cells
+    points = [(cell + i / 100, 0) for cell in range(3) for i in range(10)]
+    sampler = _get_sampler(
+        tmp_path,
+        points,
+        mode=STRATIFIED_MODE,
+        cell_size=1,
+        target_density=5)
+
+    sampler.sample([10, 15, 20])
+
+    for num_samples in [10, 15]:
+        assert len(_read_sql_lines(tmp_path, num_samples)) == num_samples
+
+        with open(tmp_path / f'sample.sql_{num_samples}.cells.tsv') \
+                as cells_file:
+            sampled = [int(line.split('\t')[3])
+                       for line in cells_file.readlines()[1:]]
+        assert sampled == [5] * (num_samples // 5)
+
+    assert not os.path.exists(tmp_path / 'sample.sql_20')
@@ -0,0 +1,84 @@
+import pytest
+
+import dataloader
+from dataloader import check_dataset_name, get_connection_params, init_db
+
+
+class RecordingCursor(object):
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql):
+        # whitespace normalized
+        self.statements.append(' '.join(sql.split()))
+
+    def close(self):
+        pass
+
+
+class RecordingConnection(object):
+    def __init__(self):
+        self.recording_cursor = RecordingCursor()
+        self.committed = False
+
+    def cursor(self):
+        return self.recording_cursor
+
+    def commit(self):
+        self.committed = True
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = RecordingConnection()
+    monkeypatch.setattr(dataloader, 'connect', lambda *args: conn)
+
+    return conn
+
+
+@pytest.mark.parametrize('dataset', ['osm', 'osm_2020', '_tmp'])
+def test_valid_dataset_names(dataset):
+    check_dataset_name(dataset)
+
+
+@pytest.mark.parametrize('dataset', [
+    'OSM', '2020', 'osm-2020', 'osm; DROP TABLE point', ''])
+def test_invalid_dataset_names(dataset):
+    with pytest.raises(ValueError):
+        check_dataset_name(dataset)
+
+
+def test_dataset_search_path():
+    params = get_connection_params('db', dataset='osm')
+    assert params['options'] == '-c search_path=osm,public'
+    assert get_connection_params('db')['options'] is None
+
+    with pytest.raises(ValueError):
+        get_connection_params('db', dataset='osm,public')
+
+
+def test_init_db_creates_dataset_partitions(conn):
+    init_db('db', datasets=['osm', 'gps'], unique_iris=True)
+
+    statements = conn.recording_cursor.statements
+    assert conn.committed
+    assert 'CREATE TABLE IF NOT EXISTS public.point ( ' \
+        'iri character varying(255), the_geom geometry(Point), ' \
+        'dataset character varying(63) NOT NULL, UNIQUE (iri, dataset) ' \
+        ') PARTITION BY LIST (dataset);' in statements
+    for dataset in ['osm', 'gps']:
+        assert f'CREATE SCHEMA IF NOT EXISTS {dataset};' in statements
+        assert f'CREATE TABLE IF NOT EXISTS {dataset}.polygon ' \
+            f'PARTITION OF public.polygon (dataset DEFAULT \'{dataset}\') ' \
+            f'FOR VALUES IN (\'{dataset}\');' in statements
+
+
+def test_init_db_refuses_invalid_dataset(conn):
+    with pytest.raises(ValueError):
+        init_db('db', datasets=['osm', "x'); DROP TABLE point; --"])
+
+    assert not conn.committed
+    assert not any('DROP' in sql for sql in conn.recording_cursor.statements)
@@ -0,0 +1,51 @@
+import pytest
+
+from dataloader.dedup import BloomFilter, HashedKeySet, MIN_BLOOM_CAPACITY, \
+    MIN_BYTES_PER_GEOMETRY, estimate_bloom_capacity, get_key_set
+
+KEYS = [f'http://example.com/geometry{i}' for i in range(10000)]
+
+
+def test_hashed_key_set():
+    key_set = HashedKeySet()
+
+    assert not any(key_set.add(key) for key in KEYS)
+    assert all(key_set.add(key) for key in KEYS)
+    assert len(key_set) == len(KEYS)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom_filter = BloomFilter(capacity=len(KEYS), error_rate=0.01)
+
+    for key in KEYS:
+        bloom_filter.add(key)
+
+    assert all(bloom_filter.add(key) for key in KEYS)
+
+
+def test_bloom_filter_error_rate():
+    bloom_filter = BloomFilter(capacity=len(KEYS), error_rate=0.01)
+
+    num_false_positives = sum(bloom_filter.add(key) for key in KEYS)
+
+    # the filter fills up while adding, so the rate stays below the target
+    assert num_false_positives < 0.01 * len(KEYS)
+    assert len(bloom_filter) == len(KEYS) - num_false_positives
+
+
+def test_estimate_bloom_capacity(tmp_path):
+    small_file = tmp_path / 'small.nt'
+    small_file.write_bytes(b'x' * 1000)
+    large_file = tmp_path / 'large.nt'
+    large_file.write_bytes(b'x' * MIN_BYTES_PER_GEOMETRY * MIN_BLOOM_CAPACITY)
+
+    assert estimate_bloom_capacity([str(small_file)]) == MIN_BLOOM_CAPACITY
+    assert estimate_bloom_capacity([str(small_file), str(large_file)]) == \
+        MIN_BLOOM_CAPACITY + 1000 // MIN_BYTES_PER_GEOMETRY
+
+
+def test_get_key_set():
+    assert isinstance(get_key_set('set'), HashedKeySet)
+    assert isinstance(get_key_set('bloom', 1000), BloomFilter)
+    with pytest.raises(ValueError):
+        get_key_set('list')
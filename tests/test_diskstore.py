@@ -0,0 +1,106 @@
+import gzip
+import os
+
+from rdflib import Graph, URIRef
+
+from dataloader import PostGISDataLoader
+from dataloader.datasampler import POINT_FEATURE_CLS, LINE_FEATURE_CLS, \
+    AREA_FEATURE_CLS
+from dataloader.diskstore import stream_geometries_on_disk
+from dataloader.extraction import extract_geometries, use_disk_store
+from dataloader.inputs import ASSUMED_COMPRESSION_RATIO
+from dataloader.metrics import LoadMetrics
+from dataloader.sinks import NullSink
+
+HAS_GEOMETRY = 'http://www.opengis.net/ont/geosparql#hasGeometry'
+AS_WKT = 'http://www.opengis.net/ont/geosparql#asWKT'
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+
+
+class RecordingSink(NullSink):
+    def __init__(self):
+        self.rows = []
+
+    def write(self, table, iri, wkt):
+        self.rows.append((table, iri, wkt))
+
+
+def _write_turtle(file_path, num_geoms):
+    with open(file_path, 'w', encoding='utf-8') as ttl_file:
+        for i in reversed(range(num_geoms)):
+            # non-ASCII IRIs, whose SQLite order must match the Python one
+            feature = f'<http://example.com/f{i}{"äé€𝄞"[i % 4]}>'
+            ttl_file.write(
+                f'{feature} <{HAS_GEOMETRY}> <http://example.com/g{i}> .\n'
+                f'<http://example.com/g{i}> <{AS_WKT}> '
+                f'"POINT({i % 100} {i // 100})" .\n')
+            if i % 3:
+                ttl_file.write(
+                    f'{feature} <{RDF_TYPE}> <{POINT_FEATURE_CLS}> .\n')
+
+
+def test_streamed_rows_are_sorted(tmp_path):
+    file_path = str(tmp_path / 'geoms.ttl')
+    _write_turtle(file_path, 500)
+
+    g = Graph()
+    g.parse(file_path, format='turtle')
+    expected = sorted(extract_geometries(
+        g, [URIRef(HAS_GEOMETRY)], [URIRef(AS_WKT)]))
+
+    metrics = LoadMetrics()
+    with open(file_path, 'rb') as input_file:
+        rows = list(stream_geometries_on_disk(
+            input_file,
+            'turtle',
+            [HAS_GEOMETRY],
+            [AS_WKT],
+            str(tmp_path),
+            metrics))
+
+    assert rows == expected
+    assert set(metrics.seconds) == {'parse', 'sort'}
+    # the temporary store is removed
+    assert os.listdir(tmp_path) == ['geoms.ttl']
+
+
+def test_loader_streams_rows_from_disk_store(tmp_path):
+    file_path = str(tmp_path / 'geoms.ttl')
+    _write_turtle(file_path, 500)
+
+    sinks = []
+    for disk_store_threshold in [None, 1]:
+        sink = RecordingSink()
+        data_loader = PostGISDataLoader(
+            [HAS_GEOMETRY],
+            [AS_WKT],
+            [str(POINT_FEATURE_CLS)],
+            [str(LINE_FEATURE_CLS)],
+            [str(AREA_FEATURE_CLS)],
+            db_name=None,
+            disk_store_threshold=disk_store_threshold,
+            disk_store_dir=str(tmp_path),
+            sink=sink)
+
+        assert data_loader._use_disk_store_stream(file_path) == \
+            (disk_store_threshold is not None)
+
+        data_loader.load_geometry_data(file_path)
+        data_loader.close()
+        sinks.append(sink)
+
+    # features without a class are dropped
+    assert len(sinks[0].rows) == 333
+    assert sinks[0].rows == sinks[1].rows
+
+
+def test_threshold_compares_uncompressed_size(tmp_path):
+    file_path = str(tmp_path / 'geoms.ttl.gz')
+    with gzip.open(file_path, 'wb') as gz_file:
+        gz_file.write(b'x' * 100000)
+
+    size = os.path.getsize(file_path)
+
+    assert use_disk_store(file_path, size + 1)
+    assert use_disk_store(file_path, size * ASSUMED_COMPRESSION_RATIO)
+    assert not use_disk_store(file_path, size * ASSUMED_COMPRESSION_RATIO + 1)
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from dataloader import PostGISDataLoader
+from dataloader.datasampler import POINT_FEATURE_CLS, LINE_FEATURE_CLS, \
+    AREA_FEATURE_CLS
+from dataloader.sinks import MANIFEST_FILE_NAME, escape_copy_value
+
+HAS_GEOMETRY = 'http://www.opengis.net/ont/geosparql#hasGeometry'
+AS_WKT = 'http://www.opengis.net/ont/geosparql#asWKT'
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+
+
+def _write_ntriples(file_path, num_points):
+    with open(file_path, 'w') as nt_file:
+        for i in range(num_points):
+            nt_file.write(
+                f'<http://example.com/f{i}> <{RDF_TYPE}> '
+                f'<{POINT_FEATURE_CLS}> .\n'
+                f'<http://example.com/f{i}> <{HAS_GEOMETRY}> '
+                f'<http://example.com/g{i}> .\n'
+                f'<http://example.com/g{i}> <{AS_WKT}> '
+                f'"POINT({i} 0)" .\n')
+        nt_file.write(
+            f'<http://example.com/area> <{RDF_TYPE}> <{AREA_FEATURE_CLS}> .\n'
+            f'<http://example.com/area> <{HAS_GEOMETRY}> '
+            f'<http://example.com/area_geom> .\n'
+            f'<http://example.com/area_geom> <{AS_WKT}> '
+            f'"POLYGON((0 0, 1 0, 1 1, 0 0))" .\n')
+
+
+def _read_copy_file(file_path):
+    with open(file_path) as copy_file:
+        return [line.rstrip('\n').split('\t') for line in copy_file]
+
+
+@pytest.mark.parametrize('pipelined', [False, True])
+def test_emit_copy_files(tmp_path, pipelined):
+    file_path = str(tmp_path / 'geoms.nt')
+    _write_ntriples(file_path, 100)
+    emit_dir = tmp_path / 'emit'
+
+    data_loader = PostGISDataLoader(
+        [HAS_GEOMETRY],
+        [AS_WKT],
+        [str(POINT_FEATURE_CLS)],
+        [str(LINE_FEATURE_CLS)],
+        [str(AREA_FEATURE_CLS)],
+        db_name=None,
+        emit_dir=str(emit_dir),
+        pipelined=pipelined)
+    data_loader.load_geometry_data(file_path)
+    # the geometries written before are skipped
+    data_loader.load_geometry_data(file_path)
+    data_loader.close()
+
+    with open(emit_dir / MANIFEST_FILE_NAME) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    assert manifest['sources'] == [file_path, file_path]
+    assert {entry['table']: entry['rows'] for entry in manifest['files']} == \
+        {'point': 100, 'polygon': 1}
+
+    point_rows = _read_copy_file(emit_dir / 'point.copy')
+    assert sorted(point_rows) == sorted(
+        [f'http://example.com/g{i}', f'POINT({i} 0)'] for i in range(100))
+    assert _read_copy_file(emit_dir / 'polygon.copy') == [
+        ['http://example.com/area_geom', 'POLYGON((0 0, 1 0, 1 1, 0 0))']]
+
+
+def test_escape_copy_value():
+    assert escape_copy_value('a\tb\nc\\d\re') == 'a\\tb\\nc\\\\d\\re'
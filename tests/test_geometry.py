@@ -0,0 +1,66 @@
+import pytest
+
+from dataloader.geometry import GeometryCollection, GeometryFilter, POINT, \
+    POLYGON
+
+WKTS = [
+    'POINT(1 2)',
+    'LINESTRING(0 0, 3 1, -1 4)',
+    'POLYGON((0 0, 4 0, 4 4, 0 0), (1 1, 2 1, 2 2, 1 1))',
+    'POINT(-5.5 0.25)',
+    'POLYGON((10 10, 11 10, 11 12, 10 10))',
+]
+
+
+@pytest.mark.parametrize('wkt', [
+    'MULTIPOLYGON(((0 0, 1 0, 1 1, 0 0)))',
+    'POINT Z (0.5 0.5 3)',
+    'POINT EMPTY',
+    'POLYGON EMPTY',
+    '<http://www.opengis.net/def/crs/OGC/1.3/CRS84> POINT(0.5 0.5)',
+])
+@pytest.mark.parametrize('geometry_filter', [
+    GeometryFilter(type_codes={POINT, POLYGON}),
+    GeometryFilter(bbox=(0, 0, 1, 1)),
+    GeometryFilter(bbox=(0, 0, 1, 1), type_codes={POINT}),
+])
+def test_unsupported_geometries_do_not_match(wkt, geometry_filter):
+    assert not geometry_filter.matches(wkt)
+
+
+def test_supported_geometries_match():
+    geometry_filter = GeometryFilter(bbox=(0, 0, 1, 1), type_codes={POINT})
+
+    assert geometry_filter.matches('POINT(0.5 0.5)')
+    assert not geometry_filter.matches('POINT(2 2)')
+    assert not geometry_filter.matches('POLYGON((0 0, 1 0, 1 1, 0 0))')
+
+
+def test_collection_bulk_operations_match_single_geometries():
+    collection = GeometryCollection.from_wkts(
+        WKTS, [f'http://example.com/g{i}' for i in range(len(WKTS))])
+
+    assert collection.to_wkbs() == \
+        [collection.get_wkb(idx) for idx in range(len(WKTS))]
+    assert list(collection.bboxes()) == \
+        [v for idx in range(len(WKTS)) for v in collection.bbox(idx)]
+
+    taken = collection.take([4, 1, 2])
+    assert taken.to_wkts() == \
+        [collection.get_wkt(idx) for idx in (4, 1, 2)]
+    assert taken.iris == [collection.iris[idx] for idx in (4, 1, 2)]
+
+    polygons = collection.filter_types({POLYGON})
+    assert polygons.to_wkts() == [collection.get_wkt(2), collection.get_wkt(4)]
+
+    assert GeometryCollection.from_wkbs(collection.to_wkbs()).to_wkts() == \
+        collection.to_wkts()
+
+
+def test_empty_collection_bulk_operations():
+    collection = GeometryCollection.from_wkts(WKTS)
+
+    assert len(GeometryCollection().bboxes()) == 0
+    assert GeometryCollection().to_wkbs() == []
+    assert len(collection.take([])) == 0
+    assert len(collection.filter_types(set())) == 0
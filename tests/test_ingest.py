@@ -0,0 +1,207 @@
+import logging
+import os
+
+from dataloader.datasampler import POINT_FEATURE_CLS, LINE_FEATURE_CLS, \
+    AREA_FEATURE_CLS
+from dataloader.ingest import SpoolIngestService, PROCESSING_DIR_NAME, \
+    DONE_DIR_NAME, FAILED_DIR_NAME, LOCK_FILE_NAME, _lock_dir
+
+HAS_GEOMETRY = 'http://www.opengis.net/ont/geosparql#hasGeometry'
+AS_WKT = 'http://www.opengis.net/ont/geosparql#asWKT'
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+
+LOADER_KWARGS = {
+    'geometry_resource_properties': [HAS_GEOMETRY],
+    'geometry_literal_properties': [AS_WKT],
+    'point_feature_classes': [str(POINT_FEATURE_CLS)],
+    'line_feature_classes': [str(LINE_FEATURE_CLS)],
+    'area_feature_classes': [str(AREA_FEATURE_CLS)],
+    'db_name': None,
+}
+
+
+class FakeCursor(object):
+    rowcount = 1
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        if sql.lstrip().startswith('INSERT INTO point'):
+            self.conn.rows.append(params)
+
+    def fetchone(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.rows = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool(object):
+    def __init__(self, down=False):
+        self.down = down
+        self.conn = FakeConnection()
+        self.closed = False
+
+    def getconn(self):
+        if self.down:
+            raise ConnectionError('database is down')
+        return self.conn
+
+    def putconn(self, conn, close=False):
+        pass
+
+    def closeall(self):
+        self.closed = True
+
+
+class FakePoolService(SpoolIngestService):
+    def __init__(self, spool_dir, pool):
+        super().__init__(spool_dir, {}, LOADER_KWARGS, poll_interval=.01)
+        self.pool = pool
+
+    def _create_pool(self):
+        return self.pool
+
+
+def _write_ntriples(file_path, num_geoms):
+    with open(file_path, 'w') as nt_file:
+        for i in range(num_geoms):
+            nt_file.write(
+                f'<http://example.com/f{i}> <{HAS_GEOMETRY}> '
+                f'<http://example.com/g{i}> .\n'
+                f'<http://example.com/g{i}> <{AS_WKT}> "POINT({i} 0)" .\n'
+                f'<http://example.com/f{i}> <{RDF_TYPE}> '
+                f'<{POINT_FEATURE_CLS}> .\n')
+
+
+def _list_files(dir_path):
+    return sorted(os.listdir(dir_path))
+
+
+def test_claims_files_under_unique_names(tmp_path):
+    service = FakePoolService(str(tmp_path), FakePool())
+    service._lock_processing_dirs()
+
+    claimed = []
+    for _ in range(2):
+        _write_ntriples(str(tmp_path / 'a.nt'), 1)
+        claimed += service._claim_new_files(5)
+    for file_name in ['b.nt.tmp', '.c.nt']:
+        _write_ntriples(str(tmp_path / file_name), 1)
+    claimed += service._claim_new_files(5)
+
+    assert len(claimed) == 2
+    assert all(p.endswith('-a.nt') for p in claimed)
+    assert _list_files(service.processing_dir) == \
+        sorted([LOCK_FILE_NAME] + [os.path.basename(p) for p in claimed])
+    assert _list_files(tmp_path) == \
+        sorted(['.c.nt', 'b.nt.tmp', DONE_DIR_NAME, FAILED_DIR_NAME,
+                PROCESSING_DIR_NAME])
+
+    service._release_processing_dirs()
+
+
+def test_file_claimed_by_another_service_is_skipped(tmp_path, monkeypatch):
+    service = FakePoolService(str(tmp_path), FakePool())
+    service._lock_processing_dirs()
+    _write_ntriples(str(tmp_path / 'a.nt'), 1)
+    _write_ntriples(str(tmp_path / 'b.nt'), 1)
+
+    getmtime = os.path.getmtime
+
+    def getmtime_after_claim(file_path):
+        if file_path.endswith('a.nt'):
+            raise FileNotFoundError(file_path)
+        return getmtime(file_path)
+
+    monkeypatch.setattr(os.path, 'getmtime', getmtime_after_claim)
+
+    claimed = service._claim_new_files(5)
+
+    assert [p.endswith('-b.nt') for p in claimed] == [True]
+    service._release_processing_dirs()
+
+
+def test_run_loads_files(tmp_path):
+    pool = FakePool()
+    service = FakePoolService(str(tmp_path), pool)
+    _write_ntriples(str(tmp_path / 'a.nt'), 3)
+    _write_ntriples(str(tmp_path / 'b.nt'), 2)
+
+    service.run(once=True)
+
+    stats = service.get_stats()
+    assert stats['files_done'] == 2
+    assert stats['rows'] == 5
+    assert stats['files_in_progress'] == []
+    assert len(pool.conn.rows) == 5
+    assert pool.closed
+    assert len(os.listdir(service.done_dir)) == 2
+    # the own processing directory is removed
+    assert os.listdir(service.processing_root) == []
+
+
+def test_file_is_failed_if_database_is_down(tmp_path):
+    service = FakePoolService(str(tmp_path), FakePool(down=True))
+    _write_ntriples(str(tmp_path / 'a.nt'), 1)
+
+    service.run(once=True)
+
+    stats = service.get_stats()
+    assert stats['files_failed'] == 1
+    assert stats['files_in_progress'] == []
+    assert 'database is down' in stats['last_error']
+    assert [f.endswith('-a.nt') for f in os.listdir(service.failed_dir)] == \
+        [True]
+
+
+def test_errors_of_workers_are_logged(tmp_path, caplog):
+    service = FakePoolService(str(tmp_path), FakePool())
+    _write_ntriples(str(tmp_path / 'a.nt'), 1)
+
+    def fail(file_path, resume):
+        raise OSError('disk full')
+
+    service._load_claimed_file = fail
+    service.run(once=True)
+
+    assert service.get_stats()['files_in_progress'] == []
+    assert any(record.levelno == logging.ERROR and
+               'disk full' in str(record.exc_info[1])
+               for record in caplog.records if record.exc_info)
+
+
+def test_only_orphaned_files_are_resumed(tmp_path):
+    processing_root = tmp_path / PROCESSING_DIR_NAME
+    for service_id in ['crashed', 'running']:
+        os.makedirs(processing_root / service_id)
+        (processing_root / service_id / LOCK_FILE_NAME).touch()
+        _write_ntriples(str(processing_root / service_id / '1-x-a.nt'), 2)
+    running_lock_fd = _lock_dir(str(processing_root / 'running'))
+
+    pool = FakePool()
+    service = FakePoolService(str(tmp_path), pool)
+    service.run(once=True)
+
+    assert len(pool.conn.rows) == 2
+    assert os.listdir(service.done_dir) == ['1-x-a.nt']
+    assert _list_files(processing_root) == ['running']
+    assert _list_files(processing_root / 'running') == \
+        sorted([LOCK_FILE_NAME, '1-x-a.nt'])
+
+    os.close(running_lock_fd)
@@ -0,0 +1,73 @@
+import gzip
+
+import pytest
+
+from dataloader.inputs import get_line_aligned_byte_ranges, guess_format, \
+    open_input, read_byte_range, split_suffixes
+
+LINES = [f'<http://example.com/s{i}> <http://example.com/p> "{"x" * i}" .\n'
+         for i in range(100)]
+
+
+def _write_lines(file_path, lines):
+    with open(file_path, 'w') as out_file:
+        out_file.writelines(lines)
+
+    return str(file_path)
+
+
+@pytest.mark.parametrize('lines', [
+    LINES,
+    # no line break at the end of the file
+    LINES[:-1] + [LINES[-1].rstrip('\n')],
+    # fewer lines than ranges
+    LINES[:3],
+    [],
+])
+@pytest.mark.parametrize('num_ranges', [1, 2, 7, 16])
+def test_byte_ranges_cover_whole_lines(tmp_path, lines, num_ranges):
+    file_path = _write_lines(tmp_path / 'data.nt', lines)
+
+    ranges = get_line_aligned_byte_ranges(file_path, num_ranges)
+
+    assert len(ranges) <= num_ranges
+    # contiguous and non-empty
+    assert all(start < end for start, end in ranges)
+    assert all(
+        end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+
+    chunks = [read_byte_range(file_path, start, end).read()
+              for start, end in ranges]
+    assert b''.join(chunks) == ''.join(lines).encode('utf-8')
+    # each range ends at a line break, except for the last line of the file
+    assert all(chunk.endswith(b'\n') for chunk in chunks[:-1])
+
+
+def test_byte_ranges_are_balanced(tmp_path):
+    file_path = _write_lines(tmp_path / 'data.nt', LINES[50:] * 10)
+
+    sizes = [end - start
+             for start, end in get_line_aligned_byte_ranges(file_path, 4)]
+
+    assert len(sizes) == 4
+    # off by at most one line
+    assert max(sizes) - min(sizes) <= 2 * len(LINES[-1])
+
+
+@pytest.mark.parametrize('file_name, suffixes, rdf_format', [
+    ('foo.nt', ('nt', None), 'ntriples'),
+    ('foo.NT.GZ', ('nt', 'gz'), 'ntriples'),
+    ('foo.ttl.zst', ('ttl', 'zst'), 'turtle'),
+    ('foo.gz', (None, 'gz'), None),
+])
+def test_split_suffixes(file_name, suffixes, rdf_format):
+    assert split_suffixes(file_name) == suffixes
+    assert guess_format(file_name) == rdf_format
+
+
+def test_open_compressed_input(tmp_path):
+    file_path = tmp_path / 'data.nt.gz'
+    file_path.write_bytes(gzip.compress(''.join(LINES).encode('utf-8')))
+
+    with open_input(str(file_path)) as input_file:
+        assert input_file.read() == ''.join(LINES).encode('utf-8')
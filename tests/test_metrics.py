@@ -0,0 +1,43 @@
+import json
+import logging
+import time
+
+from dataloader.metrics import LoadMetrics
+
+
+def _get_logged_snapshots(caplog):
+    prefix = 'load metrics '
+    return [json.loads(record.getMessage()[len(prefix):])
+            for record in caplog.records
+            if record.getMessage().startswith(prefix)]
+
+
+def test_periodic_logging_during_a_stage(caplog):
+    caplog.set_level(logging.INFO)
+    metrics = LoadMetrics(log_interval=.05)
+
+    # no row events while the stage runs, as in a long parse or sort
+    with metrics.periodic_logging():
+        with metrics.timer('parse'):
+            time.sleep(.3)
+
+    snapshots = _get_logged_snapshots(caplog)
+    assert len(snapshots) >= 2
+    parse_seconds = [s['seconds']['parse'] for s in snapshots]
+    assert parse_seconds == sorted(parse_seconds)
+    assert parse_seconds[0] > 0
+    assert metrics.seconds['parse'] >= .3
+
+
+def test_no_logging_after_periodic_logging(caplog):
+    caplog.set_level(logging.INFO)
+    metrics = LoadMetrics(log_interval=.05)
+
+    with metrics.periodic_logging():
+        pass
+
+    time.sleep(.15)
+    metrics.add_row('point_feature')
+
+    assert _get_logged_snapshots(caplog) == []
+    assert metrics.snapshot()['rows'] == {'point_feature': 1}
@@ -0,0 +1,109 @@
+import time
+
+from dataloader import PostGISDataLoader
+from dataloader.datasampler import POINT_FEATURE_CLS, LINE_FEATURE_CLS, \
+    AREA_FEATURE_CLS
+from dataloader.metrics import LoadMetrics
+from dataloader.sinks import NullSink, ThreadedSink
+
+HAS_GEOMETRY = 'http://www.opengis.net/ont/geosparql#hasGeometry'
+AS_WKT = 'http://www.opengis.net/ont/geosparql#asWKT'
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+
+
+class RecordingSink(NullSink):
+    def __init__(self):
+        self.write_times = []
+        self.rows = []
+
+    def write(self, table, iri, wkt):
+        self.write_times.append(time.perf_counter())
+        self.rows.append((table, iri, wkt))
+
+
+class ParseTimingMetrics(LoadMetrics):
+    def __init__(self):
+        super().__init__()
+        self.parse_end_times = []
+
+    def timer(self, stage):
+        timer = super().timer(stage)
+
+        if stage != 'parse':
+            return timer
+
+        metrics = self
+
+        class _Timer(object):
+            def __enter__(self):
+                return timer.__enter__()
+
+            def __exit__(self, *exc_info):
+                metrics.parse_end_times.append(time.perf_counter())
+                return timer.__exit__(*exc_info)
+
+        return _Timer()
+
+
+def _write_ntriples(file_path, num_geoms):
+    with open(file_path, 'w') as nt_file:
+        for i in range(num_geoms):
+            # the class triples come last, as the links to geometries in
+            # other chunks must be joined nevertheless
+            nt_file.write(
+                f'<http://example.com/f{i}> <{HAS_GEOMETRY}> '
+                f'<http://example.com/g{i}> .\n'
+                f'<http://example.com/g{i}> <{AS_WKT}> '
+                f'"POINT({i % 100} {i // 100})" .\n')
+        for i in range(num_geoms):
+            nt_file.write(
+                f'<http://example.com/f{i}> <{RDF_TYPE}> '
+                f'<{POINT_FEATURE_CLS}> .\n')
+
+
+def _get_loader(metrics, sink, pipelined):
+    return PostGISDataLoader(
+        [HAS_GEOMETRY],
+        [AS_WKT],
+        [str(POINT_FEATURE_CLS)],
+        [str(LINE_FEATURE_CLS)],
+        [str(AREA_FEATURE_CLS)],
+        db_name=None,
+        metrics=metrics,
+        pipelined=pipelined,
+        stream_chunk_lines=500,
+        sink=sink)
+
+
+def test_writes_start_before_parsing_finished(tmp_path):
+    file_path = str(tmp_path / 'geoms.nt')
+    _write_ntriples(file_path, 5000)
+
+    metrics = ParseTimingMetrics()
+    recording_sink = RecordingSink()
+    data_loader = _get_loader(
+        metrics, ThreadedSink(recording_sink, batch_size=10), True)
+    data_loader.load_geometry_data(file_path)
+    data_loader.close()
+
+    assert len(recording_sink.rows) == 5000
+    assert len(metrics.parse_end_times) > 1
+    assert recording_sink.write_times[0] < metrics.parse_end_times[-1]
+
+
+def test_streamed_rows_match_whole_file_extraction(tmp_path):
+    file_path = str(tmp_path / 'geoms.nt')
+    _write_ntriples(file_path, 1000)
+
+    streamed_sink = RecordingSink()
+    data_loader = _get_loader(
+        LoadMetrics(), ThreadedSink(streamed_sink), True)
+    data_loader.load_geometry_data(file_path)
+    data_loader.close()
+
+    parsed_sink = RecordingSink()
+    data_loader = _get_loader(LoadMetrics(), parsed_sink, False)
+    data_loader.load_geometry_data(file_path)
+    data_loader.close()
+
+    assert sorted(streamed_sink.rows) == sorted(parsed_sink.rows)
@@ -0,0 +1,38 @@
+import pytest
+
+from dataloader.relations import get_relation, get_relation_chunk_query
+
+
+@pytest.mark.parametrize('matrix, left_table, right_table, relation', [
+    # point on the boundary of a polygon
+    ('F0FFFF212', 'point', 'polygon', 'touches'),
+    # point inside / outside a polygon
+    ('0FFFFF212', 'point', 'polygon', 'within'),
+    ('FF0FFF212', 'point', 'polygon', None),
+    # equal points
+    ('0FFFFFFF2', 'point', 'point', 'eq'),
+    # line running along the boundary of a polygon
+    ('F1FF0F212', 'line_string', 'polygon', 'touches'),
+    # line ending on the boundary of a polygon from the outside
+    ('FF1F00212', 'line_string', 'polygon', 'touches'),
+    # line inside a polygon, touching its boundary
+    ('1FF00F212', 'line_string', 'polygon', 'within'),
+    # line crossing a polygon
+    ('1010F0212', 'line_string', 'polygon', 'intersects'),
+    # polygons sharing an edge / a tangential proper part / disjoint
+    ('FF2F11212', 'polygon', 'polygon', 'ec'),
+    ('2FF11F212', 'polygon', 'polygon', 'tpp'),
+    ('FF2FF1212', 'polygon', 'polygon', None),
+])
+def test_get_relation(matrix, left_table, right_table, relation):
+    assert get_relation(matrix, left_table, right_table) == relation
+
+
+def test_chunk_query_uses_patterns_of_the_table_pair():
+    polygon_query = get_relation_chunk_query('polygon', 'polygon', 4, 0)
+    point_query = get_relation_chunk_query('point', 'polygon', 4, 0)
+
+    assert "THEN 'ec'" in polygon_query
+    assert "THEN 'touches'" not in polygon_query
+    assert "ST_RelateMatch(matrix, 'FT*******') OR " in point_query
+    assert "THEN 'ec'" not in point_query
@@ -0,0 +1,26 @@
+import pytest
+
+from benchmark.results import ResultStore
+
+
+def _write_result_file(file_path):
+    with open(file_path, 'w') as result_file:
+        result_file.write('osm_1000_intersects,query,2.0,1.0,1.2,1.1\n')
+
+
+def test_duplicate_run_is_refused(tmp_path):
+    result_file_path = str(tmp_path / 'results.csv')
+    _write_result_file(result_file_path)
+    store = ResultStore(str(tmp_path / 'results.db'))
+
+    assert store.ingest([result_file_path], 'baseline', 'abc') == 'baseline'
+    with pytest.raises(ValueError, match='already ingested'):
+        store.ingest([result_file_path], 'baseline', 'abc')
+
+    assert len(store.get_runs()) == 1
+    (dataset, size, relation, num_runs, median, _, _), = \
+        store.get_stats('baseline')
+    assert (dataset, size, relation, num_runs, median) == \
+        ('osm', 1000, 'intersects', 3, 1.1)
+
+    store.close()
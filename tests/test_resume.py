@@ -0,0 +1,127 @@
+import pytest
+
+from dataloader import PostGISDataLoader
+from dataloader.datasampler import POINT_FEATURE_CLS, LINE_FEATURE_CLS, \
+    AREA_FEATURE_CLS
+from dataloader.sinks import NullSink
+
+HAS_GEOMETRY = 'http://www.opengis.net/ont/geosparql#hasGeometry'
+AS_WKT = 'http://www.opengis.net/ont/geosparql#asWKT'
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+
+
+class CheckpointingSink(NullSink):
+    """
+    Keeps the rows and checkpoints committed, and fails after `fail_after`
+    writes like a crashed load
+    """
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.rows = []
+        self.checkpoints = {}
+        self._rows = []
+        self._checkpoints = {}
+
+    def get_checkpoint(self, source):
+        return self.checkpoints.get(source)
+
+    def checkpoint(
+            self, source, source_size, row_offset, rows_written, finished,
+            row_order):
+        self._checkpoints[source] = \
+            (source_size, row_offset, rows_written, finished, row_order)
+
+    def write(self, table, iri, wkt):
+        if self.fail_after is not None and \
+                len(self.rows) + len(self._rows) >= self.fail_after:
+            # the uncommitted rows and checkpoints are rolled back
+            self._rows = []
+            self._checkpoints = {}
+            raise RuntimeError('crash')
+        self._rows.append((table, iri, wkt))
+
+    def commit(self):
+        self.rows += self._rows
+        self._rows = []
+        self.checkpoints.update(self._checkpoints)
+
+
+def _write_ntriples(file_path, num_geoms):
+    with open(file_path, 'w') as nt_file:
+        for i in range(num_geoms):
+            nt_file.write(
+                f'<http://example.com/f{i}> <{HAS_GEOMETRY}> '
+                f'<http://example.com/g{i}> .\n'
+                f'<http://example.com/g{i}> <{AS_WKT}> '
+                f'"POINT({i % 100} {i // 100})" .\n'
+                f'<http://example.com/f{i}> <{RDF_TYPE}> '
+                f'<{POINT_FEATURE_CLS}> .\n')
+
+
+def _load(file_path, sink, pipelined, stream_chunk_lines=30):
+    data_loader = PostGISDataLoader(
+        [HAS_GEOMETRY],
+        [AS_WKT],
+        [str(POINT_FEATURE_CLS)],
+        [str(LINE_FEATURE_CLS)],
+        [str(AREA_FEATURE_CLS)],
+        db_name=None,
+        pipelined=pipelined,
+        stream_chunk_lines=stream_chunk_lines,
+        commit_interval=50,
+        resume=True,
+        sink=sink)
+    try:
+        data_loader.load_geometry_data(file_path)
+    finally:
+        data_loader.close()
+
+
+@pytest.mark.parametrize('pipelined, chunk_lines', [(True, 30), (False, 30)])
+def test_resume_in_same_mode_loads_each_row_once(
+        tmp_path, pipelined, chunk_lines):
+    file_path = str(tmp_path / 'geoms.nt')
+    _write_ntriples(file_path, 500)
+
+    sink = CheckpointingSink(fail_after=220)
+    with pytest.raises(RuntimeError, match='crash'):
+        _load(file_path, sink, pipelined, chunk_lines)
+    assert len(sink.rows) == 200
+
+    sink.fail_after = None
+    _load(file_path, sink, pipelined, chunk_lines)
+
+    assert len(sink.rows) == 500
+    assert len(set(sink.rows)) == 500
+
+
+@pytest.mark.parametrize('crash_mode, resume_mode', [
+    ((True, 30), (False, 30)),
+    ((False, 30), (True, 30)),
+    ((True, 30), (True, 60)),
+])
+def test_resume_in_other_row_order_is_refused(
+        tmp_path, crash_mode, resume_mode):
+    file_path = str(tmp_path / 'geoms.nt')
+    _write_ntriples(file_path, 500)
+
+    sink = CheckpointingSink(fail_after=220)
+    with pytest.raises(RuntimeError, match='crash'):
+        _load(file_path, sink, *crash_mode)
+
+    sink.fail_after = None
+    with pytest.raises(RuntimeError, match='row order'):
+        _load(file_path, sink, *resume_mode)
+
+    assert len(sink.rows) == 200
+
+
+def test_finished_file_is_skipped_in_other_row_order(tmp_path):
+    file_path = str(tmp_path / 'geoms.nt')
+    _write_ntriples(file_path, 100)
+
+    sink = CheckpointingSink()
+    _load(file_path, sink, True)
+    _load(file_path, sink, False)
+
+    assert len(sink.rows) == 100
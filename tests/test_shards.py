@@ -0,0 +1,73 @@
+import os
+
+import pytest
+from rdflib import Graph, Literal, URIRef
+
+from userdataconverter.shards import ONTOLOGY_FILE_NAME, \
+    ShardedNTriplesWriter, merge_shard_indexes, read_move
+
+PREDICATE = URIRef('http://example.com/label')
+
+
+class FakeMove(object):
+    def __init__(self, move_no):
+        self.move_no = move_no
+
+    def get_iri(self):
+        return URIRef(f'http://example.com/move{self.move_no}')
+
+
+def _get_graph(move):
+    g = Graph()
+    g.add((move.get_iri(), PREDICATE, Literal(f'move {move.move_no}')))
+
+    return g
+
+
+@pytest.mark.parametrize('compression', [None, 'gz', 'bz2', 'xz'])
+def test_moves_are_read_back_via_the_merged_index(tmp_path, compression):
+    output_dir = str(tmp_path)
+    moves = [FakeMove(move_no) for move_no in range(20)]
+    writers = [
+        ShardedNTriplesWriter(
+            output_dir,
+            Graph(),
+            shard_prefix=f'moves-{writer_no:05d}',
+            # a new shard every few moves
+            max_shard_size=200,
+            compression=compression)
+        for writer_no in range(2)]
+
+    for move in moves:
+        writers[move.move_no % 2].write(move, _get_graph(move))
+    for writer in writers:
+        writer.close()
+
+    index_file_paths = [writer.index_file_path for writer in writers]
+    merged_file_path = merge_shard_indexes(
+        index_file_paths + [str(tmp_path / 'missing.index.tsv')], output_dir)
+
+    assert not any(map(os.path.exists, index_file_paths))
+    assert os.path.exists(tmp_path / ONTOLOGY_FILE_NAME)
+
+    with open(merged_file_path) as merged_file:
+        index = [line.rstrip('\n').split('\t') for line in merged_file]
+
+    assert sorted(iri for iri, _, _, _ in index) == \
+        sorted(str(move.get_iri()) for move in moves)
+    assert len({shard_file_name for _, shard_file_name, _, _ in index}) > 2
+
+    for iri, shard_file_name, offset, length in index:
+        g = Graph()
+        g.parse(
+            data=read_move(output_dir, shard_file_name, int(offset),
+                           int(length)),
+            format='nt')
+
+        move_no = int(iri[len('http://example.com/move'):])
+        assert set(g) == set(_get_graph(FakeMove(move_no)))
+
+
+def test_unsupported_compression(tmp_path):
+    with pytest.raises(ValueError):
+        ShardedNTriplesWriter(str(tmp_path), Graph(), compression='zip')
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from userdataconverter import simplify
+from userdataconverter.simplify import douglas_peucker, get_simplifier, \
+    visvalingam
+
+# about 11 m per 0.0001 degrees
+LINE = [(48., 11. + i * 0.0001) for i in range(200)]
+
+
+def _random_walk(num_points):
+    random.seed(42)
+    lat, lon = 48., 11.
+    points = []
+    for _ in range(num_points):
+        lat += random.gauss(0, 1e-4)
+        lon += random.gauss(0, 1e-4)
+        points.append((lat, lon))
+
+    return points
+
+
+@pytest.mark.parametrize('simplifier', [douglas_peucker, visvalingam])
+def test_straight_line_is_reduced_to_its_end_points(simplifier):
+    assert simplifier(LINE, 1) == [LINE[0], LINE[-1]]
+
+
+@pytest.mark.parametrize('simplifier', [douglas_peucker, visvalingam])
+def test_spike_is_kept(simplifier):
+    # a spike of about 110 m
+    points = LINE[:100] + [(48.001, LINE[100][1])] + LINE[101:]
+
+    assert simplifier(points, 10) == \
+        [LINE[0], LINE[99], points[100], LINE[101], LINE[-1]]
+
+
+@pytest.mark.parametrize('simplifier', [douglas_peucker, visvalingam])
+def test_short_moves_are_kept(simplifier):
+    assert simplifier(LINE[:2], 1000) == LINE[:2]
+
+
+def test_vectorised_and_plain_douglas_peucker_agree(monkeypatch):
+    points = _random_walk(2000)
+    vectorised = douglas_peucker(points, 5)
+
+    monkeypatch.setattr(simplify, 'MIN_VECTORISED_POINTS', len(points))
+
+    assert douglas_peucker(points, 5) == vectorised
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        get_simplifier('bezier', 10)
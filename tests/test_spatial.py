@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from dataloader.spatial import SpatialEngine, relate_wkts
+
+SQUARE = 'POLYGON((0 0, 2 0, 2 2, 0 2, 0 0))'
+
+
+@pytest.mark.parametrize('wkt_a, wkt_b, predicate, expected', [
+    ('POINT(1 1)', SQUARE, 'within', True),
+    ('POINT(1 1)', SQUARE, 'intersects', True),
+    ('POINT(0 1)', SQUARE, 'within', False),
+    ('POINT(0 1)', SQUARE, 'touches', True),
+    ('POINT(3 3)', SQUARE, 'disjoint', True),
+    (SQUARE, 'POINT(1 1)', 'contains', True),
+    ('LINESTRING(-1 1, 3 1)', SQUARE, 'intersects', True),
+    ('LINESTRING(-1 1, 3 1)', SQUARE, 'within', False),
+    ('LINESTRING(0 0, 2 0)', SQUARE, 'touches', True),
+    ('LINESTRING(0.5 1, 1.5 1)', SQUARE, 'within', True),
+    ('POLYGON((2 0, 4 0, 4 2, 2 2, 2 0))', SQUARE, 'ec', True),
+    ('POLYGON((2 0, 4 0, 4 2, 2 2, 2 0))', SQUARE, 'intersects', True),
+    ('POLYGON((1 0, 3 0, 3 2, 1 2, 1 0))', SQUARE, 'ec', False),
+    ('POLYGON((0 0, 1 0, 1 1, 0 1, 0 0))', SQUARE, 'tpp', True),
+    ('POLYGON((0.5 0.5, 1 0.5, 1 1, 0.5 1, 0.5 0.5))', SQUARE, 'tpp', False),
+    ('POLYGON((0.5 0.5, 1 0.5, 1 1, 0.5 1, 0.5 0.5))', SQUARE, 'within',
+     True),
+    (SQUARE, SQUARE, 'within', True),
+    (SQUARE, SQUARE, 'tpp', False),
+])
+def test_predicates(wkt_a, wkt_b, predicate, expected):
+    assert relate_wkts(wkt_a, wkt_b, predicate) == expected
+
+
+def test_unknown_predicate():
+    with pytest.raises(ValueError):
+        relate_wkts('POINT(0 0)', 'POINT(0 0)', 'overlaps')
+
+
+def _brute_force_candidates(engine, idx):
+    bbox = engine._bboxes[idx]
+
+    return [other_idx for other_idx, other_bbox in enumerate(engine._bboxes)
+            if other_idx != idx and
+            engine._bboxes_intersect(bbox, other_bbox)]
+
+
+def test_index_with_mixed_geometry_sizes():
+    random.seed(0)
+    wkts = [f'POINT({random.random()} {random.random()})' for _ in range(500)]
+    wkts += [
+        # much larger than the others
+        'POLYGON((0 0, 1 0, 1 1, 0 1, 0 0))',
+        'LINESTRING(-1 0.5, 2 0.5)',
+        'POLYGON((0.2 0.2, 0.21 0.2, 0.21 0.21, 0.2 0.21, 0.2 0.2))',
+    ]
+
+    engine = SpatialEngine.from_wkts(wkts)
+
+    assert engine._large == [500, 501]
+    assert sum(len(idxs) for idxs in engine._grid.values()) < 2 * len(wkts)
+    for idx in [0, 1, 500, 501, 502]:
+        assert engine.candidates(idx) == _brute_force_candidates(engine, idx)
+
+    within_square = {a for a, b in engine.pairs('within') if b == 500}
+    assert within_square == set(range(500)) | {502}
+
+
+def test_pairs_refuses_disjoint():
+    engine = SpatialEngine.from_wkts(['POINT(0 0)', 'POINT(1 1)'])
+
+    with pytest.raises(ValueError):
+        list(engine.pairs('disjoint'))
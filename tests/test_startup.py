@@ -0,0 +1,28 @@
+import os
+
+from benchmark.startup import measure_startup, check_startup_budget, \
+    DEFAULT_COMMANDS, DEFAULT_STARTUP_BUDGET
+
+CLI_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'bin',
+    'spatialdata')
+
+
+def test_startup_within_budget(tmp_path, monkeypatch):
+    # the entry point finds the packages without PYTHONPATH from any
+    # directory
+    monkeypatch.delenv('PYTHONPATH', raising=False)
+    monkeypatch.chdir(tmp_path)
+
+    results = measure_startup(CLI_PATH, repeats=3)
+
+    assert [command for command, _ in results] == \
+        [' '.join(command) for command in DEFAULT_COMMANDS]
+    assert check_startup_budget(results, DEFAULT_STARTUP_BUDGET) == []
+
+
+def test_check_startup_budget():
+    results = [('', .1), ('load', .6), ('sample', .4)]
+
+    assert check_startup_budget(results, .5) == [('load', .6)]
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from userdataconverter import Move, convert_user_data_files
+from userdataconverter.shards import SHARD_INDEX_FILE_NAME
+
+START = datetime(2020, 1, 1, 12)
+
+
+def test_points_at_the_same_time_have_no_speed():
+    move = Move('user', 'walk')
+
+    move.add_point((51.05, 13.74), START)
+    move.add_point((51.06, 13.74), START)
+    move.add_point((51.07, 13.74), START + timedelta(hours=1))
+
+    assert len(move.points) == 3
+    # about 1.1 km within one hour
+    assert len(move.speeds) == 1
+    assert 1.0 < move.speeds[0] < 1.2
+    assert move.to_timestamp == START + timedelta(hours=1)
+
+
+def _write_gps_file(file_path, user_id, num_moves, points_per_move):
+    with open(file_path, 'w') as gps_file:
+        for move_no in range(num_moves):
+            for point_no in range(points_per_move):
+                timestamp = START + timedelta(
+                    hours=move_no, seconds=10 * point_no)
+                gps_file.write(
+                    f'"{user_id}","{timestamp.isoformat()}",'
+                    f'"{13.74 + point_no * 0.0001}","{51.05}",'
+                    f'"label{move_no}"\n')
+
+    return str(file_path)
+
+
+def test_convert_files_in_worker_processes(tmp_path):
+    input_file_paths = [
+        _write_gps_file(tmp_path / f'user{i}.csv', f'user{i}', 3, 5)
+        for i in range(4)]
+    broken_file_path = tmp_path / 'broken.csv'
+    broken_file_path.write_text('not a GPS point\n')
+    output_dir = tmp_path / 'out'
+
+    stats = convert_user_data_files(
+        input_file_paths + [str(broken_file_path)],
+        str(output_dir),
+        workers=2,
+        output_format='ntshards')
+
+    assert stats.num_moves == 12
+    assert stats.num_points == 60
+    assert stats.num_failed_files == 1
+
+    with open(output_dir / SHARD_INDEX_FILE_NAME) as index_file:
+        move_iris = [line.split('\t')[0] for line in index_file]
+    assert len(move_iris) == len(set(move_iris)) == 12
+    assert not list(output_dir.glob('*.index.tsv'))
@@ -1,10 +1,19 @@
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import partial
+from glob import glob
 from math import radians, cos, sin, asin, sqrt
 from statistics import stdev, mean
 
 from rdflib import Graph, URIRef, OWL, RDF, RDFS, XSD, Literal
 
+from userdataconverter.shards import ShardedNTriplesWriter, \
+    merge_shard_indexes, DEFAULT_MAX_SHARD_SIZE
+from userdataconverter.pgload import PostGISMoveWriter
+from userdataconverter.simplify import get_simplifier
+
 EARTH_RADIUS = 6367.4445  # approximately...
 DEFAULT_ONT_PREFIX = 'http://dl-learner.org/ont/spatial'
 MOVE_CLS = URIRef('http://dl-learner.org/ont/spatial#Move')
@@ -15,6 +24,9 @@ GEOM_DATATYPE_PROPERTY = URIRef('http://www.opengis.net/ont/geosparql#asWKT')
 
 DEFAULT_RES_PREFIX = 'http://dl-learner.org/res/spatial'
 
+# size hint (in bytes) of the chunks of lines read at once
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
 
 # https://en.wikipedia.org/wiki/Haversine_formula:
 # 'the "Earth radius" R varies from 6356.752 km at the poles to 6378.137 km at
@@ -48,57 +60,104 @@ def init_ontology():
     return g
 
 
-def convert_user_data(input_file_path):
-    with open(input_file_path) as input_file:
-        all_points = []
-        prev_point = None
-        prev_timestamp = None
-        speeds = []
+def _parse_line(line):
+    # get CSV fields with stripped off double quotes
+    user_id, timestamp_str, lon_str, lat_str, label = \
+        map(lambda s: s[1:-1], line.strip().split(','))
 
-        g = Graph()
-        g += init_ontology()
+    point = (float(lat_str), float(lon_str))
+    timestamp = datetime.fromisoformat(timestamp_str)
 
-        for line in input_file:
-            # get CSV fields with stripped off double quotes
-            user_id, timestamp_str, lon_str, lat_str, label = \
-                map(lambda s: s[1:-1], line.strip().split(','))
+    return user_id, timestamp, point, label
 
-            curr_point = (float(lat_str), float(lon_str))
-            curr_timestamp = datetime.fromisoformat(timestamp_str)
 
-            if prev_point is not None:
-                dist_in_km = distance(prev_point, curr_point)
-                time_delta_in_secs = \
-                    (curr_timestamp - prev_timestamp).total_seconds()
+class Move(object):
+    """
+    The GPS points of one user and label recorded without an interruption
+    exceeding the configured time or distance gap.
+    """
+    def __init__(self, user_id, label):
+        self.user_id = user_id
+        self.label = label
+        self.points = []
+        self.speeds = []
+        # from... and to... just needed for file naming
+        self.from_timestamp = None
+        self.to_timestamp = None
+
+    def add_point(self, point, timestamp):
+        """
+        Appends a GPS point. The speed since the previous point is undefined
+        for points recorded at the same time, so it is left out of the speed
+        statistics, whereas the point still becomes part of the geometry.
+        """
+        if self.points:
+            dist_in_km = distance(self.points[-1], point)
+            time_delta_in_secs = \
+                (timestamp - self.to_timestamp).total_seconds()
+            if time_delta_in_secs > 0:
                 speed = dist_in_km / (time_delta_in_secs / 60. / 60.)
-                speeds.append(speed)
-            else:
-                from_timestamp = curr_timestamp
-            # from... and to... just needed for file naming
-            to_timestamp = curr_timestamp
+                self.speeds.append(speed)
+        else:
+            self.from_timestamp = timestamp
+
+        self.to_timestamp = timestamp
+        self.points.append(point)
+
+    def is_continued_by(
+            self,
+            user_id,
+            timestamp,
+            point,
+            label,
+            max_time_gap=None,
+            max_distance_gap=None):
+
+        if user_id != self.user_id or label != self.label:
+            return False
+
+        if max_time_gap is not None and \
+                (timestamp - self.to_timestamp).total_seconds() > max_time_gap:
+            return False
+
+        if max_distance_gap is not None and \
+                distance(self.points[-1], point) > max_distance_gap:
+            return False
 
-            all_points.append(curr_point)
+        return True
 
-            prev_point = curr_point
-            prev_timestamp = curr_timestamp
+    def get_id(self):
+        return f'move_{self.user_id}_' \
+            f'{self.from_timestamp.isoformat().replace(":", "-")}_-_' \
+            f'{self.to_timestamp.isoformat().replace(":", "-")}'
 
-        if len(all_points) < 2:
-            return g
+    def get_iri(self):
+        return URIRef(DEFAULT_RES_PREFIX + self.get_id())
+
+    def get_geom_iri(self):
+        return URIRef(DEFAULT_RES_PREFIX + self.get_id() + '_geom')
+
+    def to_rdf(self, points=None):
+        """
+        Returns the move's triples. The geometry is built from `points` if
+        given (e.g. a simplified version of the move's points) whereas the
+        speed statistics are always computed at full resolution.
+        """
+        if points is None:
+            points = self.points
+
+        g = Graph()
 
         wkt_line_string = \
             'LINESTRING(' + \
-            ', '.join([f'{lon} {lat}' for lon, lat in all_points]) + ')'
-
-        move_id = f'move_{user_id}_' \
-            f'{from_timestamp.isoformat().replace(":", "-")}_-_' \
-            f'{to_timestamp.isoformat().replace(":", "-")}'
+            ', '.join([f'{lon} {lat}' for lon, lat in points]) + ')'
 
-        move_feature_iri = URIRef(DEFAULT_RES_PREFIX + move_id)
+        move_feature_iri = self.get_iri()
         g.add((move_feature_iri, RDF.type, MOVE_CLS))
 
-        if len(speeds) >= 2:
-            avg_speed = mean(speeds)
-            speed_stdev = stdev(speeds)
+        if len(self.speeds) >= 2:
+            avg_speed = mean(self.speeds)
+            speed_stdev = stdev(self.speeds)
 
             g.add((move_feature_iri, HAS_SPEED_AVG, Literal(avg_speed, None, XSD.double)))
             g.add((move_feature_iri, HAS_SPEED_STDEV, Literal(speed_stdev, None, XSD.double)))
@@ -106,7 +165,7 @@ def convert_user_data(input_file_path):
             logging.warning(
                 f'Too few GPS points for {move_feature_iri} to compute stats')
 
-        move_geom_iri = URIRef(DEFAULT_RES_PREFIX + move_id + '_geom')
+        move_geom_iri = self.get_geom_iri()
         g.add((move_geom_iri, RDF.type, GEOMETRY_CLS))
         g.add((
             move_geom_iri,
@@ -116,6 +175,310 @@ def convert_user_data(input_file_path):
                 None,
                 URIRef('http://www.opengis.net/ont/geosparql#wktLiteral'))))
 
-        outfile_name = label + '_' + move_id + '.ttl'
-        g.serialize(outfile_name, format='turtle')
+        return g
+
+
+def iter_moves(
+        input_file,
+        max_time_gap=None,
+        max_distance_gap=None,
+        chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Reads the GPS points of `input_file` chunk-wise and yields a `Move` as soon
+    as the user ID or label changes, or the time gap (in seconds) or the
+    distance gap (in km) to the previous point exceeds `max_time_gap` or
+    `max_distance_gap`, respectively. Hence only the points of the current
+    move are kept in memory.
+    """
+    move = None
+
+    while True:
+        lines = input_file.readlines(chunk_size)
+        if not lines:
+            break
+
+        for line in lines:
+            if not line.strip():
+                continue
+
+            user_id, timestamp, point, label = _parse_line(line)
+
+            if move is not None and not move.is_continued_by(
+                    user_id, timestamp, point, label,
+                    max_time_gap, max_distance_gap):
+                yield move
+                move = None
+
+            if move is None:
+                move = Move(user_id, label)
+
+            move.add_point(point, timestamp)
+
+    if move is not None:
+        yield move
+
+
+class ConversionStats(object):
+    def __init__(
+            self,
+            num_moves=0,
+            num_points=0,
+            num_failed_files=0,
+            num_move_points=0,
+            num_vertices=0):
+
+        self.num_moves = num_moves
+        self.num_points = num_points
+        self.num_failed_files = num_failed_files
+        # GPS points of the converted moves vs. vertices of their line strings
+        self.num_move_points = num_move_points
+        self.num_vertices = num_vertices
+
+    def __iadd__(self, other):
+        self.num_moves += other.num_moves
+        self.num_points += other.num_points
+        self.num_failed_files += other.num_failed_files
+        self.num_move_points += other.num_move_points
+        self.num_vertices += other.num_vertices
+
+        return self
+
+    def vertex_reduction(self):
+        if self.num_move_points == 0:
+            return 0.
+
+        return 1 - (self.num_vertices / self.num_move_points)
+
+    def summary(self, elapsed_secs):
+        elapsed_secs = max(elapsed_secs, 1e-9)
+
+        return \
+            f'{self.num_moves} moves ({self.num_points} points) converted ' \
+            f'in {elapsed_secs:.2f} s: ' \
+            f'{self.num_moves / elapsed_secs:.1f} moves/s, ' \
+            f'{self.num_points / elapsed_secs:.1f} points/s, ' \
+            f'{self.num_vertices} of {self.num_move_points} vertices kept ' \
+            f'({self.vertex_reduction():.1%} reduction), ' \
+            f'{self.num_failed_files} failed files'
+
+
+class TurtleMoveWriter(object):
+    """
+    Writes every move together with the ontology to a Turtle file of its own
+    """
+    def __init__(self, output_dir, ontology):
+        self.output_dir = output_dir
+        self.ontology = ontology
+
+    def write(self, move, g):
+        move_g = Graph()
+        move_g += self.ontology
+        move_g += g
+
+        outfile_name = move.label + '_' + move.get_id() + '.ttl'
+        move_g.serialize(
+            os.path.join(self.output_dir, outfile_name), format='turtle')
+
+    def close(self):
+        pass
+
+
+def convert_user_data(
+        input_file_path,
+        output_dir='.',
+        max_time_gap=None,
+        max_distance_gap=None,
+        writer=None,
+        simplifier=None):
+    """
+    Converts all moves found in the given GPS CSV file. If no `writer` (e.g. a
+    `ShardedNTriplesWriter`) is provided each move is written to a Turtle file
+    of its own in `output_dir`. The line strings of the moves are simplified
+    with `simplifier` (see `userdataconverter.simplify.get_simplifier`) if
+    given.
+    """
+    own_writer = writer is None
+    if own_writer:
+        writer = TurtleMoveWriter(output_dir, init_ontology())
+
+    stats = ConversionStats()
+
+    try:
+        with open(input_file_path) as input_file:
+            for move in iter_moves(
+                    input_file, max_time_gap, max_distance_gap):
+                stats.num_points += len(move.points)
+
+                if len(move.points) < 2:
+                    continue
+
+                if simplifier is not None:
+                    points = simplifier(move.points)
+                else:
+                    points = move.points
+
+                writer.write(move, move.to_rdf(points))
+                stats.num_moves += 1
+                stats.num_move_points += len(move.points)
+                stats.num_vertices += len(points)
+    finally:
+        if own_writer:
+            writer.close()
+
+    return stats
+
+
+def _create_writer(
+        output_dir,
+        output_format,
+        batch_no,
+        max_shard_size,
+        compression,
+        db_settings):
+
+    if output_format == 'turtle':
+        writer = TurtleMoveWriter(output_dir, init_ontology())
+    elif output_format == 'ntshards':
+        writer = ShardedNTriplesWriter(
+            output_dir,
+            init_ontology(),
+            shard_prefix=f'moves-{batch_no:05d}',
+            max_shard_size=max_shard_size,
+            compression=compression)
+    else:
+        raise ValueError(f'Unknown output format {output_format}')
+
+    if db_settings is not None:
+        writer = PostGISMoveWriter(writer, db_settings)
+
+    return writer
+
+
+def _convert_user_data_batch(
+        batch_no,
+        input_file_paths,
+        output_dir,
+        output_format,
+        max_shard_size,
+        compression,
+        db_settings,
+        **kwargs):
+
+    stats = ConversionStats()
+    writer = _create_writer(
+        output_dir,
+        output_format,
+        batch_no,
+        max_shard_size,
+        compression,
+        db_settings)
+
+    try:
+        for input_file_path in input_file_paths:
+            try:
+                stats += convert_user_data(
+                    input_file_path, writer=writer, **kwargs)
+            except Exception as e:
+                logging.error(f'Converting {input_file_path} failed: {e}')
+                stats.num_failed_files += 1
+    finally:
+        writer.close()
+
+    return stats
+
+
+def expand_input_paths(paths, dir_file_suffix='.csv'):
+    """
+    Resolves the given mix of file paths, directories (searched recursively
+    for files ending with `dir_file_suffix`) and glob patterns to a sorted
+    list of file paths.
+    """
+    file_paths = set()
+
+    for path in paths:
+        if os.path.isdir(path):
+            for dir_path, _, file_names in os.walk(path):
+                for file_name in file_names:
+                    if file_name.endswith(dir_file_suffix):
+                        file_paths.add(os.path.join(dir_path, file_name))
+
+        elif os.path.isfile(path):
+            file_paths.add(path)
+
+        else:
+            matches = [p for p in glob(path, recursive=True)
+                       if os.path.isfile(p)]
+            if not matches:
+                logging.warning(f'No input files found for {path}')
+
+            file_paths.update(matches)
+
+    return sorted(file_paths)
+
+
+def convert_user_data_files(
+        input_file_paths,
+        output_dir='.',
+        workers=None,
+        max_time_gap=None,
+        max_distance_gap=None,
+        output_format='turtle',
+        max_shard_size=DEFAULT_MAX_SHARD_SIZE,
+        compression=None,
+        simplification=None,
+        tolerance=None,
+        db_settings=None):
+    """
+    Converts all given GPS files in a pool of `workers` processes (defaults to
+    the number of CPUs) and returns the accumulated `ConversionStats`.
+
+    With `output_format` 'turtle' every move is written to a Turtle file of its
+    own. With 'ntshards' each batch of input files is written to size-capped
+    (and optionally gz/bz2/xz compressed) N-Triples shards, the ontology is
+    written once to ontology.nt, and the positions of all moves are listed in
+    shard_index.tsv.
+
+    If `simplification` ('douglas-peucker' or 'visvalingam') is set, the line
+    strings are simplified with a tolerance of `tolerance` meters.
+
+    If `db_settings` (the keyword arguments of `dataloader.connect`) are given,
+    the line strings are additionally copied straight into the `line_string`
+    table of that database, with the RDF files being written as side output.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    stats = ConversionStats()
+
+    # The (usually small) files are handed out in a few batches per worker to
+    # keep the inter-process communication overhead and the number of shards
+    # low
+    num_batches = max(1, min(len(input_file_paths), workers * 4))
+    batches = [input_file_paths[i::num_batches] for i in range(num_batches)]
+
+    simplifier = None
+    if simplification is not None:
+        simplifier = get_simplifier(simplification, tolerance)
+
+    convert = partial(
+        _convert_user_data_batch,
+        output_dir=output_dir,
+        output_format=output_format,
+        max_shard_size=max_shard_size,
+        compression=compression,
+        db_settings=db_settings,
+        max_time_gap=max_time_gap,
+        max_distance_gap=max_distance_gap,
+        simplifier=simplifier)
+
+    with ProcessPoolExecutor(workers) as executor:
+        for batch_stats in executor.map(
+                convert, range(num_batches), batches):
+            stats += batch_stats
+
+    if output_format == 'ntshards':
+        merge_shard_indexes(
+            [os.path.join(output_dir, f'moves-{i:05d}.index.tsv')
+             for i in range(num_batches)],
+            output_dir)
 
+    return stats
@@ -0,0 +1,66 @@
+from io import StringIO
+
+from rdflib import URIRef
+
+from dataloader import connect
+from dataloader.sinks import escape_copy_value, copy_skipping_conflicts
+
+GEOM_DATATYPE_PROPERTY = URIRef('http://www.opengis.net/ont/geosparql#asWKT')
+DEFAULT_COPY_BATCH_SIZE = 1000
+
+
+class PostGISMoveWriter(object):
+    """
+    Sends the line string of every move directly to the `line_string` table
+    (via COPY, in batches of `batch_size` moves, skipping IRIs already in the
+    table) and passes the move's triples on to the wrapped `rdf_writer`,
+    which produces the RDF side output. This way the geometries don't have to
+    be found again in the serialized RDF files by `bin/loaddata`.
+    """
+    def __init__(
+            self,
+            rdf_writer,
+            db_settings,
+            table_name='line_string',
+            batch_size=DEFAULT_COPY_BATCH_SIZE):
+
+        self.rdf_writer = rdf_writer
+        self.table_name = table_name
+        self.batch_size = batch_size
+
+        self._conn = connect(**db_settings)
+        self._rows = []
+
+    def write(self, move, g):
+        self.rdf_writer.write(move, g)
+
+        geom_iri = move.get_geom_iri()
+        wkt_lit = g.value(geom_iri, GEOM_DATATYPE_PROPERTY)
+        self._rows.append((str(geom_iri), str(wkt_lit)))
+
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+
+        buffer = StringIO()
+        for iri, wkt in self._rows:
+            buffer.write(
+                f'{escape_copy_value(iri)}\t{escape_copy_value(wkt)}\n')
+        buffer.seek(0)
+
+        cursor = self._conn.cursor()
+        copy_skipping_conflicts(cursor, self.table_name, buffer)
+        self._conn.commit()
+        cursor.close()
+
+        self._rows = []
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._conn.close()
+            self.rdf_writer.close()
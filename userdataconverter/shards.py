@@ -0,0 +1,147 @@
+import bz2
+import gzip
+import lzma
+import os
+
+DEFAULT_MAX_SHARD_SIZE = 256 * 1024 * 1024
+ONTOLOGY_FILE_NAME = 'ontology.nt'
+SHARD_INDEX_FILE_NAME = 'shard_index.tsv'
+
+_compressors = {
+    None: lambda data: data,
+    'gz': gzip.compress,
+    'bz2': bz2.compress,
+    'xz': lzma.compress,
+}
+
+
+def write_ontology(ontology, output_dir):
+    """
+    Writes the ontology once per output directory. Several writers may do
+    this concurrently, hence the file is written to a temporary path first
+    and then moved into place atomically.
+    """
+    file_path = os.path.join(output_dir, ONTOLOGY_FILE_NAME)
+    if os.path.exists(file_path):
+        return
+
+    tmp_file_path = file_path + f'.{os.getpid()}.tmp'
+    with open(tmp_file_path, 'wb') as out_file:
+        out_file.write(ontology.serialize(format='nt'))
+
+    os.replace(tmp_file_path, file_path)
+
+
+class ShardedNTriplesWriter(object):
+    """
+    Appends the N-Triples of all moves to a sequence of shard files
+    <shard_prefix>-<shard no>.nt[.<compression>] which are closed as soon as
+    they exceed `max_shard_size` bytes. Every move is written (and, if
+    requested, compressed) as one self-contained block, so each line of the
+    index file <shard_prefix>.index.tsv
+
+        <move IRI> TAB <shard file name> TAB <offset> TAB <length>
+
+    allows to read (and decompress) a single move without touching the rest of
+    the shard. Concatenated gzip/bz2/xz members form a valid compressed file,
+    so the shards can also be read as a whole.
+    """
+    def __init__(
+            self,
+            output_dir,
+            ontology,
+            shard_prefix='moves',
+            max_shard_size=DEFAULT_MAX_SHARD_SIZE,
+            compression=None):
+
+        if compression not in _compressors:
+            raise ValueError(f'Unsupported compression {compression}')
+
+        self.output_dir = output_dir
+        self.shard_prefix = shard_prefix
+        self.max_shard_size = max_shard_size
+        self.compression = compression
+
+        self._compress = _compressors[compression]
+        self._shard_no = 0
+        self._shard_file = None
+        self._shard_file_name = None
+        self._shard_size = 0
+
+        write_ontology(ontology, output_dir)
+        self.index_file_path = \
+            os.path.join(output_dir, f'{shard_prefix}.index.tsv')
+        self._index_file = open(self.index_file_path, 'w')
+
+    def _open_next_shard(self):
+        suffix = '.nt' if self.compression is None \
+            else f'.nt.{self.compression}'
+        self._shard_file_name = \
+            f'{self.shard_prefix}-{self._shard_no:05d}{suffix}'
+        self._shard_file = open(
+            os.path.join(self.output_dir, self._shard_file_name), 'wb')
+        self._shard_size = 0
+        self._shard_no += 1
+
+    def write(self, move, g):
+        if self._shard_file is None:
+            self._open_next_shard()
+
+        data = self._compress(g.serialize(format='nt'))
+        offset = self._shard_size
+
+        self._shard_file.write(data)
+        self._shard_size += len(data)
+        self._index_file.write(
+            f'{move.get_iri()}\t{self._shard_file_name}\t'
+            f'{offset}\t{len(data)}\n')
+
+        if self._shard_size >= self.max_shard_size:
+            self._shard_file.close()
+            self._shard_file = None
+
+    def close(self):
+        if self._shard_file is not None:
+            self._shard_file.close()
+            self._shard_file = None
+
+        self._index_file.close()
+
+
+def merge_shard_indexes(index_file_paths, output_dir):
+    """
+    Concatenates the index files of several writers to one shard index file
+    and removes the partial ones.
+    """
+    merged_file_path = os.path.join(output_dir, SHARD_INDEX_FILE_NAME)
+
+    with open(merged_file_path, 'w') as merged_file:
+        for index_file_path in index_file_paths:
+            if not os.path.exists(index_file_path):
+                continue
+
+            with open(index_file_path) as index_file:
+                for line in index_file:
+                    merged_file.write(line)
+
+            os.remove(index_file_path)
+
+    return merged_file_path
+
+
+def read_move(output_dir, shard_file_name, offset, length):
+    """
+    Returns the N-Triples of a single move as listed in the shard index.
+    """
+    with open(os.path.join(output_dir, shard_file_name), 'rb') as shard_file:
+        shard_file.seek(offset)
+        data = shard_file.read(length)
+
+    if shard_file_name.endswith('.gz'):
+        data = gzip.decompress(data)
+    elif shard_file_name.endswith('.bz2'):
+        data = bz2.decompress(data)
+    elif shard_file_name.endswith('.xz'):
+        data = lzma.decompress(data)
+
+    return data.decode('utf-8')
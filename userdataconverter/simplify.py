@@ -0,0 +1,177 @@
+"""
+Line string simplification of moves. Douglas-Peucker computes the distances of
+long segments with NumPy. Visvalingam only computes the initial triangle areas
+with NumPy, its removals depend on each other and stay a heap loop.
+"""
+import heapq
+from functools import partial
+
+import numpy as np
+
+EARTH_RADIUS_IN_M = 6367444.5
+
+
+def _project(points):
+    """
+    Projects the given (lat, lon) points to a local equirectangular plane
+    measured in meters, which is precise enough for the extent of a single
+    move. Returns the x and y coordinates as NumPy arrays.
+    """
+    lats, lons = np.radians(np.asarray(points, np.float64)).T
+    x_factor = EARTH_RADIUS_IN_M * np.cos(lats.mean())
+
+    return lons * x_factor, lats * EARTH_RADIUS_IN_M
+
+
+# segments with fewer points are scanned in plain Python, where NumPy's per
+# call overhead would outweigh the vectorised distance computation
+MIN_VECTORISED_POINTS = 64
+
+
+def _farthest_point(xs, ys, xs_array, ys_array, first, last):
+    """
+    Returns the index and the squared distance of the point between `first`
+    and `last` farthest from the line segment connecting them
+    """
+    x1, y1 = xs[first], ys[first]
+    dx, dy = xs[last] - x1, ys[last] - y1
+    sq_len = dx * dx + dy * dy
+
+    if last - first > MIN_VECTORISED_POINTS:
+        px = xs_array[first + 1:last] - x1
+        py = ys_array[first + 1:last] - y1
+        if sq_len == 0:
+            sq_dists = px * px + py * py
+        else:
+            t = (px * dx + py * dy) / sq_len
+            np.clip(t, 0., 1., out=t)
+            px -= t * dx
+            py -= t * dy
+            sq_dists = px * px + py * py
+
+        max_offset = int(np.argmax(sq_dists))
+
+        return first + 1 + max_offset, float(sq_dists[max_offset])
+
+    max_sq_dist = -1
+    max_idx = first
+    for i in range(first + 1, last):
+        px, py = xs[i] - x1, ys[i] - y1
+
+        if sq_len == 0:
+            sq_dist = px * px + py * py
+        else:
+            t = max(0., min(1., (px * dx + py * dy) / sq_len))
+            ex, ey = px - t * dx, py - t * dy
+            sq_dist = ex * ex + ey * ey
+
+        if sq_dist > max_sq_dist:
+            max_sq_dist = sq_dist
+            max_idx = i
+
+    return max_idx, max_sq_dist
+
+
+def douglas_peucker(points, tolerance):
+    """
+    Drops all points closer than `tolerance` meters to the simplified line.
+    The recursion of the original algorithm is replaced by an explicit stack to
+    also handle moves with millions of points.
+    """
+    if len(points) < 3:
+        return list(points)
+
+    xs_array, ys_array = _project(points)
+    xs, ys = xs_array.tolist(), ys_array.tolist()
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    sq_tolerance = tolerance ** 2
+
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        max_idx, max_sq_dist = \
+            _farthest_point(xs, ys, xs_array, ys_array, first, last)
+
+        if max_sq_dist > sq_tolerance:
+            keep[max_idx] = True
+            stack.append((first, max_idx))
+            stack.append((max_idx, last))
+
+    return [p for p, k in zip(points, keep) if k]
+
+
+def _triangle_area(xs, ys, a, b, c):
+    return abs(
+        (xs[a] - xs[c]) * (ys[b] - ys[a]) -
+        (xs[a] - xs[b]) * (ys[c] - ys[a])) / 2
+
+
+def visvalingam(points, tolerance):
+    """
+    Repeatedly drops the point spanning the smallest triangle with its
+    neighbors until all remaining triangles are larger than `tolerance`**2
+    square meters.
+    """
+    if len(points) < 3:
+        return list(points)
+
+    xs, ys = _project(points)
+    initial_areas = np.abs(
+        (xs[:-2] - xs[2:]) * (ys[1:-1] - ys[:-2]) -
+        (xs[:-2] - xs[1:-1]) * (ys[2:] - ys[:-2])) / 2
+    # plain floats are much faster to index one at a time
+    xs, ys = xs.tolist(), ys.tolist()
+    num_points = len(points)
+    min_area = tolerance ** 2
+
+    prev_idx = list(range(-1, num_points - 1))
+    next_idx = list(range(1, num_points + 1))
+    removed = [False] * num_points
+    areas = [float('inf')] + initial_areas.tolist() + [float('inf')]
+
+    heap = [(areas[i], i) for i in range(1, num_points - 1)]
+    heapq.heapify(heap)
+
+    while heap:
+        area, i = heapq.heappop(heap)
+        if removed[i] or area != areas[i]:
+            # outdated heap entry
+            continue
+
+        if area >= min_area:
+            break
+
+        removed[i] = True
+        prev, nxt = prev_idx[i], next_idx[i]
+        next_idx[prev] = nxt
+        prev_idx[nxt] = prev
+
+        for j in (prev, nxt):
+            if 0 < j < num_points - 1:
+                # the area of a neighbor must not become smaller than the one
+                # of the point just removed, as otherwise the order of
+                # removals would depend on the order they were looked at
+                areas[j] = max(
+                    area,
+                    _triangle_area(xs, ys, prev_idx[j], j, next_idx[j]))
+                heapq.heappush(heap, (areas[j], j))
+
+    return [p for p, r in zip(points, removed) if not r]
+
+
+_methods = {
+    'douglas-peucker': douglas_peucker,
+    'visvalingam': visvalingam,
+}
+
+
+def get_simplifier(method, tolerance):
+    """
+    Returns a function taking a list of (lat, lon) points and returning the
+    simplified list of points
+    """
+    if method not in _methods:
+        raise ValueError(f'Unknown simplification method {method}')
+
+    return partial(_methods[method], tolerance=tolerance)